@@ -0,0 +1,131 @@
+import random
+
+from datetime import date, datetime, timedelta
+
+# Названия фаз Луны в терминах API meteoblue
+MOON_PHASE_NAMES = ["new", "waxing crescent", "first quarter", "waxing gibbous", "full", "waning gibbous", "last quarter", "waning crescent"]
+
+def clouds_payload(days: int, seed: int = 0, start: date = None) -> dict:
+    """
+    Генерирует синтетический ответ эндпоинта /clouds-1h.
+
+    Как и настоящий ответ, содержит days * 24 + 1 почасовых записей (последняя - 00:00 следующего дня)
+    и дополнительные переменные, которые конвейер не использует.
+
+    Args:
+        days (int): Количество дней прогноза (1-10, как FORECAST_DAYS).
+        seed (int, optional): Зерно генератора случайных чисел (разные места - разные зёрна).
+        start (date, optional): Первая дата прогноза. По умолчанию - сегодня.
+
+    Returns:
+        dict: Ответ в формате API meteoblue.
+
+    Example:
+        >>> len(clouds_payload(3)["data_1h"]["time"])
+        73
+    """
+    generator = random.Random(seed)
+    start = datetime.combine(start or date.today(), datetime.min.time())
+    hours = days * 24 + 1
+
+    # Облачность меняется плавно - случайное блуждание в пределах 0-100%
+    cloudiness = []
+    value = generator.randint(0, 100)
+    for _ in range(hours):
+        value = min(100, max(0, value + generator.randint(-20, 20)))
+        cloudiness.append(value)
+
+    return {
+        "metadata": {"modelrun_utc": start.strftime("%Y-%m-%d %H:%M"), "timezone_abbrevation": "MSK"},
+        "units": {"time": "YYYY-MM-DD hh:mm", "totalcloudcover": "percent"},
+        "data_1h": {
+            "time": [(start + timedelta(hours=hour)).strftime("%Y-%m-%d %H:%M") for hour in range(hours)],
+            "totalcloudcover": cloudiness,
+            "lowclouds": [generator.randint(0, 100) for _ in range(hours)],
+            "midclouds": [generator.randint(0, 100) for _ in range(hours)],
+            "highclouds": [generator.randint(0, 100) for _ in range(hours)],
+            "sunshinetime": [generator.randint(0, 60) for _ in range(hours)],
+            "visibility": [generator.randint(1000, 50000) for _ in range(hours)],
+        },
+    }
+
+def basic_payload(days: int, seed: int = 0, start: date = None) -> dict:
+    """
+    Генерирует синтетический ответ пакета basic-1h (температура, влажность, ветер, осадки).
+
+    Args:
+        days (int): Количество дней прогноза.
+        seed (int, optional): Зерно генератора случайных чисел.
+        start (date, optional): Первая дата прогноза. По умолчанию - сегодня.
+
+    Returns:
+        dict: Ответ в формате API meteoblue.
+    """
+    generator = random.Random(seed + 1)
+    start = datetime.combine(start or date.today(), datetime.min.time())
+    hours = days * 24 + 1
+
+    return {
+        "metadata": {"modelrun_utc": start.strftime("%Y-%m-%d %H:%M"), "timezone_abbrevation": "MSK"},
+        "units": {"time": "YYYY-MM-DD hh:mm", "temperature": "C", "windspeed": "km/h", "relativehumidity": "percent"},
+        "data_1h": {
+            "time": [(start + timedelta(hours=hour)).strftime("%Y-%m-%d %H:%M") for hour in range(hours)],
+            "temperature": [round(generator.uniform(-20, 30), 1) for _ in range(hours)],
+            "relativehumidity": [generator.randint(30, 100) for _ in range(hours)],
+            "windspeed": [round(generator.uniform(0, 60), 1) for _ in range(hours)],
+            "winddirection": [generator.randint(0, 359) for _ in range(hours)],
+            "precipitation": [round(max(0.0, generator.uniform(-2, 2)), 1) for _ in range(hours)],
+        },
+    }
+
+def combined_payload(packages: list[str], days: int, seed: int = 0, start: date = None) -> dict:
+    """
+    Генерирует синтетический ответ комбинированного запроса нескольких пакетов (например, basic-1h_clouds-1h_sunmoon).
+
+    Почасовые переменные пакетов объединяются в один раздел data_1h, подневные - в data_day.
+    """
+    generators = {"basic-1h": basic_payload, "clouds-1h": clouds_payload, "sunmoon": sun_moon_payload}
+    payload = {"metadata": {}, "units": {}}
+    for package in packages:
+        for section, values in generators[package](days, seed, start).items():
+            payload.setdefault(section, {}).update(values)
+    return payload
+
+def sun_moon_payload(days: int, seed: int = 0, start: date = None) -> dict:
+    """
+    Генерирует синтетический ответ эндпоинта /sunmoon.
+
+    Args:
+        days (int): Количество дней прогноза.
+        seed (int, optional): Зерно генератора случайных чисел.
+        start (date, optional): Первая дата прогноза. По умолчанию - сегодня.
+
+    Returns:
+        dict: Ответ в формате API meteoblue.
+    """
+    generator = random.Random(seed)
+    start = start or date.today()
+    first_phase = generator.randrange(len(MOON_PHASE_NAMES))
+
+    return {
+        "metadata": {"timezone_abbrevation": "MSK"},
+        "data_day": {
+            "time": [(start + timedelta(days=day)).isoformat() for day in range(days)],
+            "sunrise": [f"0{generator.randint(5, 8)}:{generator.randint(10, 59)}" for _ in range(days)],
+            "sunset": [f"{generator.randint(16, 21)}:{generator.randint(10, 59)}" for _ in range(days)],
+            "moonrise": [f"{generator.randint(10, 23)}:{generator.randint(10, 59)}" for _ in range(days)],
+            "moonset": [f"0{generator.randint(1, 9)}:{generator.randint(10, 59)}" for _ in range(days)],
+            "moonilluminatedfraction": [round(generator.uniform(0, 100), 1) for _ in range(days)],
+            "moonphasename": [MOON_PHASE_NAMES[(first_phase + day // 4) % len(MOON_PHASE_NAMES)] for day in range(days)],
+        },
+    }
+
+def sites(count: int, seed: int = 0) -> list[dict]:
+    """
+    Генерирует список мест наблюдения в формате параметра SITES.
+    """
+    generator = random.Random(seed)
+    return [
+        {"NAME": f"Site {number}", "LATITUDE": round(generator.uniform(40, 65), 4), "LONGITUDE": round(generator.uniform(20, 60), 4)}
+        for number in range(count)
+    ]
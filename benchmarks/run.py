@@ -0,0 +1,209 @@
+"""
+Бенчмарк конвейера прогноза на синтетических данных и локальной замене API.
+
+Запуск из корня репозитория:
+    python -m benchmarks.run --sites 100 --days 10 --latency 0.05 --error-rate 0.01
+
+Для каждого этапа (запрос к API, разбор ответа, обработка, формирование отчёта, отправка в Telegram)
+выводятся пропускная способность, перцентили задержки одной операции и пиковое потребление памяти.
+Время и память измеряются в отдельных проходах, т.к. tracemalloc заметно замедляет выполнение.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import payloads
+from benchmarks.stub_server import StubServer
+from modules.data_presentation import report, telegram
+from modules.data_processing.weather import HourlySeries, outdated_data_mask, process_weather_data
+from modules.data_providers import api
+from modules.data_providers.config_loader import Config, use_config
+
+def benchmark_config(days: int, workers: int, combined: bool = False) -> Config:
+    """
+    Создаёт синтетическую конфигурацию бенчмарка и делает её конфигурацией по умолчанию.
+
+    Файл config.yml не читается, кэш ответов отключён, чтобы каждый запрос доходил до заглушки API.
+    """
+    config = Config({
+        "FORECAST_DAYS": days, "TIME_FILTER": "03:00", "TIMEZONE": "Europe/Moscow", "LATITUDE": 55.75, "LONGITUDE": 37.62,
+        "CLOUDINESS_FILTER": 40, "API_KEY": "KEY", "BOT_TOKEN": "TOKEN", "CHAT_ID": "1", "MAX_CONCURRENCY": workers, "CACHE_ENABLED": False,
+        "COMBINED_REQUEST": combined,
+    })
+    use_config(config)
+    return config
+
+def percentile(values: list[float], percent: float) -> float:
+    """
+    Возвращает перцентиль значений (линейная интерполяция).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def run_stage(name: str, operation, items: list, workers: int = 1, measure_memory: bool = True) -> tuple:
+    """
+    Выполняет операцию для каждого элемента и собирает статистику этапа.
+
+    Args:
+        name (str): Название этапа.
+        operation (callable): Функция от одного элемента.
+        items (list): Элементы для обработки.
+        workers (int, optional): Количество потоков (для этапов, ограниченных сетью).
+        measure_memory (bool, optional): Выполнить дополнительный проход под tracemalloc.
+
+    Returns:
+        tuple: Результаты операции (None для неудачных) и словарь со статистикой этапа.
+    """
+    latencies = []
+    errors = 0
+
+    def timed(item):
+        started = time.perf_counter()
+        try:
+            result = operation(item)
+        except Exception:
+            result = None
+        latencies.append(time.perf_counter() - started)
+        return result
+
+    started = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(timed, items))
+    else:
+        results = [timed(item) for item in items]
+    wall_time = time.perf_counter() - started
+    errors = sum(result is None for result in results)
+
+    peak_memory = None
+    if measure_memory:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(timed, items))
+        else:
+            for item in items:
+                timed(item)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return results, {
+        "stage": name,
+        "items": len(items),
+        "errors": errors,
+        "wall_s": round(wall_time, 4),
+        "throughput_per_s": round(len(items) / wall_time, 1) if wall_time else None,
+        "p50_ms": round(percentile(latencies[:len(items)], 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies[:len(items)], 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies[:len(items)], 99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies[:len(items)]) * 1000, 3) if items else 0.0,
+        "peak_memory_kb": round(peak_memory / 1024, 1) if peak_memory is not None else None,
+    }
+
+def run(sites_count: int, days: int, latency: float, jitter: float, error_rate: float, workers: int, measure_memory: bool, combined: bool = False) -> list[dict]:
+    """
+    Выполняет все этапы конвейера для sites_count мест и возвращает статистику этапов.
+
+    Если combined - данные каждого места запрашиваются одним комбинированным запросом (COMBINED_REQUEST).
+    """
+    config = benchmark_config(days, workers, combined)
+
+    sites = payloads.sites(sites_count)
+    stats = []
+
+    with StubServer(latency=latency, jitter=jitter, error_rate=error_rate) as server:
+        api.API_BASE_URL = server.url + "packages/"
+        telegram.BOT_API_BASE_URL = server.url
+
+        # 1. Запросы к API: каждый эндпоинт каждого места или один комбинированный запрос на место
+        endpoints = {api.combined_endpoint(config): api.SITE_ENDPOINTS["/clouds-1h"]} if combined else api.SITE_ENDPOINTS
+        requests_list = [(site, endpoint) for site in sites for endpoint in endpoints]
+        responses, stage = run_stage(
+            "fetch",
+            lambda job: api.fetch(job[1], endpoints[job[1]], job[0], use_cache=False, config=config),
+            requests_list, workers=workers, measure_memory=measure_memory,
+        )
+        stats.append(stage)
+
+        # 2. Разбор ответов (разбор меток времени и расчёт освещённости Луны). Разбор изменяет ответ, поэтому копируем его.
+        # Ответы при ошибках заменяем синтетическими, чтобы последующие этапы обрабатывали все места
+        if combined:
+            raw_combined = [response for response in responses if response]
+            raw_combined += [payloads.combined_payload(list(api.COMBINED_PACKAGES), days, seed) for seed in range(sites_count - len(raw_combined))]
+            combined_data, stage = run_stage("parse_combined", lambda response: api.parse_combined_data(json.loads(json.dumps(response))), raw_combined, measure_memory=measure_memory)
+            stats.append(stage)
+            clouds_data = [data["clouds_data"] for data in combined_data]
+            sun_moon_data = [data["sun_moon_data"] for data in combined_data]
+        else:
+            raw_clouds = [response for response, (_, endpoint) in zip(responses, requests_list) if response and endpoint == "/clouds-1h"]
+            raw_sun_moon = [response for response, (_, endpoint) in zip(responses, requests_list) if response and endpoint == "/sunmoon"]
+            raw_clouds += [payloads.clouds_payload(days, seed) for seed in range(sites_count - len(raw_clouds))]
+            raw_sun_moon += [payloads.sun_moon_payload(days, seed) for seed in range(sites_count - len(raw_sun_moon))]
+
+            clouds_data, stage = run_stage("parse_clouds", lambda response: api.parse_clouds_data(response), raw_clouds, measure_memory=measure_memory)
+            stats.append(stage)
+            sun_moon_data, stage = run_stage("parse_sun_moon", lambda response: api.parse_sun_moon_data(json.loads(json.dumps(response))), raw_sun_moon, measure_memory=measure_memory)
+            stats.append(stage)
+
+        # 3. Обработка: отбрасывание прошедших часов, группировка по дням и фильтрация
+        def process(pair):
+            series = HourlySeries.from_clouds_data(pair[0])
+            return process_weather_data(series.select(outdated_data_mask(series)), pair[1])
+        processed, stage = run_stage("process", process, list(zip(clouds_data, sun_moon_data)), measure_memory=measure_memory)
+        stats.append(stage)
+
+        # 4. Формирование отчётов
+        reports, stage = run_stage("render", lambda data: report.compose_report(data, "Benchmark"), [data for data in processed if data is not None], measure_memory=measure_memory)
+        stats.append(stage)
+
+        # Те же отчёты одним пакетом в пуле процессов. Пакет - одна операция, поэтому количество элементов
+        # и пропускная способность пересчитываются на количество отчётов, а память процессов пула не измеряется.
+        batch = [{"weather_data": data, "site_name": "Benchmark"} for data in processed if data is not None]
+        _, stage = run_stage("render_batch", report.compose_reports, [batch], measure_memory=False)
+        stage["items"] = len(batch)
+        stage["throughput_per_s"] = round(len(batch) / stage["wall_s"], 1) if stage["wall_s"] else None
+        stats.append(stage)
+
+        # 5. Отправка в Telegram
+        messages = [composed["message"] for composed in reports if composed and composed["status"] == "success"]
+        _, stage = run_stage("send", telegram.bot_send_message, messages, workers=workers, measure_memory=measure_memory)
+        stats.append(stage)
+
+    return stats
+
+def print_table(stats: list[dict]) -> None:
+    columns = ["stage", "items", "errors", "wall_s", "throughput_per_s", "p50_ms", "p95_ms", "p99_ms", "peak_memory_kb"]
+    print(" ".join(f"{column:>16}" for column in columns))
+    for stage in stats:
+        print(" ".join(f"{str(stage[column]):>16}" for column in columns))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк конвейера прогноза на синтетических данных")
+    parser.add_argument("--sites", type=int, default=50, help="Количество мест наблюдения")
+    parser.add_argument("--days", type=int, default=10, choices=range(1, 11), metavar="1-10", help="Количество дней прогноза")
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка ответа заглушки API, секунды")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Случайная добавка к задержке, секунды")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля запросов, завершающихся ошибкой")
+    parser.add_argument("--workers", type=int, default=8, help="Количество одновременных запросов")
+    parser.add_argument("--no-memory", action="store_true", help="Не измерять пиковое потребление памяти")
+    parser.add_argument("--combined", action="store_true", help="Запрашивать данные одним комбинированным запросом на место")
+    parser.add_argument("--json", help="Сохранить результаты в JSON-файл")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.json) if args.json else None
+    results = run(args.sites, args.days, args.latency, args.jitter, args.error_rate, args.workers, not args.no_memory, args.combined)
+    print_table(results)
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
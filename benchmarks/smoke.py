@@ -0,0 +1,500 @@
+"""
+Сквозные проверки конвейера на синтетических данных и локальной замене API.
+
+Запуск из корня репозитория:
+    python -m benchmarks.smoke
+
+В отличие от бенчмарка, каждая проверка проходит весь путь разового запуска main (запрос данных,
+обработка, отпечатки, формирование и отправка отчёта) для одного сценария конфигурации.
+Файлы состояния создаются во временном каталоге. Код возврата - 1, если хотя бы одна проверка не прошла.
+"""
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+import ijson
+import numpy as np
+import requests
+
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import main
+from benchmarks import payloads
+from benchmarks.stub_server import StubServer
+from modules.daemon import ForecastDaemon
+from modules.data_presentation import delivery, report, telegram
+from modules.data_processing import ephemeris
+from modules.data_processing.memo import astronomy_cache
+from modules.data_processing.weather import HourlySeries, outdated_data_mask, process_weather_data
+from modules.data_processing.windows import WindowIndex
+from modules.data_providers import api
+from modules.data_providers.archive import ForecastArchive
+from modules.data_providers.cache import EVICT_TARGET_RATIO, ResponseCache
+from modules.data_providers.cells import cell_center, cell_key
+from modules.data_providers.grid import GridIndex, fetch_cells
+from modules.data_providers.streaming import STREAM_BUFFER_SIZE, stream_fields
+from modules.data_providers.config_loader import Config, use_config
+
+def smoke_config(directory: str, **overrides) -> Config:
+    """
+    Создаёт конфигурацию проверки и настраивает с ней модуль main (см. main.setup()).
+
+    Кэш ответов отключён, отпечатки прогнозов хранятся во временном каталоге directory.
+    """
+    config = Config({
+        "FORECAST_DAYS": 3, "TIME_FILTER": "03:00", "TIMEZONE": "Europe/Moscow", "LATITUDE": 55.75, "LONGITUDE": 37.62,
+        "CLOUDINESS_FILTER": 100, "API_KEY": "KEY", "BOT_TOKEN": "TOKEN", "CHAT_ID": "1", "CACHE_ENABLED": False,
+        "FINGERPRINT_FILE": os.path.join(directory, "fingerprints.json"), "TEMPLATE_CACHE_DIR": None,
+    } | overrides)
+    use_config(config)
+    main.setup(config)
+    return config
+
+def check_combined_request(server: StubServer, directory: str) -> None:
+    # Комбинированный запрос: почасовая оценка качества проходит через отпечатки дней и попадает в отчёт
+    smoke_config(directory, COMBINED_REQUEST=True)
+    sent = server.requests["telegram"]
+    composed_report = main.main()
+    assert composed_report["status"] == "success", composed_report["message"]
+    assert server.requests["telegram"] > sent, "отчёт не отправлен"
+    # Повторный запуск с теми же данными не отправляет отчёт
+    assert main.main()["status"] == "unchanged"
+
+def check_change_delivery(server: StubServer, directory: str) -> None:
+    # Изменение части дней правит предыдущее сообщение, а изменение всех дней или новый день - новое сообщение
+    smoke_config(directory)
+    key = main.site_key(main.default_site())
+    assert main.main()["status"] == "success"
+    days = main.fingerprints.get(key)["days"]
+
+    def methods_after(days_override: dict) -> list[str]:
+        main.fingerprints.update(key, payload=None, days=days_override)
+        calls = len(server.telegram_calls)
+        assert main.main()["status"] == "success"
+        return [method for method, _ in server.telegram_calls[calls:]]
+
+    first_day, *other_days = sorted(days)
+    assert set(methods_after(days | {first_day: "changed"})) == {"editMessageText"}
+    assert set(methods_after({day: "changed" for day in days})) == {"sendMessage"}
+    assert set(methods_after({day: days[day] for day in other_days})) == {"sendMessage"}
+
+    # После изменения фильтра облачности те же данные обрабатываются заново, а не считаются неизменными
+    assert main.main()["status"] == "unchanged"
+    smoke_config(directory, CLOUDINESS_FILTER=50)
+    assert main.main()["status"] != "unchanged"
+
+def check_polar_site(server: StubServer, directory: str) -> None:
+    # Локальный расчёт за полярным кругом: в полярную ночь заката нет, но окна есть, в полярный день окон нет
+    smoke_config(directory, SUN_MOON_SOURCE="local", LATITUDE=69.0, LONGITUDE=33.0)
+    for start, expect_windows in ((date(2025, 12, 20), True), (date(2025, 6, 20), False)):
+        clouds_data = HourlySeries.from_clouds_data(api.parse_clouds_data(payloads.clouds_payload(3, start=start)))
+        sun_moon_data = ephemeris.sun_moon_data(np.datetime64(start, "D") + np.arange(3), 69.0, 33.0, "Europe/Moscow")
+        assert all(sunset is None for sunset in sun_moon_data["sunset"])
+
+        processed_data = process_weather_data(clouds_data, sun_moon_data)
+        windows = WindowIndex()
+        windows.update("polar", clouds_data, sun_moon_data, main.config.TIME_FILTER, main.config.CLOUDINESS_FILTER)
+        assert bool(processed_data) == expect_windows, f"{start}: {len(processed_data)} дней"
+        assert bool(len(windows)) == expect_windows, f"{start}: {len(windows)} окон"
+        if expect_windows:
+            # При локальном расчёте освещённость Луны известна для каждого часа отчёта
+            assert all(day_data["moon_illumination_hourly"].keys() == day_data["date_time"].keys() for day_data in processed_data.values())
+            assert report.compose_report(processed_data)["status"] == "success"
+
+def check_days_by_date(server: StubServer, directory: str) -> None:
+    # Данные о Солнце и Луне, полученные днём раньше облачности (например, из кэша до местной полуночи),
+    # сопоставляются с днями прогноза по дате, а прошедший день отбрасывается целиком
+    smoke_config(directory, SUN_MOON_SOURCE="local")
+    start = date(2025, 1, 9)
+    clouds_data = HourlySeries.from_clouds_data(api.parse_clouds_data(payloads.clouds_payload(3, start=start)))
+    sun_moon_data = ephemeris.sun_moon_data(np.datetime64(start, "D") - 1 + np.arange(4), 55.75, 37.62, "Europe/Moscow")
+
+    processed_data = process_weather_data(clouds_data, sun_moon_data)
+    for day, day_data in processed_data.items():
+        position = [value.date() for value in sun_moon_data["date"]].index(day)
+        assert day_data["sunset"] == sun_moon_data["sunset"][position].time(), f"{day}: закат другого дня"
+        assert day_data["moon_illumination"] == sun_moon_data["moon_illumination"][position]
+
+    current = clouds_data.select(outdated_data_mask(clouds_data, datetime(2025, 1, 10, 12)))
+    assert processed_data and len(current), "нет данных для проверки"
+    assert current.date_time.min() > np.datetime64("2025-01-10T12:00"), "прошедшие часы не отброшены"
+
+def check_daemon_day_change(server: StubServer, directory: str) -> None:
+    # Служба обновляет все эндпоинты места сразу после местной полуночи, даже если их интервал обновления не истёк
+    config = smoke_config(directory)
+    daemon = ForecastDaemon([{"NAME": "smoke", "LATITUDE": 55.75, "LONGITUDE": 37.62}], lambda *args: None, report_interval=10 ** 6, config=config)
+    zone = ZoneInfo(config.TIMEZONE)
+    midnight = datetime.combine(datetime.now(zone).date() + timedelta(days=1), datetime.min.time(), zone).timestamp()
+    try:
+        for offset, expected in ((-1800, 2), (-600, 0), (60, 2)):
+            sent = server.requests["meteoblue"]
+            daemon.run_once(midnight + offset)
+            requested = server.requests["meteoblue"] - sent
+            assert requested == expected, f"{offset:+} с от полуночи: {requested} запросов вместо {expected}"
+    finally:
+        daemon.executor.shutdown(wait=True)
+
+def check_daemon_grid(server: StubServer, directory: str) -> None:
+    # Служба запрашивает данные один раз на ячейку сетки и передаёт их всем местам ячейки
+    config = smoke_config(directory)
+    sites = [
+        {"NAME": "A", "LATITUDE": 55.751, "LONGITUDE": 37.618},
+        {"NAME": "B", "LATITUDE": 55.752, "LONGITUDE": 37.619},
+        {"NAME": "C", "LATITUDE": 59.94, "LONGITUDE": 30.31},
+    ]
+    delivered = []
+    daemon = ForecastDaemon(sites, lambda site, clouds_data, sun_moon_data: delivered.append((site["NAME"], id(clouds_data))), report_interval=10 ** 6, config=config)
+    try:
+        sent = server.requests["meteoblue"]
+        daemon.run_once()
+        assert server.requests["meteoblue"] - sent == 4, f"{server.requests['meteoblue'] - sent} запросов на 2 ячейки"
+        assert [name for name, _ in delivered] == ["A", "B", "C"] and delivered[0][1] == delivered[1][1] != delivered[2][1]
+    finally:
+        daemon.executor.shutdown(wait=True)
+
+    # Центры ячеек у полюса и у меридиана 180° остаются допустимыми координатами
+    assert cell_center(cell_key(90.0, 179.99, "UTC", 0.05), 0.05) == (90.0, 179.975)
+    assert cell_key(0.0, 180.0, "UTC") == cell_key(0.0, -180.0, "UTC")
+
+def check_windows_time_zones(server: StubServer, directory: str) -> None:
+    # Окна мест из разных часовых поясов отбираются относительно одного момента: ночь во Владивостоке
+    # уже закончилась, когда в Москве она ещё идёт
+    config = smoke_config(directory)
+    start = date(2025, 1, 9)
+    clouds_data = HourlySeries.from_clouds_data(api.parse_clouds_data(payloads.clouds_payload(3, start=start)))
+    sun_moon_data = ephemeris.sun_moon_data(np.datetime64(start, "D") + np.arange(3), 55.75, 37.62, "Europe/Moscow")
+    windows = WindowIndex()
+    for key, timezone in (("moscow", "Europe/Moscow"), ("east", "Asia/Vladivostok")):
+        windows.update(key, clouds_data, sun_moon_data, config.TIME_FILTER, config.CLOUDINESS_FILTER, timezone)
+
+    best = windows.best(100, now=datetime(2025, 1, 10, 3, 30, tzinfo=ZoneInfo("Europe/Moscow")))
+    first_night = {site: min(window["start"] for window in best if window["site"] == site).date() for site in ("moscow", "east")}
+    assert first_night == {"moscow": start, "east": start + timedelta(days=1)}, first_night
+
+def check_daemon_combined_request(server: StubServer, directory: str) -> None:
+    # При комбинированном запросе служба делает один запрос на ячейку, и в данных есть оценка качества наблюдений
+    config = smoke_config(directory, COMBINED_REQUEST=True)
+    delivered = []
+    daemon = ForecastDaemon([{"NAME": "smoke", "LATITUDE": 55.75, "LONGITUDE": 37.62}], lambda site, clouds_data, sun_moon_data: delivered.append(clouds_data), report_interval=10 ** 6, config=config)
+    try:
+        sent = server.requests["meteoblue"]
+        daemon.run_once()
+        assert server.requests["meteoblue"] - sent == 1, f"{server.requests['meteoblue'] - sent} запросов"
+        assert len(delivered) == 1 and HourlySeries.from_clouds_data(delivered[0]).quality is not None, "нет оценки качества"
+    finally:
+        daemon.executor.shutdown(wait=True)
+
+def check_long_report(server: StubServer, directory: str) -> None:
+    # Отчёт длиннее лимита Telegram отправляется частями, а при обновлении части редактируются и лишние удаляются
+    smoke_config(directory)
+    long_message = "строка отчёта\n" * (2 * telegram.MESSAGE_LIMIT // 14)
+    message_ids = main.send_report(long_message)
+    assert len(message_ids) == 3, f"{len(message_ids)} частей"
+
+    calls = len(server.telegram_calls)
+    updated_ids = main.send_report("обновлённый отчёт", message_ids)
+    methods = [method for method, _ in server.telegram_calls[calls:]]
+    assert updated_ids == message_ids[:1], updated_ids
+    assert methods == ["editMessageText", "deleteMessage", "deleteMessage"], methods
+
+    # Отчёт, который не помещается в отправленные части, отправляется заново
+    calls = len(server.telegram_calls)
+    assert len(main.send_report(long_message, updated_ids)) == 3
+    assert [method for method, _ in server.telegram_calls[calls:]] == ["sendMessage"] * 3
+
+def check_delivery_retries(server: StubServer, directory: str) -> None:
+    # Отложенная повторная попытка не занимает единственный рабочий поток, а ключи доставленных сообщений не накапливаются
+    config = smoke_config(directory)
+    failures = {"failing": 2}
+    delivered = []
+
+    def send(chat_id: str, text: str) -> None:
+        if failures.get(chat_id):
+            failures[chat_id] -= 1
+            raise requests.RequestException("временная ошибка")
+        delivered.append(chat_id)
+
+    queue = delivery.DeliveryQueue(workers=1, global_rate=1000, chat_rate=1000, send=send, config=config)
+    queue.submit_many(["failing", "healthy"], "сообщение")
+    queue.join()
+    assert delivered == ["healthy", "failing"], delivered
+    assert queue.stats == {"sent": 2, "retried": 2, "failed": 0, "throttled": 0}, queue.stats
+    assert not queue._delivered_parts
+
+    # После DEDUPLICATION_TTL ключ доставленного сообщения забывается, и то же сообщение можно отправить снова
+    with queue._lock:
+        queue._expire_keys(time.monotonic() + delivery.DEDUPLICATION_TTL)
+    assert not queue._known_keys and not queue._expiring_keys
+    queue.submit("healthy", "сообщение")
+    queue.join()
+    assert delivered.count("healthy") == 2
+
+    # Неожиданная ошибка отправки считается неудачной попыткой и не оставляет join() ждать вечно,
+    # а ответы 429 не расходуют попытки: сообщение доставляется после любого их количества
+    throttled = {"throttled": 3}
+
+    def send_unreliable(chat_id: str, text: str) -> None:
+        if chat_id == "broken":
+            raise ValueError("неожиданный ответ API")
+        if throttled.get(chat_id):
+            throttled[chat_id] -= 1
+            raise telegram.TelegramRetryAfter("Too Many Requests", 0.05)
+        delivered.append(chat_id)
+
+    queue = delivery.DeliveryQueue(workers=1, global_rate=1000, chat_rate=1000, max_attempts=2, send=send_unreliable, config=config)
+    queue.submit_many(["broken", "throttled"], "сообщение")
+    queue.join()
+    assert delivered[-1] == "throttled", delivered
+    assert queue.stats == {"sent": 1, "retried": 1, "failed": 1, "throttled": 3}, queue.stats
+
+def check_sun_per_cell(server: StubServer, directory: str) -> None:
+    # Закат и сумерки рассчитываются один раз на дату и ячейку сетки: два места одной ячейки - по одному промаху на дату
+    smoke_config(directory, SUN_MOON_SOURCE="local")
+    astronomy_cache.clear()
+    dates = np.datetime64(date.today(), "D") + np.arange(3)
+    first, second = ephemeris.sun_moon_data_sites(dates, [55.751, 55.759], [37.621, 37.629], "Europe/Moscow", 0.05)
+    assert astronomy_cache.stats()["sun"]["misses"] == len(dates), astronomy_cache.stats()
+    assert first["sunset"] == second["sunset"] and first["astronomical_dusk"] == second["astronomical_dusk"]
+    ephemeris.sun_moon_data(dates, 55.755, 37.625, "Europe/Moscow", 0.05)
+    assert astronomy_cache.stats()["sun"]["misses"] == len(dates), astronomy_cache.stats()
+    # Освещённость Луны в полночь рассчитывается напрямую, без записей в кэше
+    assert api.parse_sun_moon_data(payloads.sun_moon_payload(3))["moon_illumination"]
+    assert "moon_illumination" not in astronomy_cache.stats()
+
+def age_cache_entry(cache: ResponseCache, key: str, seconds: float, accessed: float = None) -> None:
+    """
+    Сдвигает момент сохранения записи кэша на seconds секунд назад и, если задано, время последнего обращения (mtime).
+    """
+    path = os.path.join(cache.directory, f"{key}.json")
+    with open(path, "r", encoding="utf-8") as file:
+        entry = json.load(file)
+    entry["stored_at"] -= seconds
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(entry, file)
+    if accessed is not None:
+        os.utime(path, (accessed, accessed))
+
+def check_response_cache(server: StubServer, directory: str) -> None:
+    # Запись свежая в течение TTL эндпоинта, затем ещё stale_ttl секунд выдаётся как устаревшая, после - промах
+    cache = ResponseCache(os.path.join(directory, "cache"), {"/sunmoon": 100}, default_ttl=10, stale_ttl=50)
+    key = cache.make_key("/sunmoon", {"lat": 55.7512, "lon": 37.6184, "tz": "Europe/Moscow", "apikey": "KEY"})
+    assert key == cache.make_key("/sunmoon", {"lat": 55.75, "lon": 37.62, "tz": "Europe/Moscow"})
+    assert cache.get(key, "/sunmoon") == (None, None)
+    cache.set(key, {"value": 1})
+    assert cache.get(key, "/sunmoon") == ({"value": 1}, "fresh")
+    assert cache.get(key, "/clouds-1h") == ({"value": 1}, "fresh")
+    age_cache_entry(cache, key, 60)
+    assert cache.get(key, "/sunmoon") == ({"value": 1}, "fresh")
+    assert cache.get(key, "/clouds-1h") == (None, None)
+    age_cache_entry(cache, key, 60)
+    assert cache.get(key, "/sunmoon") == ({"value": 1}, "stale")
+
+    # Устаревшая запись обновляется в фоне один раз, повторный запрос обновления того же ключа игнорируется
+    loads = []
+    cache.refresh_in_background(key, lambda: loads.append(1) or time.sleep(0.1) or {"value": 2})
+    cache.refresh_in_background(key, lambda: loads.append(1) or {"value": 3})
+    while cache._refreshing:
+        time.sleep(0.01)
+    assert loads == [1] and cache.get(key, "/sunmoon") == ({"value": 2}, "fresh")
+    age_cache_entry(cache, key, 200)
+    assert cache.get(key, "/sunmoon") == (None, None)
+
+    # При превышении max_bytes вытесняются записи с самым давним обращением до EVICT_TARGET_RATIO * max_bytes
+    cache = ResponseCache(os.path.join(directory, "evict"), {}, max_bytes=10 * 1024)
+    keys = [cache.make_key("/clouds-1h", {"lat": index, "lon": 0}) for index in range(12)]
+    now = time.time()
+    for index, key in enumerate(keys[:9]):
+        cache.set(key, {"payload": "x" * 1000})
+        age_cache_entry(cache, key, 0, accessed=now - 100 + index)
+    # Обращение к старейшей записи защищает её от вытеснения
+    assert cache.get(keys[0], "/clouds-1h")[1] == "fresh"
+    for key in keys[9:]:
+        cache.set(key, {"payload": "x" * 1000})
+    kept = [key for key in keys if os.path.exists(os.path.join(cache.directory, f"{key}.json"))]
+    sizes = sum(entry.stat().st_size for entry in os.scandir(cache.directory) if entry.name.endswith(".json"))
+    assert keys[0] in kept and keys[1] not in kept and keys[-1] in kept, kept
+    assert sizes <= cache.max_bytes * EVICT_TARGET_RATIO and cache._size == sizes, (sizes, cache._size)
+    assert not [name for name in os.listdir(cache.directory) if name.endswith(".tmp")]
+
+def check_token_bucket(server: StubServer, directory: str) -> None:
+    # Полное ведро выдаёт capacity токенов сразу, дальше - со скоростью rate в секунду
+    bucket = delivery.TokenBucket(rate=50, capacity=5)
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.05
+    for _ in range(5):
+        bucket.acquire()
+    elapsed = time.monotonic() - started
+    assert 0.09 <= elapsed < 0.3, elapsed
+
+    # Пауза (retry_after) обнуляет ведро и задерживает выдачу, более короткая пауза её не сокращает
+    bucket = delivery.TokenBucket(rate=1000)
+    bucket.pause(0.2)
+    bucket.pause(0.05)
+    started = time.monotonic()
+    bucket.acquire()
+    elapsed = time.monotonic() - started
+    assert 0.19 <= elapsed < 0.4, elapsed
+
+    # Потоки делят токены ведра: 3 потока по 4 токена при 40 токенах в секунду и ёмкости 2 - около 0.25 секунды
+    bucket = delivery.TokenBucket(rate=40, capacity=2)
+    started = time.monotonic()
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(4)]) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    assert 0.24 <= elapsed < 0.5, elapsed
+
+def check_grid_dedup(server: StubServer, directory: str) -> None:
+    # Места по разные стороны границы ячейки запрашиваются отдельно, места на границе относятся к ячейке, которая с неё начинается
+    config = smoke_config(directory, GRID_CELL_SIZE=0.05)
+    assert cell_key(0.15, 0.35, "UTC", 0.05) == cell_key(0.1999, 0.3999, "UTC", 0.05) == (3, 7, "UTC")
+    assert cell_key(0.1499, 0.35, "UTC", 0.05)[0] == 2 and cell_key(-0.0001, -0.0001, "UTC", 0.05)[:2] == (-1, -1)
+    sites = [
+        {"NAME": "Граница снизу", "LATITUDE": 55.7499, "LONGITUDE": 37.61},
+        {"NAME": "Граница сверху", "LATITUDE": 55.75, "LONGITUDE": 37.61},
+        {"NAME": "Та же ячейка", "LATITUDE": 55.7999, "LONGITUDE": 37.6499},
+    ]
+    sent = server.requests["meteoblue"]
+    results = fetch_cells(sites, config=config)
+    assert server.requests["meteoblue"] - sent == 4, f"{server.requests['meteoblue'] - sent} запросов на 2 ячейки"
+    assert [result["site"]["NAME"] for result in results] == [site["NAME"] for site in sites]
+    assert results[1]["clouds_data"] is not results[0]["clouds_data"] and results[1]["clouds_data"] is results[2]["clouds_data"]
+
+    # Места одной ячейки с разными часовыми поясами получают данные в своём поясе, без часового пояса - в поясе TIMEZONE
+    sites = [
+        {"NAME": "Москва", "LATITUDE": 55.751, "LONGITUDE": 37.618},
+        {"NAME": "Москва явно", "LATITUDE": 55.752, "LONGITUDE": 37.619, "TIMEZONE": "Europe/Moscow"},
+        {"NAME": "UTC", "LATITUDE": 55.753, "LONGITUDE": 37.62, "TIMEZONE": "UTC"},
+    ]
+    index = GridIndex.build(sites, cell_size=0.05, default_timezone=config.TIMEZONE)
+    assert len(index) == 2 and [index.subscribers(cell) for cell in index.cells()] == [[0, 1], [2]]
+    assert [index.cell_site(cell)["TIMEZONE"] for cell in index.cells()] == ["Europe/Moscow", "UTC"]
+    sent = server.requests["meteoblue"]
+    results = fetch_cells(sites, config=config)
+    assert server.requests["meteoblue"] - sent == 4, f"{server.requests['meteoblue'] - sent} запросов на 2 ячейки"
+    assert results[0]["clouds_data"] is results[1]["clouds_data"] is not results[2]["clouds_data"]
+    assert [result["sun_moon_data"]["sunset"][0].tzinfo for result in results] == [ZoneInfo("Europe/Moscow")] * 2 + [ZoneInfo("UTC")]
+
+class ChunkedReader(io.RawIOBase):
+    """
+    Файлоподобный объект, который отдаёт данные блоками не больше chunk_size байт, как сетевой поток.
+    """
+
+    def __init__(self, data: bytes, chunk_size: int):
+        self.source = io.BytesIO(data)
+        self.chunk_size = chunk_size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.source.read(min(len(buffer), self.chunk_size))
+        buffer[:len(data)] = data
+        return len(data)
+
+def check_streaming_parser(server: StubServer, directory: str) -> None:
+    # Потоковый разбор извлекает те же значения, что и полный разбор, при любой разбивке потока на блоки
+    response = payloads.combined_payload(["basic-1h", "clouds-1h", "sunmoon"], 10)
+    response["data_1h"]["totalcloudcover"][5] = 12.5
+    raw = json.dumps(response).encode("utf-8")
+    assert len(raw) > STREAM_BUFFER_SIZE * 2
+    fields = api.response_fields("/basic-1h_clouds-1h_sunmoon")
+    expected = {}
+    for field in fields:
+        section, name = field.split(".")
+        if name in response[section]:
+            expected.setdefault(section, {})[name] = response[section][name]
+    for chunk_size in (1, 7, STREAM_BUFFER_SIZE - 1, STREAM_BUFFER_SIZE * 3):
+        assert stream_fields(ChunkedReader(raw, chunk_size), fields) == expected, chunk_size
+
+    # Поля ошибки извлекаются из любого ответа, отсутствующие поля и вложенные объекты вне полей пропускаются
+    error = b'{"error": true, "error_message": "API key invalid", "metadata": {"data_1h": {"time": ["x"]}}}'
+    assert stream_fields(io.BytesIO(error), fields) == {"error": True, "error_message": "API key invalid"}
+    assert stream_fields(io.BytesIO(b'{"data_1h": {"time": []}, "data_day": {}}'), fields) == {"data_1h": {"time": []}}
+
+    # Оборванный ответ - ошибка разбора, которую fetch() приводит к RequestException
+    try:
+        stream_fields(io.BytesIO(raw[:len(raw) // 2]), fields)
+        raise AssertionError("оборванный ответ разобран без ошибки")
+    except ijson.JSONError:
+        pass
+
+def check_archive_compaction(server: StubServer, directory: str) -> None:
+    # Прогноз на стыке месяцев пишется в два раздела, уплотнение оставляет по одному сегменту без повторов ключа
+    path = os.path.join(directory, "archive")
+    archive = ForecastArchive(path, max_segments=4)
+    hours = np.arange(np.datetime64("2025-01-31T00:00"), np.datetime64("2025-02-01T12:00"), np.timedelta64(1, "h"))
+    sun_moon_data = api.parse_sun_moon_data(payloads.sun_moon_payload(2, start=date(2025, 1, 31)), "Europe/Moscow")
+    first_issue = datetime(2025, 1, 30, 12, tzinfo=timezone.utc)
+    second_issue = first_issue + timedelta(hours=6)
+
+    def add(site_key: str, cloudiness: int, issued: datetime) -> None:
+        archive.add(site_key, HourlySeries(hours, np.full(len(hours), cloudiness)), sun_moon_data, issued)
+        archive.flush()
+
+    add("A", 10, first_issue)
+    add("B", 20, first_issue)
+    add("A", 30, second_issue)
+    # Повторная запись того же прогноза (тот же ключ) заменяет предыдущую при уплотнении
+    add("A", 40, second_issue)
+    table = archive.hourly_table
+    assert table.partitions() == ["2025-01", "2025-02"] and [len(table.segments(name)) for name in table.partitions()] == [4, 4]
+    assert len(archive.hourly()["site"]) == len(hours) * 4
+    assert set(archive.forecast_as_of("A", second_issue + timedelta(minutes=1))["cloudiness"].tolist()) == {40}
+
+    assert archive.compact() == len(hours) * 3
+    assert [len(table.segments(name)) for name in table.partitions()] == [1, 1]
+    assert [len(archive.daily_table.segments(name)) for name in archive.daily_table.partitions()] == [1, 1]
+    rows = archive.hourly(["A"])
+    assert len(rows["site"]) == len(hours) * 2
+    assert {(str(issued), int(cloudiness)) for issued, cloudiness in zip(rows["issued"], rows["cloudiness"])} == {("2025-01-30T12:00", 10), ("2025-01-30T18:00", 40)}
+    assert archive.forecast_as_of("A", first_issue + timedelta(minutes=1))["cloudiness"].tolist() == [10] * len(hours)
+    assert len(archive.daily(["A"])["date"]) == 4 and set(archive.hourly(["B"])["cloudiness"].tolist()) == {20}
+
+    # Раздел уплотняется при записи, как только сегментов становится больше max_segments
+    for hour in range(1, 5):
+        add("B", 50 + hour, second_issue + timedelta(hours=hour))
+        assert all(len(table.segments(name)) <= 4 for name in table.partitions())
+    assert [len(table.segments(name)) for name in table.partitions()] == [1, 1]
+    assert not [name for partition in table.partitions() for name in os.listdir(os.path.join(table.directory, partition)) if name.startswith(".")]
+
+    # Коды мест сохраняются между экземплярами архива
+    reopened = ForecastArchive(path)
+    assert reopened.site_keys() == ["A", "B"] and len(reopened.hourly()["site"]) == len(hours) * 7
+
+# Проверки в порядке выполнения
+CHECKS = [check_combined_request, check_change_delivery, check_polar_site, check_days_by_date, check_daemon_day_change, check_daemon_grid, check_windows_time_zones, check_daemon_combined_request, check_long_report, check_delivery_retries, check_sun_per_cell, check_response_cache, check_token_bucket, check_grid_dedup, check_streaming_parser, check_archive_compaction]
+
+def run() -> bool:
+    """
+    Выполняет все проверки и выводит их результат.
+
+    Returns:
+        bool: Все проверки прошли успешно.
+    """
+    passed = True
+    with StubServer() as server:
+        api.API_BASE_URL = server.url + "packages/"
+        telegram.BOT_API_BASE_URL = server.url
+        for check in CHECKS:
+            with tempfile.TemporaryDirectory() as directory:
+                try:
+                    check(server, directory)
+                    print(f"OK   {check.__name__}")
+                except Exception:
+                    passed = False
+                    print(f"FAIL {check.__name__}\n{traceback.format_exc()}")
+    return passed
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
@@ -0,0 +1,128 @@
+import gzip
+import json
+import random
+import threading
+import time
+import zlib
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.payloads import combined_payload
+
+# Пакеты API meteoblue, которые умеет генерировать заглушка
+STUB_PACKAGES = {"basic-1h", "clouds-1h", "sunmoon"}
+
+class StubServer:
+    """
+    Локальная замена API meteoblue и Telegram Bot API для бенчмарков.
+
+    Отвечает на GET /packages/clouds-1h, /packages/sunmoon, /packages/basic-1h и их комбинации
+    (например, /packages/basic-1h_clouds-1h_sunmoon) синтетическими данными (см. payloads)
+    и на POST /bot<token>/<метод> (sendMessage, editMessageText, deleteMessage) успешным ответом Telegram.
+    Вызовы Telegram (метод и параметры) сохраняются в telegram_calls.
+    Если клиент принимает gzip (Accept-Encoding), ответ meteoblue передаётся сжатым.
+    Задержка ответа и доля ошибок настраиваются. Ошибка API meteoblue возвращается как
+    {"error": true, "error_message": ...}, ошибка Telegram - как ответ 429 с retry_after.
+
+    Example:
+        >>> with StubServer(latency=0.05, error_rate=0.01) as server:
+        ...     api.API_BASE_URL = server.url + "packages/"
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        """
+        Args:
+            latency (float, optional): Базовая задержка ответа в секундах.
+            jitter (float, optional): Случайная добавка к задержке (равномерно от 0 до jitter секунд).
+            error_rate (float, optional): Доля запросов, завершающихся ошибкой (от 0 до 1).
+            seed (int, optional): Зерно генератора случайных чисел.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = {"meteoblue": 0, "telegram": 0, "errors": 0}
+        self.telegram_calls = []
+        self._lock = threading.Lock()
+        self._payload_cache = {}
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/"
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _delay_and_fail(self, kind: str) -> bool:
+        with self._lock:
+            self.requests[kind] += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.requests["errors"] += 1
+        time.sleep(delay)
+        return failed
+
+    def _meteoblue_payload(self, endpoint: str, query: dict) -> bytes:
+        # Одинаковые параметры - одинаковый ответ, генерируем его один раз
+        days = int(query.get("forecast_days", ["3"])[0])
+        seed = zlib.crc32(f'{query.get("lat", ["0"])[0]},{query.get("lon", ["0"])[0]}'.encode("utf-8"))
+        key = (endpoint, days, seed)
+        if key not in self._payload_cache:
+            payload = combined_payload(endpoint.split("_"), days, seed)
+            self._payload_cache[key] = json.dumps(payload).encode("utf-8")
+        return self._payload_cache[key]
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status: int, body: bytes, compress: bool = False) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+                    body = gzip.compress(body, compresslevel=5)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                request = urlparse(self.path)
+                endpoint = request.path.rsplit("/", 1)[-1]
+                if not set(endpoint.split("_")) <= STUB_PACKAGES:
+                    return self._reply(404, b'{"error": true, "error_message": "unknown package"}')
+                if stub._delay_and_fail("meteoblue"):
+                    return self._reply(200, b'{"error": true, "error_message": "stub error"}')
+                self._reply(200, stub._meteoblue_payload(endpoint, parse_qs(request.query)), compress=True)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if stub._delay_and_fail("telegram"):
+                    body = {"ok": False, "error_code": 429, "description": "Too Many Requests", "parameters": {"retry_after": 1}}
+                    return self._reply(429, json.dumps(body).encode("utf-8"))
+                stub.telegram_calls.append((urlparse(self.path).path.rsplit("/", 1)[-1], payload))
+                result = {"message_id": stub.requests["telegram"], "chat": {"id": payload.get("chat_id")}, "text": payload.get("text")}
+                self._reply(200, json.dumps({"ok": True, "result": result}).encode("utf-8"))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -1,35 +1,260 @@
+import argparse
+import datetime
+import signal
 import sys
 import traceback
+from zoneinfo import ZoneInfo
 try:
-    from modules.data_processing.weather import process_weather_data, outdated_data_filter
+    from modules.data_processing.weather import HourlySeries, observing_hours_mask, process_weather_data, outdated_data_mask
+    from modules.data_processing.windows import WindowIndex
+    from modules.data_processing.memo import astronomy_cache
+    from modules.data_processing.fingerprint import FingerprintStore, fingerprint, day_fingerprints, changed_days
     from modules.data_presentation import report
-    from modules.data_providers.api import get_clouds_data, get_sun_moon_data
+    from modules.data_providers.archive import ForecastArchive
+    from modules.data_providers.api import get_clouds_data, get_combined_data, get_sun_moon_data
+    from modules.data_providers.grid import fetch_cells
+    from modules.data_providers.config_loader import Config, get_config
+    from modules.metrics import metrics, create_sink
+    from modules.profiling import profile_run
+    from modules.daemon import ForecastDaemon
     from modules.data_presentation import telegram
+    from modules.data_presentation.delivery import DeliveryQueue
 # Если при инициализации модулей произошла ошибка, выводим её в консоль и завершаем работу программы.
 except Exception as error:
     print(error)
     sys.exit(1)
 
-def main():
-    clouds_data = get_clouds_data()
-    sun_moon_data = get_sun_moon_data()
-    filtered_clouds_data = outdated_data_filter(clouds_data["date_time"], clouds_data["cloudiness"])
-    processed_data = process_weather_data(filtered_clouds_data, sun_moon_data)
-    composed_report = report.compose_report(processed_data)
-    
-    #Если успешно сформирован отчёт, отправляем его в бот
+# Настройки места наблюдения, от которых зависит содержимое отчёта. Входят в отпечаток исходных данных.
+REPORT_SETTINGS = ("TIMEZONE", "TIME_FILTER", "CLOUDINESS_FILTER", "BEST_WINDOWS")
+
+# Конфигурация запуска, отпечатки последних отправленных прогнозов для каждого места наблюдения,
+# очередь рассылки отчётов подписчикам и архив прогнозов (None, если архив отключён). Создаются в setup() после загрузки конфига.
+config = None
+fingerprints = None
+delivery_queue = None
+archive = None
+
+# Окна ясной погоды всех мест наблюдения. Обновляются при обработке прогноза места и сохраняются между запусками службы.
+window_index = WindowIndex()
+
+def setup(loaded_config: Config) -> None:
+    global config, fingerprints, delivery_queue, archive
+    config = loaded_config
+    fingerprints = FingerprintStore(config.FINGERPRINT_FILE)
+    # Отправка подписчикам выполняется в фоновых потоках и не задерживает обработку
+    delivery_queue = DeliveryQueue(config=config)
+    # Метрики выполнения записываются в приёмник, заданный в конфиге (METRICS_SINK)
+    metrics.sink = create_sink(config.METRICS_SINK, config.METRICS_PATH)
+    archive = ForecastArchive(config.ARCHIVE_DIR, config.ARCHIVE_MAX_SEGMENTS) if config.ARCHIVE_ENABLED else None
+    # Закат, сумерки и освещённость Луны для уже встречавшихся дат и мест берутся из кэша (в памяти и, если задан файл, на диске)
+    astronomy_cache.configure(config.ASTRONOMY_CACHE_SIZE, config.ASTRONOMY_CACHE_TTL, config.ASTRONOMY_CACHE_FILE)
+    # Шаблон отчёта компилируется один раз (или загружается из кэша байткода) до обработки прогнозов
+    report.get_template(config.TEMPLATE_CACHE_DIR)
+
+def flush_archive() -> None:
+    # Прогнозы, накопленные за запуск, записываются в архив одним сегментом
+    if archive is not None:
+        with metrics.stage("archive"):
+            metrics.increment("archive_rows", archive.flush())
+
+def default_site() -> dict:
+    return {"NAME": None, "LATITUDE": config.LATITUDE, "LONGITUDE": config.LONGITUDE}
+
+def site_key(site: dict) -> str:
+    return site.get("NAME") or f"{site['LATITUDE']},{site['LONGITUDE']}"
+
+def prepare_weather_data(clouds_data: dict, sun_moon_data: dict, site: dict = {}) -> dict:
+    # Фильтры места наблюдения, если они заданы в SITES, иначе - общие фильтры из конфига
+    site_config = config.for_site(site)
+    clouds_series = HourlySeries.from_clouds_data(clouds_data)
+    if archive is not None:
+        with metrics.stage("archive"):
+            archive.add(site_key(site), clouds_series, sun_moon_data)
+    with metrics.stage("filter_outdated"):
+        # Прошедшие часы отбрасываются по местному времени места наблюдения, в часовом поясе которого получен прогноз
+        local_now = datetime.datetime.now(ZoneInfo(site_config.TIMEZONE)).replace(tzinfo=None)
+        filtered_clouds_data = clouds_series.select(outdated_data_mask(clouds_series, local_now))
+    with metrics.stage("process"):
+        # Подходящие для наблюдений часы отбираются один раз - и для отчёта, и для индекса окон
+        observing_hours = observing_hours_mask(filtered_clouds_data, sun_moon_data, site_config.TIME_FILTER, site_config.CLOUDINESS_FILTER)
+        processed_data = process_weather_data(filtered_clouds_data, sun_moon_data, site_config.TIME_FILTER, site_config.CLOUDINESS_FILTER, observing_hours)
+    with metrics.stage("windows"):
+        window_index.update(site_key(site), filtered_clouds_data, sun_moon_data, site_config.TIME_FILTER, site_config.CLOUDINESS_FILTER, site_config.TIMEZONE, observing_hours)
+
+    metrics.increment("hours_received", len(clouds_series))
+    metrics.increment("hours_after_outdated_filter", len(filtered_clouds_data))
+    metrics.increment("hours_kept", sum(len(day_data["date_time"]) for day_data in processed_data.values()))
+    metrics.increment("days_kept", len(processed_data))
+    return processed_data
+
+def send_report(message: str, previous_message_ids: list[int] = None, site_config: Config = None) -> list[int]:
+    # Пробуем отредактировать предыдущее сообщение (все его части). Если это невозможно (сообщение удалено,
+    # отчёт стал длиннее и т.п.) - отправляем новое.
+    if previous_message_ids:
+        try:
+            return telegram.bot_edit_message(previous_message_ids, message, config=site_config)
+        except Exception as error:
+            print(f"Не удалось отредактировать предыдущее сообщение, отправляем новое: {error}")
+    return telegram.bot_send_tracked_message(message, config=site_config)
+
+def sent_message_ids(record: dict) -> list[int]:
+    # Идентификаторы частей последнего отправленного отчёта. Записи, сохранённые до разбиения отчётов на части, хранят один message_id.
+    if "message_ids" in record:
+        return record["message_ids"]
+    return [record["message_id"]] if record.get("message_id") is not None else []
+
+def plan_report(site: dict, clouds_data: dict, sun_moon_data: dict) -> dict:
+    # Обрабатывает прогноз места и решает, нужно ли формировать отчёт. Возвращает либо готовый результат (result),
+    # либо задание на формирование отчёта (job - аргументы report.compose_report()) и данные для его доставки.
+    key = site_key(site)
+    site_config = config.for_site(site)
+    previous = fingerprints.get(key)
+
+    # Если исходные данные и действующие настройки места не изменились с прошлой отправки - не пересчитываем
+    # и не отправляем отчёт. После изменения фильтров (в конфиге или профиле) прогноз обрабатывается заново.
+    settings = {name: getattr(site_config, name) for name in REPORT_SETTINGS}
+    payload_fingerprint = fingerprint([site, settings, clouds_data, sun_moon_data])
+    if previous.get("payload") == payload_fingerprint:
+        return {"result": {"status": "unchanged", "message": "Прогноз не изменился"}}
+
+    processed_data = prepare_weather_data(clouds_data, sun_moon_data, site)
+    current_days = day_fingerprints(processed_data)
+    previous_days = previous.get("days", {})
+    updated_days = changed_days(previous_days, current_days)
+    # Дни, в которых пропали окна ясной погоды (прошедшие дни не учитываются). Даты отпечатков - в часовом поясе места.
+    today = datetime.datetime.now(ZoneInfo(site_config.TIMEZONE)).date().isoformat()
+    removed_days = [day for day in previous_days if day not in current_days and day >= today]
+
+    # Окна ясной погоды не изменились - отчёт не формируется и не отправляется
+    if "days" in previous and not updated_days and not removed_days:
+        fingerprints.update(key, payload=payload_fingerprint)
+        return {"result": {"status": "unchanged", "message": "Окна ясной погоды не изменились"}}
+
+    # Если изменились только некоторые дни (и новых дней не появилось) - редактируем предыдущее сообщение (edit)
+    # или отправляем изменившиеся дни отдельным сообщением (delta). Первый отчёт, новый день прогноза или
+    # изменение всех дней - новое сообщение с полным отчётом, чтобы актуальный отчёт был последним в чате.
+    new_days = [day for day in current_days if day not in previous_days]
+    is_partial = "days" in previous and not new_days and len(updated_days) < len(current_days)
+    is_delta = is_partial and site_config.CHANGE_DELIVERY == "delta" and bool(updated_days) and not removed_days
+    is_edit = is_partial and site_config.CHANGE_DELIVERY == "edit"
+    if is_delta:
+        delta_data = {day: day_data for day, day_data in processed_data.items() if day.isoformat() in updated_days}
+        job = {"weather_data": delta_data, "site_name": site["NAME"], "is_update": True, "cloudiness_filter": site_config.CLOUDINESS_FILTER}
+    else:
+        best_windows = window_index.best(site_config.BEST_WINDOWS, sites=[key])
+        job = {"weather_data": processed_data, "site_name": site["NAME"], "cloudiness_filter": site_config.CLOUDINESS_FILTER, "best_windows": best_windows}
+
+    return {
+        "job": job, "key": key, "site_config": site_config, "previous": previous,
+        "payload": payload_fingerprint, "days": current_days, "is_delta": is_delta, "is_edit": is_edit,
+    }
+
+def finish_report(plan: dict, composed_report: dict) -> dict:
+    # Отправляет сформированный отчёт и сохраняет отпечатки прогноза
+    site_config = plan["site_config"]
     if composed_report["status"] == "success":
-        telegram.bot_send_message(composed_report["message"])
+        metrics.increment("reports_rendered")
+        metrics.increment("report_bytes", len(composed_report["message"].encode("utf-8")))
+        with metrics.stage("deliver"):
+            previous_ids = sent_message_ids(plan["previous"]) if plan["is_edit"] else []
+            message_ids = send_report(composed_report["message"], previous_ids, site_config)
+            fingerprints.update(plan["key"], payload=plan["payload"], days=plan["days"], message_ids=message_ids)
+            # Подписчики получают то же, что и основной чат: новое сообщение (полный отчёт или изменившиеся дни).
+            # Правка предыдущего сообщения основного чата подписчикам не рассылается.
+            is_new_message = not set(message_ids) <= set(previous_ids)
+            if site_config.SUBSCRIBER_CHAT_IDS and is_new_message:
+                delivery_queue.submit_many(site_config.SUBSCRIBER_CHAT_IDS, composed_report["message"])
 
     return composed_report
 
+def deliver_report(site: dict, clouds_data: dict, sun_moon_data: dict) -> dict:
+    plan = plan_report(site, clouds_data, sun_moon_data)
+    if "job" not in plan:
+        return plan["result"]
+    with metrics.stage("render"):
+        composed_report = report.compose_report(**plan["job"])
+    return finish_report(plan, composed_report)
+
+def main():
+    with metrics.stage("fetch"):
+        # Комбинированный запрос возвращает все данные одним ответом
+        if config.COMBINED_REQUEST:
+            clouds_data, sun_moon_data = get_combined_data(config)
+        else:
+            clouds_data = get_clouds_data(config)
+            sun_moon_data = get_sun_moon_data(config)
+
+    # Отчёт отправляется в бот, только если прогноз изменился с прошлого запуска
+    composed_report = deliver_report(default_site(), clouds_data, sun_moon_data)
+
+    # Дожидаемся окончания рассылки подписчикам перед завершением процесса
+    with metrics.stage("deliver"):
+        delivery_queue.join()
+    return composed_report
+
+def main_batch(sites: list[dict]) -> list[dict]:
+    # Данные запрашиваются параллельно, один раз на каждую ячейку сетки прогноза, отчёты формируются и отправляются по очереди
+    with metrics.stage("fetch"):
+        results = fetch_cells(sites, config=config)
+    plans = []
+    for result in results:
+        site_name = result["site"]["NAME"]
+        if "error" in result:
+            plans.append({"result": {"status": "error", "message": f"{site_name}: {result['error']}"}})
+        else:
+            plans.append(plan_report(result["site"], result["clouds_data"], result["sun_moon_data"]))
+
+    # Отчёты всех мест формируются одним пакетом (при большом количестве - в пуле процессов)
+    with metrics.stage("render"):
+        rendered = iter(report.compose_reports([plan["job"] for plan in plans if "job" in plan], config.RENDER_WORKERS, config.TEMPLATE_CACHE_DIR))
+    composed_reports = [finish_report(plan, next(rendered)) if "job" in plan else plan["result"] for plan in plans]
+
+    with metrics.stage("deliver"):
+        delivery_queue.join()
+    return composed_reports
+
+def main_daemon(sites: list[dict]) -> None:
+    # Процесс не завершается между запусками: конфиг, шаблон и HTTP-сессия остаются загруженными
+    daemon = ForecastDaemon(sites, deliver_report, after_reports=flush_archive, config=config)
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: daemon.stop())
+    daemon.run_forever()
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Прогноз астрономической видимости")
+    parser.add_argument("--daemon", action="store_true", help="Работать в режиме службы с внутренним планировщиком вместо разового запуска")
+    parser.add_argument("--config", help="Путь к файлу конфигурации. По умолчанию - ./config.yml или переменная окружения ASTRO_SEEING_CONFIG")
+    parser.add_argument("--profile", help="Имя профиля конфигурации из раздела PROFILES")
+    parser.add_argument("--profiler", help="Профилировать запуск: cprofile, sample и/или memory через запятую. По умолчанию - переменная окружения ASTRO_SEEING_PROFILER")
+    parser.add_argument("--profiler-dir", help="Каталог для результатов профилирования. По умолчанию - ./state/profiles или переменная окружения ASTRO_SEEING_PROFILER_DIR")
+    args = parser.parse_args()
+
+    # Если конфиг не удалось загрузить или режим профилирования задан неверно, выводим ошибку в консоль и завершаем работу программы
     try:
-        main()
-    # Если где-либо в основном потоке произошла ошибка, её перехватит этот обработчик.
-    # Выводим её в консоль, по возможности отправляем в бот, и завершаем работу программы.
-    except Exception:
-        error_traceback = traceback.format_exc()
-        print(error_traceback)
-        telegram.bot_send_message(f"Произошла ошибка: \n {error_traceback}")
-        sys.exit(1)
\ No newline at end of file
+        setup(get_config(args.config, args.profile))
+        profiler = profile_run(args.profiler, args.profiler_dir)
+    except Exception as error:
+        print(error)
+        sys.exit(1)
+
+    # Профилирование (если включено) охватывает весь запуск, результаты записываются и при ошибке
+    with profiler:
+        try:
+            if args.daemon:
+                main_daemon(config.SITES or [default_site()])
+            # Если в конфиге задан список мест наблюдения - работаем в пакетном режиме
+            elif config.SITES:
+                main_batch(config.SITES)
+            else:
+                main()
+            flush_archive()
+            metrics.flush()
+        # Если где-либо в основном потоке произошла ошибка, её перехватит этот обработчик.
+        # Выводим её в консоль, по возможности отправляем в бот, и завершаем работу программы.
+        except Exception:
+            error_traceback = traceback.format_exc()
+            print(error_traceback)
+            metrics.increment("run_errors")
+            metrics.flush()
+            telegram.bot_send_message(f"Произошла ошибка: \n {error_traceback}", config=config)
+            sys.exit(1)
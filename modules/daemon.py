@@ -0,0 +1,186 @@
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from modules.data_providers.api import SITE_ENDPOINTS, load_site_endpoint, site_endpoints
+from modules.data_providers.config_loader import Config, get_config
+from modules.data_providers.grid import GridIndex
+from modules.metrics import metrics
+
+# Задержка перед повторной попыткой обновления данных после ошибки (секунды)
+RETRY_DELAY = 300
+
+# Интервал обновления для эндпоинтов, не указанных в CACHE_TTL (секунды)
+DEFAULT_REFRESH_INTERVAL = 3600
+
+def next_local_midnight(now: float, timezone: str) -> float:
+    """
+    Возвращает момент ближайшей полуночи в часовом поясе timezone.
+
+    Args:
+        now (float): Текущий момент (time.time()).
+        timezone (str): Часовой пояс места наблюдения.
+
+    Returns:
+        float: Момент начала следующих местных суток (time.time()).
+
+    Example:
+        >>> datetime.fromtimestamp(next_local_midnight(time.time(), "Europe/Moscow"), ZoneInfo("Europe/Moscow")).time()
+        datetime.time(0, 0)
+    """
+    zone = ZoneInfo(timezone)
+    tomorrow = datetime.fromtimestamp(now, zone).date() + timedelta(days=1)
+    return datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=zone).timestamp()
+
+class ForecastDaemon:
+    """
+    Резидентная служба: периодически обновляет данные и отправляет отчёты без перезапуска процесса.
+
+    Между запусками сохраняется "тёплое" состояние: проверенный конфиг, скомпилированный шаблон отчёта,
+    HTTP-сессия с открытыми соединениями и пул рабочих потоков.
+
+    Как и в пакетном режиме (см. fetch_cells()), данные запрашиваются один раз на каждую ячейку сетки прогноза
+    и передаются всем местам наблюдения в ней. Для каждой пары "ячейка, эндпоинт" хранится момент следующего
+    обновления (интервал - CACHE_TTL эндпоинта, но не позже местной полуночи в часовом поясе ячейки), поэтому
+    на каждом шаге запрашиваются только те данные, которые устарели. После смены местной даты обновляются
+    все эндпоинты ячейки, и прогноз облачности и данные о Солнце и Луне снова начинаются с одного и того же дня.
+    Набор эндпоинтов - site_endpoints(): при COMBINED_REQUEST: true для ячейки выполняется один комбинированный
+    запрос, и отчёты содержат оценку качества наблюдений.
+
+    Обработка и доставка отчёта выполняются функцией deliver, которую передаёт вызывающий код:
+    deliver(site, clouds_data, sun_moon_data) вызывается для каждого места раз в report_interval секунд.
+    """
+
+    def __init__(self, sites: list[dict], deliver, report_interval: float = None, refresh_intervals: dict = None, max_workers: int = None, after_reports=None, config: Config = None):
+        """
+        Args:
+            sites (list[dict]): Места наблюдения с ключами NAME, LATITUDE и LONGITUDE.
+            deliver (callable): Функция обработки и доставки отчёта для одного места.
+            report_interval (float, optional): Интервал отправки отчётов в секундах. По умолчанию - REPORT_INTERVAL.
+            refresh_intervals (dict, optional): Интервалы обновления данных для каждого эндпоинта. По умолчанию - CACHE_TTL.
+            max_workers (int, optional): Количество одновременных запросов к API. По умолчанию - MAX_CONCURRENCY.
+            after_reports (callable, optional): Функция без аргументов, вызываемая после каждой отправки отчётов
+                (например, запись накопленных прогнозов в архив).
+            config (Config, optional): Конфигурация. По умолчанию - get_config(). Размер ячейки сетки - GRID_CELL_SIZE.
+        """
+        self.config = config or get_config()
+        self.sites = sites
+        self.deliver = deliver
+        self.after_reports = after_reports
+        self.report_interval = report_interval or self.config.REPORT_INTERVAL
+        self.refresh_intervals = refresh_intervals or self.config.CACHE_TTL
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or self.config.MAX_CONCURRENCY, thread_name_prefix="daemon-fetch")
+
+        # Ячейки сетки с местами наблюдения, ячейка каждого места, последние полученные данные каждой ячейки
+        # и момент следующего обновления каждой пары ячейка/эндпоинт
+        self.grid = GridIndex.build(sites, cell_size=self.config.GRID_CELL_SIZE, default_timezone=self.config.TIMEZONE)
+        self.site_cells = [None] * len(sites)
+        for cell in self.grid.cells():
+            for position in self.grid.subscribers(cell):
+                self.site_cells[position] = cell
+        self.cell_data = {cell: {} for cell in self.grid.cells()}
+        # При COMBINED_REQUEST: true облачность, оценка качества и данные о Солнце и Луне приходят одним запросом
+        self.next_refresh = {(cell, endpoint): 0.0 for cell in self.grid.cells() for endpoint in site_endpoints(self.config)}
+        self.next_report = 0.0
+        self._stop_event = threading.Event()
+
+    def refresh_interval(self, endpoint: str) -> float:
+        """
+        Возвращает интервал обновления эндпоинта. Комбинированный ответ содержит почасовой прогноз облачности,
+        который устаревает раньше данных о Солнце и Луне, поэтому обновляется с интервалом /clouds-1h.
+        """
+        if endpoint not in SITE_ENDPOINTS:
+            endpoint = "/clouds-1h"
+        return self.refresh_intervals.get(endpoint, DEFAULT_REFRESH_INTERVAL)
+
+    def due_refreshes(self, now: float) -> list[tuple]:
+        """
+        Возвращает пары (ячейка сетки, эндпоинт), данные которых пора обновить.
+        """
+        return [job for job, due in self.next_refresh.items() if due <= now]
+
+    def refresh(self, now: float) -> int:
+        """
+        Обновляет параллельно все устаревшие данные.
+
+        Данные запрашиваются в обход дискового кэша: служба сама хранит последние ответы и
+        знает, когда их обновлять. При ошибке повторная попытка назначается через RETRY_DELAY секунд,
+        а предыдущие данные ячейки остаются в силе.
+
+        Args:
+            now (float): Текущий момент (time.time()).
+
+        Returns:
+            int: Количество успешно обновлённых пар ячейка/эндпоинт.
+        """
+        refreshed = 0
+        with metrics.stage("fetch"):
+            futures = {
+                (cell, endpoint): self.executor.submit(load_site_endpoint, self.grid.cell_site(cell), endpoint, use_cache=False, config=self.config)
+                for cell, endpoint in self.due_refreshes(now)
+            }
+            for (cell, endpoint), future in futures.items():
+                try:
+                    self.cell_data[cell] |= future.result()
+                    self.next_refresh[(cell, endpoint)] = min(
+                        now + self.refresh_interval(endpoint),
+                        next_local_midnight(now, cell[2]),
+                    )
+                    refreshed += 1
+                except Exception as error:
+                    print(f"Не удалось обновить данные {endpoint} для ячейки {self.grid.cell_site(cell)['NAME']}: {error}")
+                    self.next_refresh[(cell, endpoint)] = now + RETRY_DELAY
+                    metrics.increment("fetch_retries")
+        return refreshed
+
+    def deliver_reports(self, now: float) -> None:
+        """
+        Формирует и отправляет отчёты для всех мест, по которым есть полный набор данных.
+        """
+        for site, cell in zip(self.sites, self.site_cells):
+            data = self.cell_data[cell]
+            if "clouds_data" not in data or "sun_moon_data" not in data:
+                continue
+            try:
+                self.deliver(site, data["clouds_data"], data["sun_moon_data"])
+            # Ошибка доставки одного отчёта не должна останавливать службу
+            except Exception as error:
+                print(f"Не удалось отправить отчёт для места {site['NAME']}: {error}")
+        self.next_report = now + self.report_interval
+
+    def run_once(self, now: float = None) -> float:
+        """
+        Выполняет один шаг службы: обновляет устаревшие данные и, если пора, отправляет отчёты.
+
+        Args:
+            now (float, optional): Текущий момент. По умолчанию - time.time().
+
+        Returns:
+            float: Момент следующего шага.
+        """
+        now = time.time() if now is None else now
+        self.refresh(now)
+        if self.next_report <= now:
+            self.deliver_reports(now)
+            if self.after_reports is not None:
+                self.after_reports()
+            # В режиме службы метрики сохраняются после каждой отправки отчётов
+            metrics.flush()
+        return min(min(self.next_refresh.values()), self.next_report)
+
+    def run_forever(self) -> None:
+        """
+        Выполняет шаги службы до вызова stop(). Между шагами поток спит до ближайшего запланированного события.
+        """
+        while not self._stop_event.is_set():
+            next_step = self.run_once()
+            self._stop_event.wait(max(next_step - time.time(), 0))
+        self.executor.shutdown(wait=True)
+
+    def stop(self) -> None:
+        """
+        Останавливает службу после завершения текущего шага.
+        """
+        self._stop_event.set()
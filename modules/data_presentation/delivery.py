@@ -0,0 +1,266 @@
+import collections
+import hashlib
+import heapq
+import itertools
+import queue
+import threading
+import time
+
+from modules.data_presentation.telegram import TelegramRetryAfter, call_bot_api, split_message
+from modules.data_providers.config_loader import Config, get_config
+from modules.metrics import metrics
+
+# Лимиты Telegram: не более 30 сообщений в секунду от одного бота и не более 1 сообщения в секунду в один чат
+GLOBAL_RATE = 30
+CHAT_RATE = 1
+
+# Максимальное количество попыток отправки одного сообщения и базовая задержка между попытками (секунды)
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 1.0
+
+# Сколько секунд после доставки повторная постановка того же сообщения в тот же чат игнорируется
+DEDUPLICATION_TTL = 3600
+
+class TokenBucket:
+    """
+    Ограничитель частоты запросов по алгоритму "ведро с токенами".
+
+    Ведро пополняется со скоростью rate токенов в секунду до capacity. Каждый запрос забирает
+    один токен, а если токенов нет - ожидает их появления. Ведро можно "приостановить" на заданное
+    время, например по полю retry_after ответа Telegram.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Args:
+            rate (float): Скорость пополнения, токенов в секунду.
+            capacity (float, optional): Ёмкость ведра. По умолчанию равна rate.
+        """
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Забирает один токен, при необходимости ожидая его появления или окончания паузы.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Запрещает выдачу токенов на seconds секунд.
+        """
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+class DeliveryQueue:
+    """
+    Очередь асинхронной доставки сообщений в Telegram с ограничением частоты и повторными попытками.
+
+    submit() ставит сообщение в очередь и сразу возвращает управление, отправку выполняют рабочие потоки.
+    Частота ограничивается общим ведром токенов бота и отдельным ведром для каждого чата. Ответ 429
+    приостанавливает соответствующие вёдра на retry_after секунд, после чего отправка продолжается.
+
+    Каждая часть сообщения имеет ключ идемпотентности (чат + текст + номер части). Доставленные части
+    при повторной попытке не отправляются снова, а повторная постановка в очередь ожидающего отправки
+    сообщения или сообщения, доставленного менее DEDUPLICATION_TTL секунд назад, игнорируется.
+    Ключи доставленных сообщений хранятся только это время, поэтому в режиме службы их набор не растёт.
+
+    Повторные попытки с задержкой не занимают рабочие потоки: задание ждёт в куче отложенных заданий,
+    и отдельный поток-таймер возвращает его в очередь, когда задержка истекает.
+    """
+
+    def __init__(self, workers: int = None, global_rate: float = GLOBAL_RATE, chat_rate: float = CHAT_RATE, max_attempts: int = MAX_ATTEMPTS, send=None, config: Config = None):
+        """
+        Args:
+            workers (int, optional): Количество рабочих потоков. По умолчанию - DELIVERY_WORKERS.
+            global_rate (float, optional): Лимит сообщений в секунду для бота.
+            chat_rate (float, optional): Лимит сообщений в секунду для одного чата.
+            max_attempts (int, optional): Максимальное количество попыток отправки сообщения.
+            send (callable, optional): Функция отправки одной части send(chat_id, text). По умолчанию - sendMessage Telegram API.
+            config (Config, optional): Конфигурация. По умолчанию - get_config().
+        """
+        config = config or get_config()
+        self.workers = workers or config.DELIVERY_WORKERS
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_rate = chat_rate
+        self.max_attempts = max_attempts
+        self.send = send or (lambda chat_id, text: call_bot_api("sendMessage", {"chat_id": chat_id, "text": text}, config))
+
+        self.stats = {"sent": 0, "retried": 0, "failed": 0, "throttled": 0}
+        self._queue = queue.Queue()
+        self._chat_buckets = {}
+        # Ключи ожидающих и недавно доставленных сообщений и моменты окончания хранения доставленных (в порядке доставки)
+        self._known_keys = set()
+        self._expiring_keys = collections.deque()
+        self._delivered_parts = set()
+        self._lock = threading.Lock()
+        # Количество сообщений, доставка которых не завершена (в очереди, в отправке или в ожидании повторной попытки)
+        self._unfinished = 0
+        self._all_done = threading.Condition(self._lock)
+        # Отложенные повторные попытки: куча (момент, порядковый номер, задание)
+        self._delayed = []
+        self._delayed_sequence = itertools.count()
+        self._delayed_condition = threading.Condition()
+        self._threads = []
+
+    def start(self) -> "DeliveryQueue":
+        """
+        Запускает рабочие потоки и поток-таймер отложенных попыток (однократно).
+        """
+        with self._lock:
+            if not self._threads:
+                targets = [(self._worker, f"telegram-delivery-{number}") for number in range(self.workers)]
+                for target, name in targets + [(self._timer, "telegram-delivery-timer")]:
+                    thread = threading.Thread(target=target, name=name, daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+        return self
+
+    def submit(self, chat_id: str, message: str) -> str:
+        """
+        Ставит сообщение в очередь на отправку в указанный чат.
+
+        Args:
+            chat_id (str): Идентификатор чата Telegram.
+            message (str): Текст сообщения. Длинные сообщения разбиваются на части по MESSAGE_LIMIT.
+
+        Returns:
+            str: Ключ идемпотентности сообщения.
+        """
+        key = hashlib.sha1(f"{chat_id}\n{message}".encode("utf-8")).hexdigest()
+        with self._lock:
+            self._expire_keys(time.monotonic())
+            if key in self._known_keys:
+                return key
+            self._known_keys.add(key)
+            self._unfinished += 1
+        self.start()
+        self._queue.put({"key": key, "chat_id": chat_id, "parts": split_message(message), "attempt": 1})
+        return key
+
+    def submit_many(self, chat_ids: list[str], message: str) -> list[str]:
+        """
+        Ставит одно сообщение в очередь на отправку во все указанные чаты.
+        """
+        return [self.submit(chat_id, message) for chat_id in chat_ids]
+
+    def join(self) -> None:
+        """
+        Ожидает доставки (или окончательной ошибки) всех сообщений в очереди, включая ожидающие повторной попытки.
+        """
+        with self._all_done:
+            while self._unfinished:
+                self._all_done.wait()
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        with self._lock:
+            if chat_id not in self._chat_buckets:
+                self._chat_buckets[chat_id] = TokenBucket(self.chat_rate)
+            return self._chat_buckets[chat_id]
+
+    def _expire_keys(self, now: float) -> None:
+        # Вызывается под self._lock. Моменты окончания хранения возрастают в порядке доставки, поэтому истёкшие ключи - в начале
+        while self._expiring_keys and self._expiring_keys[0][0] <= now:
+            self._known_keys.discard(self._expiring_keys.popleft()[1])
+
+    def _finish(self, job: dict, delivered: bool) -> None:
+        # Доставка сообщения завершена: отметки доставленных частей больше не нужны, а ключ доставленного сообщения
+        # хранится DEDUPLICATION_TTL секунд (недоставленное сообщение можно сразу поставить в очередь повторно)
+        with self._lock:
+            self._delivered_parts.difference_update((job["key"], number) for number in range(len(job["parts"])))
+            if delivered:
+                self._expiring_keys.append((time.monotonic() + DEDUPLICATION_TTL, job["key"]))
+            else:
+                self._known_keys.discard(job["key"])
+            self._unfinished -= 1
+            self._all_done.notify_all()
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                self._deliver(job)
+            finally:
+                self._queue.task_done()
+
+    def _timer(self) -> None:
+        # Возвращает отложенные задания в очередь, когда истекает их задержка
+        while True:
+            with self._delayed_condition:
+                while not self._delayed or self._delayed[0][0] > time.monotonic():
+                    self._delayed_condition.wait(self._delayed[0][0] - time.monotonic() if self._delayed else None)
+                _, _, job = heapq.heappop(self._delayed)
+            self._queue.put(job)
+
+    def _deliver(self, job: dict) -> None:
+        # Каждое задание либо завершается (_finish), либо снова ставится в очередь - иначе join() ждал бы его бесконечно
+        rescheduled = False
+        delivered = False
+        try:
+            chat_bucket = self._chat_bucket(job["chat_id"])
+            for number, part in enumerate(job["parts"]):
+                part_key = (job["key"], number)
+                if part_key in self._delivered_parts:
+                    continue
+                chat_bucket.acquire()
+                self.global_bucket.acquire()
+                try:
+                    self.send(job["chat_id"], part)
+                except TelegramRetryAfter as error:
+                    # Лимит превышен - приостанавливаем отправку в этот чат и отправку ботом в целом. Это не ошибка доставки:
+                    # попытка не учитывается, а задание ждёт retry_after секунд в куче таймера, не занимая рабочий поток
+                    chat_bucket.pause(error.retry_after)
+                    self.global_bucket.pause(error.retry_after)
+                    with self._lock:
+                        self.stats["throttled"] += 1
+                    metrics.increment("telegram_throttled")
+                    self._schedule(job, error.retry_after)
+                    rescheduled = True
+                    return
+                # Любая другая ошибка (сеть, ответ API неожиданного вида) считается неудачной попыткой
+                except Exception as error:
+                    rescheduled = self._retry(job, error, delay=RETRY_BASE_DELAY * 2 ** (job["attempt"] - 1))
+                    return
+                with self._lock:
+                    self._delivered_parts.add(part_key)
+                    self.stats["sent"] += 1
+            delivered = True
+        finally:
+            if not rescheduled:
+                self._finish(job, delivered)
+
+    def _retry(self, job: dict, error: Exception, delay: float) -> bool:
+        # Назначает повторную попытку, если попытки не исчерпаны. Возвращает True, если задание снова поставлено в очередь.
+        exhausted = job["attempt"] >= self.max_attempts
+        with self._lock:
+            self.stats["failed" if exhausted else "retried"] += 1
+        if exhausted:
+            metrics.increment("telegram_failures")
+            print(f"Не удалось доставить сообщение в чат {job['chat_id']}: {error}")
+            return False
+        metrics.increment("telegram_retries")
+        self._schedule(job | {"attempt": job["attempt"] + 1}, delay)
+        return True
+
+    def _schedule(self, job: dict, delay: float) -> None:
+        # Задание без задержки сразу возвращается в очередь, с задержкой - ждёт в куче таймера
+        if delay <= 0:
+            self._queue.put(job)
+            return
+        with self._delayed_condition:
+            heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._delayed_sequence), job))
+            self._delayed_condition.notify()
@@ -1,14 +1,85 @@
 import datetime
-from modules.data_providers.config_loader import CLOUDINESS_FILTER
-from jinja2 import Environment, FileSystemLoader, TemplateError
+import os
+from concurrent.futures import ProcessPoolExecutor
+from modules.data_providers.config_loader import get_config
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, TemplateError
 
-try:
-    env = Environment(loader=FileSystemLoader('./resources'))
-    template = env.get_template('report_template.j2')
-except TemplateError as error:
-    raise TemplateError
+# Каталог с шаблонами отчётов (resources в корне репозитория) - не зависит от текущего каталога процесса
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "resources")
 
-def compose_report(weather_data: dict) -> dict:
+# Количество отчётов, начиная с которого пакет формируется в пуле процессов. Меньшие пакеты быстрее
+# сформировать в текущем процессе, чем запускать пул.
+PARALLEL_MIN_REPORTS = 64
+
+# Подпись вместо времени заката в дни полярной ночи, когда Солнце не восходит
+POLAR_NIGHT_LABEL = "нет (полярная ночь)"
+
+# Скомпилированный шаблон отчёта. Загружается при первом формировании отчёта.
+_template = None
+
+def get_template(bytecode_cache_dir: str = None):
+    """
+    Возвращает скомпилированный шаблон отчёта, загружая его при первом обращении.
+
+    Args:
+        bytecode_cache_dir (str, optional): Каталог дискового кэша байткода Jinja2. Учитывается при первом обращении:
+            шаблон, скомпилированный одним процессом, загружается остальными (процессы пула, следующие запуски)
+            без повторной компиляции. По умолчанию - без кэша.
+    """
+    global _template
+    if _template is None:
+        bytecode_cache = None
+        if bytecode_cache_dir:
+            try:
+                os.makedirs(bytecode_cache_dir, exist_ok=True)
+                bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+            # Кэш байткода только ускоряет загрузку, без него шаблон компилируется как обычно
+            except OSError as error:
+                print(f"Не удалось создать кэш шаблонов: {error}")
+        env = Environment(loader=FileSystemLoader(RESOURCES_DIR), bytecode_cache=bytecode_cache)
+        _template = env.get_template('report_template.j2')
+    return _template
+
+def report_context(weather_data: dict, best_windows: list[dict] = None) -> dict:
+    """
+    Подготавливает данные отчёта для шаблона: даты и время переводятся в строки заранее,
+    чтобы шаблон только подставлял готовые значения.
+
+    Args:
+        weather_data (dict): Данные, полученные из функции process_weather_data().
+        best_windows (list[dict], optional): Лучшие окна наблюдений (см. WindowIndex.best()).
+
+    Returns:
+        dict: Ключи days (для каждого дня - date, sunset, moon_illumination, moon_phase и hours - список четвёрок
+            "время, облачность, качество наблюдений или None, освещённость Луны в этот час или None")
+            и best_windows (список троек "начало, конец, окно").
+
+    Example:
+        >>> report_context({date(2025, 1, 9): {"date_time": {time(21, 0): 15}, "sunset": time(16, 20), ...}})["days"][0]["hours"]
+        [('21:00', 15, None, None)]
+    """
+    days = []
+    for day, day_data in weather_data.items():
+        quality = day_data.get("quality")
+        moon = day_data.get("moon_illumination_hourly")
+        days.append({
+            "date": day.strftime("%d.%m.%Y"),
+            "sunset": day_data["sunset"].strftime('%H:%M') if day_data["sunset"] is not None else POLAR_NIGHT_LABEL,
+            "moon_illumination": day_data["moon_illumination"],
+            "moon_phase": day_data["moon_phase"],
+            "hours": [
+                (hour.strftime('%H:%M'), cloudiness, quality[hour] if quality else None, moon[hour] if moon else None)
+                for hour, cloudiness in day_data["date_time"].items()
+            ],
+        })
+
+    windows = [
+        (window["start"].strftime('%d.%m %H:%M'), window["end"].strftime('%H:%M'), window)
+        for window in best_windows or []
+    ]
+    return {"days": days, "best_windows": windows}
+
+def compose_report(weather_data: dict, site_name: str = None, is_update: bool = False, cloudiness_filter: int = None, best_windows: list[dict] = None, generated_at: datetime.datetime = None) -> dict:
     """
     Формирует текстовый отчёт на основе шаблона Jinja2
 
@@ -17,13 +88,18 @@ def compose_report(weather_data: dict) -> dict:
 
     Args:
         weather_data (dict): Словарь с данными об облачности, времени захода Солнца, освещённости и фазе Луны
+        site_name (str, optional): Название места наблюдения, выводится в заголовке отчёта (пакетный режим).
+        is_update (bool, optional): Отчёт содержит только изменившиеся с прошлой отправки дни.
+        cloudiness_filter (int, optional): Фильтр облачности места наблюдения. По умолчанию - CLOUDINESS_FILTER из конфига.
+        best_windows (list[dict], optional): Лучшие окна наблюдений (см. WindowIndex.best()), выводятся в начале отчёта.
+        generated_at (datetime, optional): Время составления отчёта. По умолчанию - текущее время.
 
     Returns:
         dict: Словарь со статусом формирования отчёта (error или success) и сообщением, которое в случае
             успешного формирования отчёта содержит сам отчёт, или же с сообщением об ошибке, если
             отчёт не был сформирован.
     """
-    current_time = str(datetime.datetime.now().strftime('%d.%m.%Y %H:%M:%S'))
+    current_time = str((generated_at or datetime.datetime.now()).strftime('%d.%m.%Y %H:%M:%S'))
     is_data_present = False
 
     # Проверяем, есть ли данные для отчёта
@@ -31,16 +107,62 @@ def compose_report(weather_data: dict) -> dict:
         if weather_data[day]["date_time"]:
         # Если данные есть - устанавливаем флаг True
             is_data_present = True
-    
+
     # Если есть, то формируем отчёт
     if is_data_present:
+        if cloudiness_filter is None:
+            cloudiness_filter = get_config().CLOUDINESS_FILTER
         try:
-            rendered_template = template.render(weather_data=weather_data, current_time=current_time, CLOUDINESS_FILTER=CLOUDINESS_FILTER)
+            context = report_context(weather_data, best_windows)
+            rendered_template = get_template().render(**context, current_time=current_time, CLOUDINESS_FILTER=cloudiness_filter, site_name=site_name, is_update=is_update)
             return {"status": "success", "message": rendered_template}
         # Если во время формирования отчёта произошла ошибка, вызываем TemplateException
         except TemplateError as error:
             raise TemplateError(f"При подстановке данных в шаблон произошла ошибка: {error}")
-    
+
     # Если данных нет, то возвращаем статус с ошибкой
     else:
-        return {"status": "error", "message": "Отчёт не сформирован. Недостаточно данных"}
\ No newline at end of file
+        return {"status": "error", "message": "Отчёт не сформирован. Недостаточно данных"}
+
+def _compose_job(job: dict) -> dict:
+    return compose_report(**job)
+
+def compose_reports(jobs: list[dict], workers: int = None, bytecode_cache_dir: str = None) -> list[dict]:
+    """
+    Формирует пакет отчётов, при большом количестве - параллельно в пуле процессов.
+
+    Каждое задание - аргументы compose_report(). Время составления и фильтр облачности по умолчанию
+    определяются один раз для всего пакета, поэтому результат совпадает с последовательным вызовом
+    compose_report() для каждого задания. Процессы пула загружают шаблон один раз (из кэша байткода, если он задан).
+
+    Args:
+        jobs (list[dict]): Аргументы compose_report() для каждого отчёта.
+        workers (int, optional): Количество процессов. По умолчанию - количество ядер процессора.
+        bytecode_cache_dir (str, optional): Каталог кэша байткода шаблона (см. get_template()).
+
+    Returns:
+        list[dict]: Результаты compose_report() в порядке заданий.
+
+    Example:
+        >>> compose_reports([{"weather_data": data, "site_name": "Дача"}, {"weather_data": other_data, "site_name": "Город"}])
+        [{'status': 'success', 'message': '...'}, {'status': 'success', 'message': '...'}]
+    """
+    generated_at = datetime.datetime.now()
+    default_filter = None
+    prepared = []
+    for job in jobs:
+        job = {"generated_at": generated_at} | job
+        if job.get("cloudiness_filter") is None:
+            default_filter = default_filter if default_filter is not None else get_config().CLOUDINESS_FILTER
+            job["cloudiness_filter"] = default_filter
+        prepared.append(job)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(prepared) < PARALLEL_MIN_REPORTS:
+        get_template(bytecode_cache_dir)
+        return [compose_report(**job) for job in prepared]
+
+    # Задания передаются процессам частями, чтобы расходы на передачу данных между процессами не превышали выигрыш
+    chunksize = max(1, len(prepared) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=get_template, initargs=(bytecode_cache_dir,)) as executor:
+        return list(executor.map(_compose_job, prepared, chunksize=chunksize))
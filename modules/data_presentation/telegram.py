@@ -1,12 +1,98 @@
-from modules.data_providers.config_loader import BOT_TOKEN, CHAT_ID
+from modules.data_providers.config_loader import Config, get_config
+from modules.metrics import metrics
 import requests
+from requests.adapters import HTTPAdapter
 
-def bot_send_message(message: str) -> bool:
+#Базовый URL Telegram Bot API
+BOT_API_BASE_URL = "https://api.telegram.org/"
+
+# Максимальная длина текста одного сообщения Telegram
+MESSAGE_LIMIT = 4096
+
+# Описание ошибки Telegram API при редактировании сообщения без изменения текста
+NOT_MODIFIED_DESCRIPTION = "message is not modified"
+
+# Общая сессия с пулом keep-alive соединений к Telegram API
+_session = None
+
+class TelegramRetryAfter(requests.RequestException):
+    """
+    Telegram API отклонил запрос из-за превышения лимита (HTTP 429). Повторить запрос можно через retry_after секунд.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TelegramNotModified(requests.RequestException):
+    """
+    Telegram API отклонил редактирование сообщения, потому что новый текст совпадает с текущим.
+    """
+
+def get_session() -> requests.Session:
+    """
+    Возвращает общую HTTP-сессию для запросов к Telegram API.
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=16)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+def call_bot_api(method: str, payload: dict, config: Config = None) -> dict:
+    """
+    Вызывает метод Telegram Bot API (POST, параметры в теле запроса) и возвращает результат.
+
+    Args:
+        method (str): Название метода API, например sendMessage.
+        payload (dict): Параметры вызова.
+        config (Config, optional): Конфигурация (BOT_TOKEN и REQUEST_TIMEOUT). По умолчанию - get_config().
+
+    Returns:
+        dict: Поле result ответа Telegram API.
+
+    Raises:
+        TelegramRetryAfter: Превышен лимит запросов, в исключении передаётся время ожидания.
+        TelegramNotModified: Текст редактируемого сообщения не изменился.
+        requests.RequestException: Любая другая ошибка запроса.
+    """
+    config = config or get_config()
+    url = f"{BOT_API_BASE_URL}bot{config.BOT_TOKEN}/{method}"
+    try:
+        response = get_session().post(url, json=payload, timeout=config.REQUEST_TIMEOUT)
+        metrics.increment("telegram_requests")
+        metrics.increment("telegram_bytes", len(response.request.body or b""))
+        data = response.json()
+        # Если Telegram API ответил статусом "ok": True, возвращаем результат
+        if data["ok"]:
+            return data["result"]
+        # Превышение лимита - сообщаем, через сколько секунд можно повторить запрос
+        if data.get("error_code") == 429:
+            raise TelegramRetryAfter(data.get("description"), data.get("parameters", {}).get("retry_after", 1))
+        # Текст редактируемого сообщения не изменился
+        if NOT_MODIFIED_DESCRIPTION in (data.get("description") or ""):
+            raise TelegramNotModified(data["description"])
+        # Иначе, вызываем ошибку
+        else:
+            raise requests.RequestException(data)
+    except (TelegramRetryAfter, TelegramNotModified):
+        raise
+    # В случае иной ошибки (например, ошибка соединения) - вызываем ошибку
+    except requests.RequestException as error:
+        raise requests.RequestException(f"При отправке сообщения в Telegram произошла ошибка: {error}")
+
+def bot_send_message(message: str, chat_id: str = None, config: Config = None) -> bool:
     """
     Отправляет сообщение через Telegram бот
 
+    Сообщение длиннее MESSAGE_LIMIT отправляется несколькими частями.
+
     Args:
         message (str): Текстовое сообщение для отправки.
+        chat_id (str, optional): Идентификатор чата. По умолчанию - CHAT_ID из конфига.
+        config (Config, optional): Конфигурация. По умолчанию - get_config().
 
     Returns:
         bool: Статус отправки сообщения, полученный в ответ от Telegram API
@@ -15,19 +101,94 @@ def bot_send_message(message: str) -> bool:
         >>> bot_send_message("Hello, friend!")
             True
     """
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    payload = {
-            "chat_id": CHAT_ID,
-            "text": message
-        }
-    try:
-        response = requests.get(url, payload)
-        # Если Telegram API ответил статусом "ok": True, возвращаем True
-        if response.json()["ok"]:
-            return True
-        # Иначе, вызываем ошибку
-        else:
-            raise requests.RequestException(response.json())
-    # В случае иной ошибки (например, ошибка соединения) - вызываем ошибку
-    except requests.RequestException as error:
-        raise requests.RequestException(f"При отправке сообщения в Telegram произошла ошибка: {error}")
\ No newline at end of file
+    config = config or get_config()
+    for part in split_message(message):
+        call_bot_api("sendMessage", {"chat_id": chat_id or config.CHAT_ID, "text": part}, config)
+    return True
+
+def bot_send_tracked_message(message: str, chat_id: str = None, config: Config = None) -> list[int]:
+    """
+    Отправляет сообщение через Telegram бот и возвращает идентификаторы для последующего редактирования.
+
+    Сообщение длиннее MESSAGE_LIMIT отправляется несколькими частями.
+
+    Args:
+        message (str): Текстовое сообщение для отправки.
+        chat_id (str, optional): Идентификатор чата. По умолчанию - CHAT_ID из конфига.
+        config (Config, optional): Конфигурация. По умолчанию - get_config().
+
+    Returns:
+        list[int]: message_id каждой отправленной части в порядке отправки.
+    """
+    config = config or get_config()
+    return [
+        call_bot_api("sendMessage", {"chat_id": chat_id or config.CHAT_ID, "text": part}, config)["message_id"]
+        for part in split_message(message)
+    ]
+
+def bot_edit_message(message_ids: list[int], message: str, chat_id: str = None, config: Config = None) -> list[int]:
+    """
+    Заменяет текст ранее отправленного ботом сообщения, состоящего из одной или нескольких частей.
+
+    Части нового текста (см. split_message()) записываются в отправленные сообщения по порядку, лишние
+    сообщения удаляются. Если новый текст не помещается в отправленные сообщения, ничего не редактируется:
+    недостающие части пришлось бы отправить новыми сообщениями, и они оказались бы в чате не рядом с остальными.
+
+    Args:
+        message_ids (list[int]): Идентификаторы частей сообщения, полученные из bot_send_tracked_message().
+        message (str): Новый текст сообщения.
+        chat_id (str, optional): Идентификатор чата. По умолчанию - CHAT_ID из конфига.
+        config (Config, optional): Конфигурация. По умолчанию - get_config().
+
+    Returns:
+        list[int]: message_id частей нового текста.
+
+    Raises:
+        ValueError: Новый текст состоит из большего числа частей, чем отправленное сообщение.
+    """
+    config = config or get_config()
+    chat_id = chat_id or config.CHAT_ID
+    parts = split_message(message)
+    if len(parts) > len(message_ids):
+        raise ValueError(f"Новый текст состоит из {len(parts)} частей, а отправленное сообщение - из {len(message_ids)}")
+
+    for message_id, part in zip(message_ids, parts):
+        try:
+            call_bot_api("editMessageText", {"chat_id": chat_id, "message_id": message_id, "text": part}, config)
+        # Часть, текст которой не изменился, оставляем как есть
+        except TelegramNotModified:
+            pass
+    for message_id in message_ids[len(parts):]:
+        call_bot_api("deleteMessage", {"chat_id": chat_id, "message_id": message_id}, config)
+    return list(message_ids[:len(parts)])
+
+def split_message(message: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """
+    Разбивает текст на части, не превышающие лимит длины сообщения Telegram.
+
+    Разбиение выполняется по границам строк, и только строка длиннее лимита разрезается посередине.
+
+    Args:
+        message (str): Текст сообщения.
+        limit (int, optional): Максимальная длина одной части. По умолчанию - MESSAGE_LIMIT.
+
+    Returns:
+        list[str]: Части сообщения в порядке отправки.
+
+    Example:
+        >>> split_message("abc\ndef", limit=4)
+        ['abc\n', 'def']
+    """
+    parts = []
+    current = ""
+    for line in message.splitlines(keepends=True):
+        if len(current) + len(line) > limit and current:
+            parts.append(current)
+            current = ""
+        while len(line) > limit:
+            parts.append(line[:limit])
+            line = line[limit:]
+        current += line
+    if current:
+        parts.append(current)
+    return parts
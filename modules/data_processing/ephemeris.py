@@ -0,0 +1,332 @@
+import math
+
+import numpy as np
+
+from datetime import date, datetime, time
+from zoneinfo import ZoneInfo
+from modules.data_processing.memo import astronomy_cache
+from modules.data_providers.cells import DEFAULT_CELL_SIZE, cell_center, cell_key
+from modules.data_processing.weather import MOON_PHASE_CODES
+
+# Высота центра Солнца над горизонтом в момент заката с учётом рефракции и видимого радиуса диска (градусы)
+SUNSET_ALTITUDE = -0.833
+
+# Высота Солнца, при которой заканчиваются астрономические сумерки (градусы)
+ASTRONOMICAL_DUSK_ALTITUDE = -18.0
+
+# Юлианская дата эпохи J2000.0 и эпохи Unix
+J2000 = 2451545.0
+UNIX_EPOCH_JD = 2440587.5
+
+# Названия фаз Луны в порядке их кодов (см. MOON_PHASE_CODES)
+MOON_PHASE_NAMES = sorted(MOON_PHASE_CODES, key=MOON_PHASE_CODES.get)
+
+# Начало каждого часа суток относительно полуночи - моменты, на которые рассчитывается почасовая освещённость Луны
+DAY_HOURS = np.arange(24) * np.timedelta64(3600, "s")
+
+def julian_date(timestamps: np.ndarray) -> np.ndarray:
+    """
+    Переводит моменты времени UTC в юлианские даты.
+
+    Args:
+        timestamps (np.ndarray): Моменты времени UTC (datetime64 любой точности).
+
+    Returns:
+        np.ndarray: Юлианские даты (float64).
+
+    Example:
+        >>> julian_date(np.datetime64("2000-01-01T12:00"))
+        2451545.0
+    """
+    days_since_epoch = (np.asarray(timestamps, dtype="datetime64[s]") - np.datetime64(0, "s")) / np.timedelta64(1, "D")
+    return days_since_epoch + UNIX_EPOCH_JD
+
+def sun_coordinates(jd: np.ndarray) -> tuple:
+    """
+    Вычисляет склонение Солнца и уравнение времени по упрощённой модели Астрономического ежегодника (точность ~1').
+
+    Args:
+        jd (np.ndarray): Юлианские даты.
+
+    Returns:
+        tuple: Склонение Солнца (радианы) и уравнение времени (минуты).
+    """
+    n = jd - J2000
+    mean_longitude = np.radians((280.460 + 0.9856474 * n) % 360)
+    mean_anomaly = np.radians((357.528 + 0.9856003 * n) % 360)
+    ecliptic_longitude = mean_longitude + np.radians(1.915) * np.sin(mean_anomaly) + np.radians(0.020) * np.sin(2 * mean_anomaly)
+    obliquity = np.radians(23.439 - 0.0000004 * n)
+
+    right_ascension = np.arctan2(np.cos(obliquity) * np.sin(ecliptic_longitude), np.cos(ecliptic_longitude))
+    declination = np.arcsin(np.sin(obliquity) * np.sin(ecliptic_longitude))
+
+    # Разница между средним и истинным Солнцем, приведённая к диапазону от -π до π
+    equation_of_time = (mean_longitude - right_ascension + math.pi) % (2 * math.pi) - math.pi
+    return declination, np.degrees(equation_of_time) * 4
+
+def sun_event(dates: np.ndarray, latitude, longitude, altitude: float, setting: bool = True) -> np.ndarray:
+    """
+    Вычисляет момент (UTC), когда Солнце опускается (или поднимается) до заданной высоты в указанные даты.
+
+    Расчёт векторный: даты, широты и долготы транслируются (broadcasting) по правилам NumPy,
+    например dates[:, None] и latitude[None, :] дают таблицу "дни x места наблюдения".
+    Момент события уточняется тремя итерациями, склонение Солнца пересчитывается на момент события.
+
+    Args:
+        dates (np.ndarray): Местные календарные даты (datetime64[D]).
+        latitude: Широта места наблюдения в градусах (число или массив).
+        longitude: Долгота места наблюдения в градусах (число или массив).
+        altitude (float): Высота Солнца в градусах, например SUNSET_ALTITUDE.
+        setting (bool, optional): True - вечернее событие (закат, сумерки), False - утреннее.
+
+    Returns:
+        np.ndarray: Моменты событий UTC (datetime64[s]). NaT, если Солнце в этот день не достигает заданной высоты
+            (полярный день или ночь).
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    latitude = np.radians(np.asarray(latitude, dtype=np.float64))
+    longitude = np.asarray(longitude, dtype=np.float64)
+
+    # Истинный полдень на долготе места в первом приближении - 12:00 по местному солнечному времени
+    midnight_jd = julian_date(dates)
+    event_jd = midnight_jd + 0.5 - longitude / 360
+    direction = 1 if setting else -1
+
+    for _ in range(3):
+        declination, equation_of_time = sun_coordinates(event_jd)
+        solar_noon = midnight_jd + 0.5 - longitude / 360 - equation_of_time / 1440
+        cos_hour_angle = (math.sin(math.radians(altitude)) - np.sin(latitude) * np.sin(declination)) / (np.cos(latitude) * np.cos(declination))
+        hour_angle = np.arccos(np.clip(cos_hour_angle, -1, 1))
+        event_jd = solar_noon + direction * hour_angle / (2 * math.pi)
+
+    result = np.asarray(np.round((event_jd - UNIX_EPOCH_JD) * 86400)).astype("int64").astype("datetime64[s]")
+    result[np.abs(cos_hour_angle) > 1] = np.datetime64("NaT")
+    return result
+
+def sun_always_above(dates: np.ndarray, latitude, longitude, altitude: float = SUNSET_ALTITUDE) -> np.ndarray:
+    """
+    Проверяет, остаётся ли Солнце весь день выше заданной высоты (полярный день).
+
+    Различает дни, для которых sun_event() вернул NaT: в полярный день Солнце не опускается до altitude,
+    в полярную ночь - не поднимается до неё.
+
+    Args:
+        dates (np.ndarray): Местные календарные даты (datetime64[D]).
+        latitude: Широта места наблюдения в градусах (число или массив).
+        longitude: Долгота места наблюдения в градусах (число или массив).
+        altitude (float, optional): Высота Солнца в градусах. По умолчанию - SUNSET_ALTITUDE.
+
+    Returns:
+        np.ndarray: Булев массив, True - Солнце весь день выше altitude.
+
+    Example:
+        >>> sun_always_above(np.array(["2025-06-20", "2025-12-20"], dtype="datetime64[D]"), 69.0, 33.0)
+        array([ True, False])
+    """
+    latitude = np.radians(np.asarray(latitude, dtype=np.float64))
+    declination, _ = sun_coordinates(julian_date(np.asarray(dates, dtype="datetime64[D]")) + 0.5 - np.asarray(longitude, dtype=np.float64) / 360)
+    # Высота Солнца в нижней кульминации (в полночь) выше altitude
+    return np.degrees(np.arcsin(np.clip(np.sin(latitude) * np.sin(declination) - np.cos(latitude) * np.cos(declination), -1, 1))) > altitude
+
+def moon_phase(timestamps: np.ndarray) -> tuple:
+    """
+    Вычисляет возраст и освещённость Луны в заданные моменты времени (упрощённая теория Меёса, точность ~0.5%).
+
+    Args:
+        timestamps (np.ndarray): Моменты времени UTC (datetime64).
+
+    Returns:
+        tuple: Возраст Луны в долях синодического месяца (0 - новолуние, 0.5 - полнолуние)
+            и освещённость диска в процентах.
+
+    Example:
+        >>> moon_phase(np.datetime64("2025-01-13T22:27"))
+        (0.50..., 99.99...)
+    """
+    T = (julian_date(timestamps) - J2000) / 36525
+    elongation = np.radians(297.8501921 + 445267.1114034 * T)
+    sun_anomaly = np.radians(357.5291092 + 35999.0502909 * T)
+    moon_anomaly = np.radians(134.9633964 + 477198.8675055 * T)
+
+    # Фазовый угол Луны (градусы) с основными периодическими поправками
+    phase_angle = (180 - np.degrees(elongation)
+        - 6.289 * np.sin(moon_anomaly)
+        + 2.100 * np.sin(sun_anomaly)
+        - 1.274 * np.sin(2 * elongation - moon_anomaly)
+        - 0.658 * np.sin(2 * elongation)
+        - 0.214 * np.sin(2 * moon_anomaly)
+        - 0.110 * np.sin(elongation))
+
+    illumination = (1 + np.cos(np.radians(phase_angle))) / 2 * 100
+    age = ((180 - phase_angle) % 360) / 360
+    return age, illumination
+
+def moon_phase_names(age: np.ndarray) -> list[str]:
+    """
+    Определяет названия фаз Луны (в терминах API meteoblue) по возрасту Луны.
+
+    Каждой из восьми фаз соответствует интервал шириной 1/8 синодического месяца с центром в
+    новолунии, первой четверти, полнолунии и т.д.
+
+    Args:
+        age (np.ndarray): Возраст Луны в долях синодического месяца.
+
+    Returns:
+        list[str]: Названия фаз из MOON_PHASE_CODES.
+    """
+    codes = np.floor(np.asarray(age) * 8 + 0.5).astype(np.int64) % 8
+    return [MOON_PHASE_NAMES[code] for code in np.ravel(codes).tolist()]
+
+def utc_offsets(dates: np.ndarray, timezone: str) -> np.ndarray:
+    """
+    Возвращает смещение часового пояса относительно UTC на полдень каждой даты.
+
+    Args:
+        dates (np.ndarray): Местные календарные даты (datetime64[D]).
+        timezone (str): Часовой пояс в формате базы tz, например Europe/Moscow.
+
+    Returns:
+        np.ndarray: Смещения (timedelta64[s]).
+    """
+    zone = ZoneInfo(timezone)
+    offsets = [datetime.combine(day, time(12, 0), tzinfo=zone).utcoffset().total_seconds() for day in np.asarray(dates, dtype="datetime64[D]").tolist()]
+    return np.array(offsets, dtype="int64").astype("timedelta64[s]")
+
+def sun_moon_data_sites(dates: np.ndarray, latitude, longitude, timezone: str, cell_size: float = DEFAULT_CELL_SIZE) -> list[dict]:
+    """
+    Вычисляет локально данные о Солнце и Луне для нескольких мест наблюдения, без запроса к API.
+
+    Время заката и окончания астрономических сумерек (местное время) рассчитывается для центра ячейки сетки
+    прогноза (см. cells.cell_key()), в которую попадает место, - как и прогноз облачности в пакетном режиме.
+    Результат запоминается в astronomy_cache по ключу "дата, ячейка", поэтому места одной ячейки, повторные
+    запуски и другие процессы расчёт не повторяют, а недостающие пары рассчитываются одним векторным вычислением.
+    Освещённость и фаза Луны в полночь в конце дня и освещённость на начало каждого часа не зависят от места
+    и запоминаются по ключу "дата, часовой пояс".
+
+    Args:
+        dates (np.ndarray): Местные календарные даты (datetime64[D]).
+        latitude: Широты мест наблюдения (число или массив).
+        longitude: Долготы мест наблюдения (число или массив той же длины).
+        timezone (str): Часовой пояс мест наблюдения.
+        cell_size (float, optional): Размер ячейки сетки в градусах (GRID_CELL_SIZE). По умолчанию - DEFAULT_CELL_SIZE.
+
+    Returns:
+        list[dict]: Для каждого места - словарь в формате функции get_sun_moon_data() с дополнительными
+            ключами astronomical_dusk, polar_day и moon_illumination_hourly. Время заката и сумерек - datetime в местном времени с tzinfo часового
+            пояса timezone (как в разобранном ответе API), None при полярном дне или ночи. polar_day - True для дней,
+            в которые Солнце не заходит (закат None из-за полярного дня, а не полярной ночи).
+            moon_illumination_hourly - для каждого дня список из 24 значений освещённости Луны (%) на начало
+            каждого часа местного времени.
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    latitude = np.atleast_1d(np.asarray(latitude, dtype=np.float64))
+    longitude = np.atleast_1d(np.asarray(longitude, dtype=np.float64))
+
+    offsets = utc_offsets(dates, timezone)
+    zone = ZoneInfo(timezone)
+    day_names = [str(day) for day in dates]
+    cells = [cell_key(site_latitude, site_longitude, timezone, cell_size) for site_latitude, site_longitude in zip(latitude.tolist(), longitude.tolist())]
+    centers = np.array([cell_center(cell, cell_size) for cell in cells], dtype=np.float64).reshape(len(cells), 2)
+
+    # Время заката и сумерек зависит только от даты и ячейки (с её часовым поясом) и берётся из кэша готовым
+    # (местное время с tzinfo). Одним векторным вычислением рассчитываются только отсутствующие в кэше пары "дата, ячейка".
+    pairs = [(day, site) for day in range(len(dates)) for site in range(len(cells))]
+    def compute_sun_events(positions: list[int]) -> list:
+        day_index = np.array([pairs[position][0] for position in positions], dtype=np.int64)
+        site_index = np.array([pairs[position][1] for position in positions], dtype=np.int64)
+        events = [
+            localize((sun_event(dates[day_index], centers[site_index, 0], centers[site_index, 1], altitude) + offsets[day_index]).tolist(), zone)
+            for altitude in (SUNSET_ALTITUDE, ASTRONOMICAL_DUSK_ALTITUDE)
+        ]
+        return list(zip(*events))
+    sun_events = astronomy_cache.memoize_many(
+        "sun", [(day_names[day], *cells[site], cell_size) for day, site in pairs], compute_sun_events,
+        encode=encode_events, decode=lambda value: decode_events(value, zone),
+    )
+
+    # Дни без заката - полярный день или полярная ночь. Они редки, поэтому различаются отдельным расчётом только для них.
+    polar_pairs = [position for position, events in enumerate(sun_events) if events[0] is None]
+    polar_days = set()
+    if polar_pairs:
+        day_index = np.array([pairs[position][0] for position in polar_pairs], dtype=np.int64)
+        site_index = np.array([pairs[position][1] for position in polar_pairs], dtype=np.int64)
+        always_above = sun_always_above(dates[day_index], centers[site_index, 0], centers[site_index, 1])
+        polar_days = {position for position, is_polar_day in zip(polar_pairs, always_above.tolist()) if is_polar_day}
+
+    # Освещённость и фаза Луны в полночь зависят только от даты и часового пояса
+    midnight_utc = (dates + np.timedelta64(1, "D")).astype("datetime64[s]") - offsets
+    def compute_moon(positions: list[int]) -> list:
+        age, illumination = moon_phase(midnight_utc[positions])
+        return [(round(value, 1), name) for value, name in zip(illumination.tolist(), moon_phase_names(age))]
+    moon = astronomy_cache.memoize_many("moon", [(day_name, timezone) for day_name in day_names], compute_moon, decode=tuple)
+
+    # Освещённость Луны на начало каждого местного часа (для отдельных часов отчёта и окон наблюдений)
+    def compute_moon_hourly(positions: list[int]) -> list:
+        hourly_utc = dates[positions].astype("datetime64[s]")[:, None] + DAY_HOURS - offsets[positions][:, None]
+        _, illumination = moon_phase(hourly_utc)
+        return np.round(illumination, 1).tolist()
+    moon_hourly = astronomy_cache.memoize_many("moon_hourly", [(day_name, timezone) for day_name in day_names], compute_moon_hourly)
+
+    moon_data = {
+        "date": [datetime.combine(day, time(0, 0)) for day in dates.tolist()],
+        "moon_illumination": [value for value, _ in moon],
+        "moon_illumination_hourly": moon_hourly,
+        "moon_phase_name": [name for _, name in moon],
+    }
+
+    sites_count = len(cells)
+    return [
+        {
+            "date": moon_data["date"],
+            "sunset": [sun_events[day * sites_count + site][0] for day in range(len(dates))],
+            "astronomical_dusk": [sun_events[day * sites_count + site][1] for day in range(len(dates))],
+            "polar_day": [day * sites_count + site in polar_days for day in range(len(dates))],
+            "moon_illumination": moon_data["moon_illumination"],
+            "moon_illumination_hourly": moon_data["moon_illumination_hourly"],
+            "moon_phase_name": moon_data["moon_phase_name"],
+        }
+        for site in range(sites_count)
+    ]
+
+def encode_events(events: tuple) -> list:
+    """
+    Переводит моменты событий (datetime с tzinfo или None) в местное время ISO 8601 для дискового кэша.
+    """
+    return [value.replace(tzinfo=None).isoformat() if value is not None else None for value in events]
+
+def decode_events(values: list, zone: ZoneInfo) -> tuple:
+    """
+    Восстанавливает моменты событий, сохранённые encode_events(), с часовым поясом zone.
+    """
+    return tuple(datetime.fromisoformat(value).replace(tzinfo=zone) if value is not None else None for value in values)
+
+def localize(values: list, zone: ZoneInfo) -> list:
+    """
+    Присваивает наивным местным datetime часовой пояс zone. Значения None (полярный день или ночь) сохраняются.
+    """
+    return [value.replace(tzinfo=zone) if value is not None else None for value in values]
+
+def sun_moon_data(dates: np.ndarray, latitude: float, longitude: float, timezone: str, cell_size: float = DEFAULT_CELL_SIZE) -> dict:
+    """
+    Вычисляет локально данные о Солнце и Луне для одного места наблюдения (см. sun_moon_data_sites()).
+
+    Example:
+        >>> sun_moon_data(np.array(["2025-01-09"], dtype="datetime64[D]"), 55.75, 37.62, "Europe/Moscow")
+            {'date': [datetime.datetime(2025, 1, 9, 0, 0)], 'sunset': [datetime.datetime(2025, 1, 9, 16, 18, 54, tzinfo=zoneinfo.ZoneInfo(key='Europe/Moscow'))], ...}
+    """
+    return sun_moon_data_sites(dates, latitude, longitude, timezone, cell_size)[0]
+
+def forecast_dates(days: int, timezone: str, today: date = None) -> np.ndarray:
+    """
+    Возвращает местные календарные даты прогноза, начиная с сегодняшней.
+
+    Args:
+        days (int): Количество дней прогноза (FORECAST_DAYS).
+        timezone (str): Часовой пояс места наблюдения.
+        today (date, optional): Первая дата прогноза. По умолчанию - сегодняшняя дата в часовом поясе timezone.
+
+    Returns:
+        np.ndarray: Даты (datetime64[D]).
+    """
+    today = today or datetime.now(ZoneInfo(timezone)).date()
+    return np.datetime64(today, "D") + np.arange(days)
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import threading
+
+# Почасовые данные дня (см. process_weather_data()), ключи которых - объекты time
+HOURLY_KEYS = ("date_time", "quality", "moon_illumination_hourly")
+
+def fingerprint(data) -> str:
+    """
+    Вычисляет отпечаток (хэш) произвольных данных.
+
+    Данные сериализуются в JSON с сортировкой ключей, значения, не поддерживаемые JSON
+    (datetime, date, time), приводятся к строке.
+
+    Args:
+        data: Данные для вычисления отпечатка.
+
+    Returns:
+        str: Отпечаток (hex SHA-1).
+
+    Example:
+        >>> fingerprint({"cloudiness": [15, 25]}) == fingerprint({"cloudiness": [15, 25]})
+        True
+    """
+    serialized = json.dumps(data, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+def day_fingerprints(processed_data: dict) -> dict:
+    """
+    Вычисляет отпечатки окон ясной погоды для каждого дня.
+
+    Args:
+        processed_data (dict): Данные, полученные из функции process_weather_data().
+
+    Returns:
+        dict: Отпечаток для каждого дня, ключ - дата в формате ISO.
+    """
+    # Ключи почасовых данных (облачность, оценка качества, освещённость Луны) - объекты time, которые не могут быть ключами JSON,
+    # поэтому переводим их в список пар
+    return {
+        day.isoformat(): fingerprint(day_data | {key: list(day_data[key].items()) for key in HOURLY_KEYS if key in day_data})
+        for day, day_data in processed_data.items()
+    }
+
+def changed_days(previous: dict, current: dict) -> list[str]:
+    """
+    Возвращает дни, окна которых изменились (или появились) по сравнению с предыдущим запуском.
+
+    Args:
+        previous (dict): Отпечатки дней предыдущего запуска.
+        current (dict): Отпечатки дней текущего запуска.
+
+    Returns:
+        list[str]: Даты (ISO) изменившихся дней.
+    """
+    return [day for day, day_fingerprint in current.items() if previous.get(day) != day_fingerprint]
+
+class FingerprintStore:
+    """
+    Хранилище отпечатков последнего отправленного прогноза для каждого места наблюдения.
+
+    Для каждого места хранятся: отпечаток исходных данных (payload), отпечатки окон по дням (days)
+    и идентификаторы частей последнего отправленного сообщения (message_ids). Хранилище - JSON-файл,
+    который загружается при первом обращении и перезаписывается атомарно при каждом обновлении.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Путь к JSON-файлу хранилища. Каталог создаётся при первой записи.
+        """
+        self.path = path
+        self._records = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        if self._records is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    self._records = json.load(file)
+            # Отсутствующее или повреждённое хранилище равнозначно первому запуску
+            except (OSError, ValueError):
+                self._records = {}
+        return self._records
+
+    def get(self, site_key: str) -> dict:
+        """
+        Возвращает запись места наблюдения (пустой словарь, если прогноз для него ещё не отправлялся).
+        """
+        with self._lock:
+            return dict(self._load().get(site_key, {}))
+
+    def update(self, site_key: str, **fields) -> None:
+        """
+        Обновляет поля записи места наблюдения и сохраняет хранилище на диск.
+        """
+        with self._lock:
+            records = self._load()
+            records.setdefault(site_key, {}).update(fields)
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(records, file, ensure_ascii=False)
+            os.replace(temp_path, self.path)
@@ -0,0 +1,214 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from modules.metrics import metrics
+
+# Количество записей, которые хранятся в памяти по умолчанию (все пространства имён вместе).
+# Одна запись "sun" - одна пара "дата, ячейка сетки", т.е. 16384 записи - около 1600 ячеек при прогнозе на 10 дней
+DEFAULT_CAPACITY = 16384
+
+class DerivationCache:
+    """
+    Кэш производных астрономических величин (закат, сумерки, освещённость и фаза Луны), которые зависят
+    только от даты и ячейки сетки (или часового пояса) и не меняются между запусками.
+
+    Записи хранятся в памяти с вытеснением давно не использованных (LRU) при превышении capacity и,
+    если задан path, в общем файле SQLite, поэтому повторные запуски и другие процессы не повторяют расчёт.
+    Записи старше ttl секунд считаются отсутствующими. Для каждого пространства имён (namespace)
+    ведутся счётчики попаданий и промахов, они же передаются в метрики запуска.
+
+    В памяти значения хранятся как есть, в дисковом хранилище - в JSON (напрямую или через функции encode и decode).
+
+    Example:
+        >>> astronomy_cache.memoize_many("moon", [("2025-01-09", "Europe/Moscow")], lambda positions: [[79.8, "waxing gibbous"]])
+        [[79.8, 'waxing gibbous']]
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, ttl: float = None, path: str = None):
+        """
+        Args:
+            capacity (int, optional): Максимальное количество записей в памяти.
+            ttl (float, optional): Время жизни записи в секундах. По умолчанию - без ограничения.
+            path (str, optional): Путь к файлу SQLite общего дискового хранилища. По умолчанию - только память.
+        """
+        self.capacity = capacity
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()
+        self._connection = None
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+
+    def configure(self, capacity: int = DEFAULT_CAPACITY, ttl: float = None, path: str = None) -> None:
+        """
+        Изменяет параметры кэша. Записи в памяти сохраняются (лишние вытесняются), дисковое хранилище переоткрывается.
+        """
+        with self._lock:
+            self.capacity = capacity
+            self.ttl = ttl
+            if path != self.path and self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self.path = path
+            self._evict()
+
+    def _database(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            # WAL позволяет нескольким процессам читать хранилище во время записи
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS derivations (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)")
+            if self.ttl is not None:
+                self._connection.execute("DELETE FROM derivations WHERE stored_at < ?", (time.time() - self.ttl,))
+        return self._connection
+
+    def _is_fresh(self, stored_at: float, now: float) -> bool:
+        return self.ttl is None or now - stored_at <= self.ttl
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def get_many(self, namespace: str, keys: list[tuple], decode=None) -> dict:
+        """
+        Возвращает найденные записи.
+
+        Args:
+            namespace (str): Пространство имён (вид величины), например "sun" или "moon".
+            keys (list[tuple]): Ключи записей.
+            decode (callable, optional): Преобразование значения, прочитанного из дискового хранилища (см. set_many()).
+
+        Returns:
+            dict: Значения найденных записей по ключам.
+        """
+        now = time.time()
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                entry = self._entries.get((namespace, key))
+                if entry is not None and self._is_fresh(entry[0], now):
+                    self._entries.move_to_end((namespace, key))
+                    found[key] = entry[1]
+                else:
+                    missing.append(key)
+
+            if missing and self.path:
+                stored = self._load(namespace, missing, now, decode)
+                for key, (stored_at, value) in stored.items():
+                    self._entries[(namespace, key)] = (stored_at, value)
+                    found[key] = value
+                self._evict()
+
+            self.hits[namespace] = self.hits.get(namespace, 0) + len(found)
+            self.misses[namespace] = self.misses.get(namespace, 0) + len(keys) - len(found)
+        metrics.increment(f"{namespace}_memo_hits", len(found))
+        metrics.increment(f"{namespace}_memo_misses", len(keys) - len(found))
+        return found
+
+    def _load(self, namespace: str, keys: list[tuple], now: float, decode=None) -> dict:
+        encoded = {json.dumps([namespace, *key]): key for key in keys}
+        stored = {}
+        try:
+            database = self._database()
+            names = list(encoded)
+            # Количество параметров запроса SQLite ограничено, поэтому ключи запрашиваются частями
+            for start in range(0, len(names), 500):
+                part = names[start:start + 500]
+                rows = database.execute(f"SELECT key, value, stored_at FROM derivations WHERE key IN ({','.join('?' * len(part))})", part)
+                for name, value, stored_at in rows:
+                    if self._is_fresh(stored_at, now):
+                        value = json.loads(value)
+                        stored[encoded[name]] = (stored_at, decode(value) if decode else value)
+        # Недоступное хранилище равнозначно промаху: величины будут рассчитаны заново
+        except (sqlite3.Error, OSError) as error:
+            print(f"Не удалось прочитать кэш астрономических данных: {error}")
+        return stored
+
+    def set_many(self, namespace: str, values: dict, encode=None) -> None:
+        """
+        Сохраняет записи в памяти и, если задан path, в дисковом хранилище.
+
+        Args:
+            namespace (str): Пространство имён.
+            values (dict): Значения по ключам.
+            encode (callable, optional): Преобразование значения в данные, сериализуемые в JSON, для дискового хранилища.
+        """
+        now = time.time()
+        with self._lock:
+            for key, value in values.items():
+                self._entries[(namespace, key)] = (now, value)
+                self._entries.move_to_end((namespace, key))
+            self._evict()
+
+            if self.path and values:
+                rows = [(json.dumps([namespace, *key]), json.dumps(encode(value) if encode else value), now) for key, value in values.items()]
+                try:
+                    self._database().executemany("INSERT OR REPLACE INTO derivations (key, value, stored_at) VALUES (?, ?, ?)", rows)
+                # Запись в хранилище только ускоряет следующие запуски
+                except (sqlite3.Error, OSError) as error:
+                    print(f"Не удалось сохранить кэш астрономических данных: {error}")
+
+    def memoize_many(self, namespace: str, keys: list[tuple], compute, encode=None, decode=None) -> list:
+        """
+        Возвращает значения для всех ключей, вычисляя одним вызовом compute только отсутствующие.
+        Повторяющиеся ключи (например, места одной ячейки сетки) ищутся и вычисляются один раз.
+
+        Args:
+            namespace (str): Пространство имён.
+            keys (list[tuple]): Ключи записей.
+            compute (callable): Функция от списка позиций отсутствующих ключей в keys (первое вхождение каждого ключа),
+                возвращающая их значения в том же порядке.
+            encode, decode (callable, optional): Преобразования значений для дискового хранилища (см. set_many()).
+
+        Returns:
+            list: Значения в порядке keys.
+        """
+        first_positions = {}
+        for position, key in enumerate(keys):
+            first_positions.setdefault(key, position)
+        found = self.get_many(namespace, list(first_positions), decode)
+        positions = [position for key, position in first_positions.items() if key not in found]
+        if positions:
+            computed = dict(zip((keys[position] for position in positions), compute(positions)))
+            self.set_many(namespace, computed, encode)
+            found |= computed
+        return [found[key] for key in keys]
+
+    def stats(self) -> dict:
+        """
+        Возвращает счётчики попаданий и промахов и долю попаданий для каждого пространства имён.
+
+        Example:
+            >>> astronomy_cache.stats()
+            {'sun': {'hits': 270, 'misses': 30, 'hit_rate': 0.9}}
+        """
+        with self._lock:
+            return {
+                namespace: {
+                    "hits": self.hits.get(namespace, 0),
+                    "misses": self.misses.get(namespace, 0),
+                    "hit_rate": round(self.hits.get(namespace, 0) / max(self.hits.get(namespace, 0) + self.misses.get(namespace, 0), 1), 3),
+                }
+                for namespace in sorted(set(self.hits) | set(self.misses))
+            }
+
+    def clear(self) -> None:
+        """
+        Очищает записи в памяти и счётчики. Дисковое хранилище не изменяется.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits.clear()
+            self.misses.clear()
+
+# Общий кэш процесса. Параметры задаются из конфига в main.setup() (ASTRONOMY_CACHE_SIZE, ASTRONOMY_CACHE_TTL, ASTRONOMY_CACHE_FILE).
+astronomy_cache = DerivationCache()
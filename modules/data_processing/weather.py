@@ -1,12 +1,125 @@
 import math
 
+import numpy as np
+
 from datetime import time, datetime
-from modules.data_providers.config_loader import TIME_FILTER, CLOUDINESS_FILTER
+from modules.data_providers.config_loader import get_config
+
+# Коды фаз Луны. Коды 0-3 соответствуют растущей Луне, 4-7 - убывающей.
+MOON_PHASE_CODES = {
+    "new": 0,
+    "waxing crescent": 1,
+    "first quarter": 2,
+    "waxing gibbous": 3,
+    "full": 4,
+    "waning gibbous": 5,
+    "last quarter": 6,
+    "waning crescent": 7,
+}
+
+# Названия фаз Луны с переводом
+MOON_PHASE_TRANSLATION = {
+    "new": "Новолуние - \U0001F311",
+    "waxing crescent": "Растущий месяц - \U0001F312",
+    "first quarter": "Первая четверть - \U0001F313",
+    "waxing gibbous": "Растущая Луна - \U0001F314",
+    "full": "Полнолуние - \U0001F315",
+    "waning gibbous": "Убывающая Луна - \U0001F316",
+    "last quarter": "Последняя четверть - \U0001F317",
+    "waning crescent": "Убывающий месяц - \U0001F318"
+}
+
+# Синодический месяц (период лунного цикла) в днях
+SYNODIC_MONTH = 29.53
+
+# Разница во времени между полднем и полуночью в днях (12 часов)
+NOON_TO_MIDNIGHT = 0.5
+
+# Поправочный коэффициент, применяемый к вычисленной освещённости
+ILLUMINATION_CORRECTION = 0.98
+
+# Вклад облачных слоёв в потерю прозрачности: низкие облака закрывают небо полностью,
+# средние - почти полностью, высокие (перистые) - частично
+CLOUD_LAYER_WEIGHTS = {"low_clouds": 1.0, "mid_clouds": 0.8, "high_clouds": 0.5}
+
+# Влажность (%), выше которой прозрачность начинает снижаться (дымка, роса на оптике), и при которой она минимальна
+HUMIDITY_THRESHOLD = 70
+HUMIDITY_MAX = 100
+
+# Приземный ветер (км/ч) как косвенный показатель атмосферной турбулентности (seeing): до WIND_CALM
+# турбулентность не учитывается, при WIND_LIMIT и выше seeing считается плохим
+WIND_CALM = 10
+WIND_LIMIT = 50
+
+# Дополнительные почасовые переменные комбинированного запроса, которые учитываются в оценке качества наблюдений
+QUALITY_VARIABLES = ("low_clouds", "mid_clouds", "high_clouds", "humidity", "wind_speed")
+
+# Доли оценки качества, которые зависят от seeing и от влажности. Остальная часть определяется только прозрачностью.
+SEEING_WEIGHT = 0.3
+HUMIDITY_WEIGHT = 0.4
+
+def moon_phase_codes(phase_name: list[str]) -> np.ndarray:
+    """
+    Преобразует названия фаз Луны в массив кодов из MOON_PHASE_CODES.
+
+    Args:
+        phase_name (list[str]): список названий фаз луны (регистр не важен).
+
+    Returns:
+        np.ndarray: Массив кодов фаз (int8).
+
+    Example:
+    >>> moon_phase_codes(["Waxing crescent", "full"])
+    array([1, 4], dtype=int8)
+    """
+    try:
+        return np.fromiter((MOON_PHASE_CODES[name.lower()] for name in phase_name), dtype=np.int8, count=len(phase_name))
+    except KeyError:
+        raise ValueError("Invalid phase name. Please use one of the predefined phase names.")
+
+def moon_illumination_array(illumination_midday: np.ndarray, phase_codes: np.ndarray) -> np.ndarray:
+    """
+    Векторно вычисляет освещённость Луны в полночь по освещённости в полдень и коду фазы.
+
+    Вычисление выполняется для всех дней (и мест наблюдения) за один проход по массивам: по освещённости
+    находится фазовый угол в полдень, для убывающей Луны он отражается, затем угол сдвигается на 12 часов
+    синодического месяца и переводится обратно в освещённость с поправкой ILLUMINATION_CORRECTION.
+
+    Args:
+        illumination_midday (np.ndarray): освещённость Луны в полдень в процентах, массив любой формы.
+        phase_codes (np.ndarray): коды фаз Луны (см. moon_phase_codes()) той же формы.
+
+    Returns:
+        np.ndarray: Освещённость Луны в полночь в процентах (без округления).
+
+    Example:
+    >>> moon_illumination_array(np.array([15.4, 19.2]), np.array([1, 1]))
+    array([19.0..., 23.1...])
+    """
+    # Преобразуем процент освещенности в дробь от 0 до 1
+    P_t = np.asarray(illumination_midday, dtype=np.float64) / 100.0
+
+    # Убеждаемся, что входные проценты находятся в допустимых пределах
+    if not np.all((0 <= P_t) & (P_t <= 1)):
+        raise ValueError("Illumination percentage must be between 0 and 100.")
+
+    # Фазовый угол θ в полдень, для убывающей Луны - отражённый угол 2π - θ
+    theta = np.arccos(np.clip(1 - 2 * P_t, -1, 1))
+    theta_t = np.where(np.asarray(phase_codes) < 4, theta, 2 * math.pi - theta)
+
+    # Фазовый угол в полночь, нормализованный к диапазону от 0 до 2π
+    delta_theta = 2 * math.pi * (NOON_TO_MIDNIGHT / SYNODIC_MONTH)
+    theta_t_plus_delta = (theta_t + delta_theta) % (2 * math.pi)
+
+    # Освещенность в полночь в процентах с поправочным коэффициентом
+    return 0.5 * (1 - np.cos(theta_t_plus_delta)) * 100 * ILLUMINATION_CORRECTION
 
 def moon_illumination(illumination_midday: list[float], phase_name: list[str]) -> list:
     """
     Производит расчёт осещенности Луны в полночь, основываясь на данных освещённости в полдень и фазе Луны.
 
+    Обёртка над moon_illumination_array(), округляющая результаты до одного знака после запятой.
+
     Args:
         illumination_midday (list[float]): список значений освещенности луны в полдень. Одно значение для каждого дня.
         phase_name (list[str]): список названий фаз луны. Одно значние для каждого дня.
@@ -15,83 +128,11 @@ def moon_illumination(illumination_midday: list[float], phase_name: list[str]) -
         list: Список значений освещенности Луны в полночь для каждого дня.
 
     Example:
-    >>> moon_illumination([15.4, 19.2], ["waxing crescent", "waxing crescent")
+    >>> moon_illumination([15.4, 19.2], ["waxing crescent", "waxing crescent"])
     [19.0, 23.1]
     """
-    
-    waxing = ["new", "waxing crescent", "first quarter", "waxing gibbous"]
-    waning = ["full", "waning gibbous", "last quarter", "waning crescent"]
-    result = []
-
-    def process_data(noon_percentage: float, phase_name: str) -> float:
-        """
-        Производит расчёт осещенности Луны в полночь, основываясь на данных освещённости в полдень и фазе Луны.
-
-        Args:
-            noon_percentage (float): значение освещенности луны в полдень для одного конкретного дня.
-            phase_name (str): Название фазы Луны для одного конкретного дня.
-        
-        Returns:
-            float: значение освещенности Луны в полночь для одного конкретного дня.
-
-        Example:
-        >>> process_data(15.4, "waxing crescent")
-        19.0
-        """
-
-        # Приводим название фазы к нижнему регистру для сравнения
-        phase_name = phase_name.lower()
-
-        # Проверяем, является ли название фазы корректным и определяем фазу Луны
-        if phase_name in waxing:
-            is_waxing = True
-        elif phase_name in waning:
-            is_waxing = False
-        else:
-            raise ValueError("Invalid phase name. Please use one of the predefined phase names.")
-
-        # Константы
-        T = 29.53          # Синодический месяц (период лунного цикла) в днях
-        delta_t = 0.5      # Разница во времени в днях (12 часов)
-
-        # Преобразуем процент освещенности в дробь от 0 до 1
-        P_t = noon_percentage / 100.0
-
-        # Убеждаемся, что входной процент находится в допустимых пределах
-        if not (0 <= P_t <= 1):
-            raise ValueError("Illumination percentage must be between 0 and 100.")
-
-        # Шаг 1: Вычисляем начальный фазовый угол θ в полдень
-        cos_theta = 1 - 2 * P_t
-        # Убеждаемся, что значение находится в допустимом диапазоне для arccos
-        cos_theta = min(max(cos_theta, -1), 1)
-        theta = math.acos(cos_theta)
-
-        # Шаг 2: Определяем фазовый угол θ(t) в зависимости от фазы Луны
-        if is_waxing:
-            theta_t = theta
-        else:
-            theta_t = 2 * math.pi - theta
-
-        # Шаг 3: Вычисляем изменение фазового угла за Δt
-        delta_theta = 2 * math.pi * (delta_t / T)
-
-        # Шаг 4: Вычисляем фазовый угол в полночь
-        theta_t_plus_delta = theta_t + delta_theta
-        # Нормализуем угол, чтобы он оставался в диапазоне от 0 до 2π
-        theta_t_plus_delta = theta_t_plus_delta % (2 * math.pi)
-
-        # Шаг 5: Вычисляем процент освещенности в полночь
-        P_t_plus_delta = 0.5 * (1 - math.cos(theta_t_plus_delta))
-        illumination_percentage = P_t_plus_delta * 100  # Преобразуем в проценты
-
-        # Добавляем результат в список, применяя поправочный коэффициент 0.98
-        result.append(round(illumination_percentage * 0.98, 1))
-
-    for i in range(len(illumination_midday)):
-        process_data(illumination_midday[i], phase_name[i])
-    
-    return result
+    illumination = moon_illumination_array(illumination_midday, moon_phase_codes(phase_name))
+    return [round(value, 1) for value in illumination.tolist()]
 
 def is_time_in_range(range_from: time, range_to: time, timestamp_to_check: time) -> bool:
     """
@@ -113,7 +154,156 @@ def is_time_in_range(range_from: time, range_to: time, timestamp_to_check: time)
     # Проверяем, что метка времени попадает под один из критериев: больше или равно начальной точке диапазона ИЛИ больше или равно 00:00 но меньше или равно конечной точке диапазона
     return timestamp_to_check >= range_from or time(0, 0) <= timestamp_to_check <= range_to
     
-def filter_cloudiness_data(data: dict, sunset: time) -> dict:
+def observing_quality_score(cloudiness, low_clouds=None, mid_clouds=None, high_clouds=None, humidity=None, wind_speed=None) -> np.ndarray:
+    """
+    Вычисляет почасовую оценку качества наблюдений от 0 (наблюдения невозможны) до 100 (идеальные условия).
+
+    Оценка - произведение трёх множителей, вычисляемых векторно для всего ряда:
+    прозрачность (по облачным слоям с весами CLOUD_LAYER_WEIGHTS, а если слои неизвестны - по общей облачности),
+    множитель влажности (снижается от HUMIDITY_THRESHOLD до HUMIDITY_MAX) и множитель seeing
+    (по приземному ветру от WIND_CALM до WIND_LIMIT). Отсутствующие данные (None) не снижают оценку.
+
+    Args:
+        cloudiness: Общая облачность, %.
+        low_clouds, mid_clouds, high_clouds (optional): Облачность нижнего, среднего и верхнего яруса, %.
+        humidity (optional): Относительная влажность, %.
+        wind_speed (optional): Скорость приземного ветра, км/ч.
+
+    Returns:
+        np.ndarray: Оценка качества для каждого часа (int16).
+
+    Example:
+        >>> observing_quality_score([0, 50], low_clouds=[0, 0], mid_clouds=[0, 10], high_clouds=[0, 60], humidity=[60, 85], wind_speed=[5, 30])
+        array([100,  42], dtype=int16)
+    """
+    cloudiness = np.asarray(cloudiness, dtype=np.float32)
+    layers = {"low_clouds": low_clouds, "mid_clouds": mid_clouds, "high_clouds": high_clouds}
+
+    if all(layer is not None for layer in layers.values()):
+        # Ярусы перекрываются, поэтому взвешенная сумма не может превышать общую облачность
+        cover = np.minimum(sum(CLOUD_LAYER_WEIGHTS[name] * np.asarray(layer, dtype=np.float32) for name, layer in layers.items()), cloudiness)
+    else:
+        cover = cloudiness
+    transparency = 1 - np.clip(cover, 0, 100) / 100
+
+    humidity_factor = 1.0
+    if humidity is not None:
+        humidity_factor = 1 - np.clip((np.asarray(humidity, dtype=np.float32) - HUMIDITY_THRESHOLD) / (HUMIDITY_MAX - HUMIDITY_THRESHOLD), 0, 1)
+
+    seeing_factor = 1.0
+    if wind_speed is not None:
+        seeing_factor = 1 - np.clip((np.asarray(wind_speed, dtype=np.float32) - WIND_CALM) / (WIND_LIMIT - WIND_CALM), 0, 1)
+
+    score = 100 * transparency * (1 - HUMIDITY_WEIGHT + HUMIDITY_WEIGHT * humidity_factor) * (1 - SEEING_WEIGHT + SEEING_WEIGHT * seeing_factor)
+    return np.rint(score).astype(np.int16)
+
+class HourlySeries:
+    """
+    Колоночное представление почасовых данных об облачности.
+
+    Вместо словарей, вложенных по дням и часам, хранит два параллельных массива NumPy:
+    временные метки (datetime64 с точностью до минуты) и облачность в процентах. Группировка по дням
+    и фильтрация выполняются масками над массивами целиком, без цикла по часам на Python.
+
+    Attributes:
+        date_time (np.ndarray): Временные метки, dtype datetime64[m].
+        cloudiness (np.ndarray): Облачность в процентах, dtype int16.
+        quality (np.ndarray | None): Оценка качества наблюдений (см. observing_quality_score()), dtype int16.
+            None, если в данных нет облачных слоёв, влажности и ветра (раздельные запросы /clouds-1h и /sunmoon).
+    """
+
+    __slots__ = ("date_time", "cloudiness", "quality")
+
+    def __init__(self, date_time: np.ndarray, cloudiness: np.ndarray, quality: np.ndarray = None):
+        self.date_time = np.asarray(date_time, dtype="datetime64[m]")
+        self.cloudiness = np.asarray(cloudiness, dtype=np.int16)
+        self.quality = np.asarray(quality, dtype=np.int16) if quality is not None else None
+
+    @classmethod
+    def from_lists(cls, date_time: list[datetime], cloudiness: list[int]) -> "HourlySeries":
+        """
+        Создаёт ряд из списков, полученных из функции get_clouds_data().
+
+        Example:
+            >>> HourlySeries.from_lists([datetime(2025, 1, 9, 0, 0)], [65])
+            HourlySeries(1 hours)
+        """
+        return cls(np.array(date_time, dtype="datetime64[m]"), np.array(cloudiness, dtype=np.int16))
+
+    @classmethod
+    def from_clouds_data(cls, clouds_data: dict) -> "HourlySeries":
+        """
+        Создаёт ряд из результата get_clouds_data() или get_combined_data().
+
+        Если в данных есть дополнительные переменные комбинированного запроса (облачные слои, влажность,
+        ветер), для каждого часа сразу вычисляется оценка качества наблюдений.
+        """
+        quality = None
+        if any(name in clouds_data for name in QUALITY_VARIABLES):
+            quality = observing_quality_score(clouds_data["cloudiness"], **{name: clouds_data.get(name) for name in QUALITY_VARIABLES})
+        return cls(np.array(clouds_data["date_time"], dtype="datetime64[m]"), np.array(clouds_data["cloudiness"], dtype=np.int16), quality)
+
+    def __len__(self) -> int:
+        return len(self.date_time)
+
+    def __repr__(self) -> str:
+        return f"HourlySeries({len(self)} hours)"
+
+    def select(self, mask: np.ndarray) -> "HourlySeries":
+        """
+        Возвращает новый ряд, содержащий только записи, отмеченные в маске.
+        """
+        return HourlySeries(self.date_time[mask], self.cloudiness[mask], self.quality[mask] if self.quality is not None else None)
+
+    def days(self) -> np.ndarray:
+        """
+        Возвращает дату каждой записи (datetime64[D]).
+        """
+        return self.date_time.astype("datetime64[D]")
+
+    def minutes_of_day(self) -> np.ndarray:
+        """
+        Возвращает время каждой записи в минутах от начала суток.
+        """
+        return (self.date_time - self.days()).astype(np.int32)
+
+    def to_lists(self) -> dict:
+        """
+        Преобразует ряд обратно в словарь списков формата get_clouds_data().
+        """
+        lists = {
+            "date_time": self.date_time.tolist(),
+            "cloudiness": self.cloudiness.tolist(),
+        }
+        if self.quality is not None:
+            lists["quality"] = self.quality.tolist()
+        return lists
+
+def time_to_minutes(value: time) -> int:
+    """
+    Переводит время в количество минут от начала суток.
+
+    Example:
+        >>> time_to_minutes(time(3, 0))
+        180
+    """
+    return value.hour * 60 + value.minute
+
+def time_in_range_mask(range_from: np.ndarray, range_to: time, minutes: np.ndarray) -> np.ndarray:
+    """
+    Векторный аналог is_time_in_range() для массива значений времени.
+
+    Args:
+        range_from (np.ndarray): Начало диапазона в минутах от начала суток - одно значение или массив для каждой записи.
+        range_to (datetime.time): Конечная точка диапазона (переход через полночь).
+        minutes (np.ndarray): Проверяемое время в минутах от начала суток.
+
+    Returns:
+        np.ndarray: Булева маска записей, попадающих в диапазон.
+    """
+    return (minutes >= range_from) | (minutes <= time_to_minutes(range_to))
+
+def filter_cloudiness_data(data: dict, sunset: time, time_filter: time = None, cloudiness_filter: int = None) -> dict:
     """
     Фильтрует данные о дате/времени и облачности.
 
@@ -122,10 +312,17 @@ def filter_cloudiness_data(data: dict, sunset: time) -> dict:
     Args:
         data (dict): словарь значений время:облачность для 1 конкретного дня
         sunset (datetime.time): информация о времени захода Солнца в этот день. Начальная точка диапазона фильтрации.
+        time_filter (datetime.time, optional): конечная точка диапазона фильтрации по времени. По умолчанию - TIME_FILTER из конфига.
+        cloudiness_filter (int, optional): максимально приемлемая облачность. По умолчанию - CLOUDINESS_FILTER из конфига.
 
     Returns:
         dict: словарь с отфильтрованными значениями date_time и cloudiness
     """
+    if time_filter is None or cloudiness_filter is None:
+        config = get_config()
+        time_filter = config.TIME_FILTER if time_filter is None else time_filter
+        cloudiness_filter = config.CLOUDINESS_FILTER if cloudiness_filter is None else cloudiness_filter
+
     # Создаём пустой словарь, куда будем помещать отфилтьрованные данные
     filtered_data = {}
 
@@ -133,7 +330,7 @@ def filter_cloudiness_data(data: dict, sunset: time) -> dict:
     # в копию те пары, которые не попадают в заданный диапазон времени или макисмально
     # допустимный показатель облачности
     for date_time, cloudiness in zip(data.keys(), data.values()):
-        if is_time_in_range(sunset, TIME_FILTER, date_time) and cloudiness <= CLOUDINESS_FILTER:
+        if is_time_in_range(sunset, time_filter, date_time) and cloudiness <= cloudiness_filter:
             filtered_data[date_time] = cloudiness
 
     return filtered_data
@@ -167,15 +364,126 @@ def split_cloudiness_by_days(datetime: dict) -> dict:
     
     return grouped_cloudiness
 
-def process_weather_data(clouds_data: dict, moon_data: dict) -> dict:
+def evening_start_minutes(moon_data: dict, days: int) -> tuple:
+    """
+    Определяет для первых days дней начало вечернего диапазона наблюдений в минутах от начала суток.
+
+    Обычно это время заката. Если заката нет (None, полярный день или ночь при локальном расчёте), то
+    в полярную ночь диапазон начинается с окончания астрономических сумерек, а если Солнце не поднимается
+    и до них - с 00:00. В полярный день наблюдения невозможны, и день целиком исключается.
+    День без заката без признака polar_day (см. ephemeris.sun_moon_data_sites()) считается полярным днём.
+
+    Args:
+        moon_data (dict): Данные о Луне и закате (см. get_sun_moon_data()).
+        days (int): Количество дней.
+
+    Returns:
+        tuple: Начало диапазона для каждого дня (np.ndarray, минуты) и признак того, что в день есть ночь (np.ndarray, bool).
+    """
+    dusk_times = moon_data.get("astronomical_dusk") or [None] * days
+    polar_day = moon_data.get("polar_day") or [True] * days
+    start = np.zeros(days, dtype=np.int32)
+    has_night = np.ones(days, dtype=bool)
+    for day, (sunset, dusk, is_polar_day) in enumerate(zip(moon_data["sunset"][:days], dusk_times, polar_day)):
+        if sunset is not None:
+            start[day] = time_to_minutes(sunset.time())
+        elif is_polar_day:
+            has_night[day] = False
+        elif dusk is not None:
+            start[day] = time_to_minutes(dusk.time())
+    return start, has_night
+
+def moon_day_index(clouds_data: HourlySeries, moon_data: dict) -> np.ndarray:
+    """
+    Сопоставляет записи ряда с днями данных о Луне и Солнце по дате.
+
+    Args:
+        clouds_data (HourlySeries): Почасовые данные об облачности.
+        moon_data (dict): Данные о Луне и закате (см. get_sun_moon_data()), ключ date - даты прогноза.
+
+    Returns:
+        np.ndarray: Номер дня в moon_data для каждой записи, -1 - для записей, даты которых в moon_data нет.
+
+    Example:
+        >>> moon_day_index(HourlySeries.from_lists([datetime(2025, 1, 9, 21), datetime(2025, 1, 10, 0)], [10, 20]), {"date": [datetime(2025, 1, 10)]})
+        array([-1,  0])
+    """
+    moon_days = np.array([value.date() for value in moon_data["date"]], dtype="datetime64[D]")
+    if not len(moon_days):
+        return np.full(len(clouds_data), -1, dtype=np.int64)
+    order = np.argsort(moon_days, kind="stable")
+    record_days = clouds_data.days()
+    positions = np.minimum(np.searchsorted(moon_days[order], record_days), len(moon_days) - 1)
+    return np.where(moon_days[order][positions] == record_days, order[positions], -1)
+
+def observing_hours_mask(clouds_data: HourlySeries, moon_data: dict, time_filter: time, cloudiness_filter: int) -> tuple:
+    """
+    Отмечает часы, подходящие для наблюдений: от заката до time_filter с облачностью не выше cloudiness_filter.
+
+    Группировка по дням и фильтрация выполняются векторно над всем рядом. Дни сопоставляются с данными
+    о Луне и Солнце по дате (см. moon_day_index()), поэтому данные, полученные в разные дни (например,
+    ответ /sunmoon из кэша, запрошенный до местной полуночи), не смещают закат и Луну на день.
+    Записи, для дат которых нет данных о Луне и Солнце (в том числе 00:00 дня, следующего за последним
+    днём прогноза), не отмечаются.
+
+    Args:
+        clouds_data (HourlySeries): Почасовые данные об облачности.
+        moon_data (dict): Данные о Луне и закате (см. get_sun_moon_data()).
+        time_filter (datetime.time): Конечная точка диапазона фильтрации по времени.
+        cloudiness_filter (int): Максимально приемлемая облачность.
+
+    Returns:
+        tuple: Булева маска подходящих часов, номер дня в moon_data для каждой записи (-1 - нет данных)
+            и время заката дня каждой записи в минутах от начала суток (см. evening_start_minutes()).
+    """
+    day_index = moon_day_index(clouds_data, moon_data)
+    if not len(moon_data["sunset"]):
+        return np.zeros(len(clouds_data), dtype=bool), day_index, np.zeros(len(clouds_data), dtype=np.int32)
+
+    # Время заката в минутах для каждого дня (в полярную ночь - окончание сумерек или 00:00), а затем - для каждой записи этого дня
+    sunset_minutes, has_night = evening_start_minutes(moon_data, len(moon_data["sunset"]))
+    record_day = np.maximum(day_index, 0)
+    is_processed = (day_index >= 0) & has_night[record_day]
+    record_sunset = sunset_minutes[record_day]
+
+    # Одна маска для всех дней: день обрабатывается, время от заката до time_filter, облачность не выше фильтра
+    mask = is_processed & time_in_range_mask(record_sunset, time_filter, clouds_data.minutes_of_day()) & (clouds_data.cloudiness <= cloudiness_filter)
+    return mask, day_index, record_sunset
+
+def record_moon_illumination(clouds_data: HourlySeries, moon_data: dict, day_index: np.ndarray) -> np.ndarray:
+    """
+    Возвращает освещённость Луны (%) на время каждой записи ряда или None, если почасовая освещённость
+    не рассчитана (см. ephemeris.sun_moon_data_sites(), ключ moon_illumination_hourly).
+
+    Args:
+        clouds_data (HourlySeries): Почасовые данные об облачности.
+        moon_data (dict): Данные о Луне и закате.
+        day_index (np.ndarray): Номер дня данных о Луне для каждой записи (см. observing_hours_mask()).
+    """
+    hourly = moon_data.get("moon_illumination_hourly")
+    if not hourly:
+        return None
+    table = np.asarray(hourly, dtype=np.float32)
+    return table[np.clip(day_index, 0, len(table) - 1), clouds_data.minutes_of_day() // 60]
+
+def process_weather_data(clouds_data, moon_data: dict, time_filter: time = None, cloudiness_filter: int = None, observing_hours: tuple = None) -> dict:
     """
     Обрабатывает и компонует данные об облачности и луне.
 
     Обрабатывает и компонует данные об облачности (по часам), фазе и освещенности Луны, времени заката в один единый словарь с группировкой по дням.
+    Группировка по дням, фильтр по времени (от заката до time_filter) и фильтр по облачности выполняются
+    векторно над колоночным представлением HourlySeries.
+    Если для ряда вычислена оценка качества наблюдений, в данные каждого дня добавляется словарь quality (время: оценка),
+    а если рассчитана почасовая освещённость Луны - словарь moon_illumination_hourly (время: освещённость).
 
     Args:
-        clouds_data (dict): содержит данные об облачности, полученные из функции get_clouds_data()
+        clouds_data (HourlySeries | dict): содержит данные об облачности, полученные из функции get_clouds_data()
+            (словарь списков) или уже преобразованные в HourlySeries.
         moon_data (dict): содержит данные о Луне и закате, полученные из функции get_sun_mon_data()
+        time_filter (datetime.time, optional): конечная точка диапазона фильтрации по времени. По умолчанию - TIME_FILTER из конфига.
+        cloudiness_filter (int, optional): максимально приемлемая облачность. По умолчанию - CLOUDINESS_FILTER из конфига.
+        observing_hours (tuple, optional): результат observing_hours_mask() для тех же данных и фильтров, если он
+            уже вычислен (например, для индекса окон). По умолчанию вычисляется заново.
 
     Returns:
         dict: Итоговый словарь, который содержит в себе обработанные и объединенные данные из обоих словарей.
@@ -190,50 +498,70 @@ def process_weather_data(clouds_data: dict, moon_data: dict) -> dict:
             >>> 2.4 Добавляем запись о названии фазы Луны
         >>> 3. Возвращает итоговый словарь с разбивкой по дням
     """
+    if time_filter is None or cloudiness_filter is None:
+        config = get_config()
+        time_filter = config.TIME_FILTER if time_filter is None else time_filter
+        cloudiness_filter = config.CLOUDINESS_FILTER if cloudiness_filter is None else cloudiness_filter
+    if not isinstance(clouds_data, HourlySeries):
+        clouds_data = HourlySeries.from_clouds_data(clouds_data)
+
+    mask, day_index, _ = observing_hours or observing_hours_mask(clouds_data, moon_data, time_filter, cloudiness_filter)
+
+    kept_times = clouds_data.date_time[mask].tolist()
+    kept_cloudiness = clouds_data.cloudiness[mask].tolist()
+    kept_days = day_index[mask].tolist()
+    kept_quality = clouds_data.quality[mask].tolist() if clouds_data.quality is not None else None
+    moon_hourly = record_moon_illumination(clouds_data, moon_data, day_index)
+    kept_moon = moon_hourly[mask].tolist() if moon_hourly is not None else None
+
+    # Дни без данных об облачности (отброшенных фильтром) в итоговый словарь не попадают
+    result = {}
+    previous_day = None
+    for position, (date_time, cloudiness, day) in enumerate(zip(kept_times, kept_cloudiness, kept_days)):
+        if day != previous_day:
+            previous_day = day
+            date = date_time.date()
+            result[date] = {
+                "date_time": {},
+                # В полярную ночь заката нет (None)
+                "sunset": moon_data["sunset"][day].time() if moon_data["sunset"][day] is not None else None,
+                "moon_illumination": moon_data["moon_illumination"][day],
+                "moon_phase": MOON_PHASE_TRANSLATION[moon_data["moon_phase_name"][day]],
+            }
+        result[date]["date_time"][date_time.time()] = cloudiness
+        # Оценка качества наблюдений - только если она вычислена (комбинированный запрос)
+        if kept_quality is not None:
+            result[date].setdefault("quality", {})[date_time.time()] = kept_quality[position]
+        # Освещённость Луны в этот час - только если она рассчитана локально (SUN_MOON_SOURCE: local)
+        if kept_moon is not None:
+            result[date].setdefault("moon_illumination_hourly", {})[date_time.time()] = round(kept_moon[position], 1)
 
-    # Названия фаз Луны с переводом
-    moon_phase_translation = {
-        "new": "Новолуние - \U0001F311",
-        "waxing crescent": "Растущий месяц - \U0001F312",
-        "first quarter": "Первая четверть - \U0001F313",
-        "waxing gibbous": "Растущая Луна - \U0001F314",
-        "full": "Полнолуние - \U0001F315",
-        "waning gibbous": "Убывающая Луна - \U0001F316",
-        "last quarter": "Последняя четверть - \U0001F317",
-        "waning crescent": "Убывающий месяц - \U0001F318"
-    }
-
-    clouds_data = split_cloudiness_by_days(clouds_data)
-
-    for day, sunset, moon_illumination_data, moon_phase in zip(clouds_data, moon_data["sunset"], moon_data["moon_illumination"], moon_data["moon_phase_name"]):
-        clouds_data[day]["date_time"] = filter_cloudiness_data(clouds_data[day]["date_time"], sunset.time())
-        clouds_data[day]["sunset"] = sunset.time()
-        clouds_data[day]["moon_illumination"] = moon_illumination_data
-        clouds_data[day]["moon_phase"] = moon_phase_translation[moon_phase]
-    
-    # Удаляем последний элемент словаря, т.к. он содержит 00:00 для дня, следующего
-    # после последего запрошенного дня. Для этой даты не запрашиваются данные о
-    # Луне и Солнце, в следствие чего этот элемент словаря не нужен.
-    clouds_data.popitem()
+    return result
+
+def outdated_data_mask(clouds_data: HourlySeries, now: datetime = None) -> np.ndarray:
+    """
+    Возвращает маску актуальных записей - всех, кроме прошедших дней и прошедших часов текущего дня.
 
-    # Удалим все дни с пустой информацией об облачности (которая была отброшена фильтром)
-    # Конструкция list(dict.keys()) итерируется по копии ключей словаря,
-    # позволяя изменять словарь, не получая ошибку об изменении длины словаря
-    # во время итерации.
-    for day in list(clouds_data.keys()):
-        if not clouds_data[day]["date_time"]:
-            clouds_data.pop(day)
+    Прошедшие дни встречаются в ответе, полученном до местной полуночи (например, из кэша или в режиме службы).
 
-    return clouds_data
+    Args:
+        clouds_data (HourlySeries): Почасовые данные об облачности.
+        now (datetime, optional): Момент составления отчёта в местном времени места наблюдения (без tzinfo).
+            По умолчанию - текущее время.
+
+    Returns:
+        np.ndarray: Булева маска записей, которые нужно оставить.
+    """
+    return clouds_data.date_time > np.datetime64(now or datetime.now(), "m")
 
 def outdated_data_filter(date_time: list[datetime], cloudiness: list[int]) -> list:
         """
         Фильтрует данные время/облачность, убирая устаревшие данные
 
         Убирает данные за время, которое уже прошло, относительно момента составления отчёта.
-        Происходит параллельная итерация по обоим входным спискам, и если обнаруживается временная метка,
-        которая равна или больше текущего момента времени - временная метка переносится в результирующий "очищенный" список,
-        а соответствующий показатель облачности для этой метки переносится в аналогичный результирующий список для облачности.
+        Текущее время определяется один раз, а отбор выполняется маской outdated_data_mask():
+        если временная метка не позже текущего момента (в том числе относится к прошедшему дню) - она отбрасывается
+        вместе с соответствующим показателем облачности.
 
         Args:
             date_time (list[datetime]): Список временных меток
@@ -242,16 +570,5 @@ def outdated_data_filter(date_time: list[datetime], cloudiness: list[int]) -> li
         Returns:
             list: Два списка с отфильтрованными значениями времени и облачности. 
         """
-        filtered_date_time = []
-        filtered_cloudiness = []
-
-        for datetime, cloudiness in zip(date_time, cloudiness):
-            if datetime.date() == datetime.now().date() and datetime.time() <= datetime.now().time():
-                pass
-            else:
-                filtered_date_time.append(datetime)
-                filtered_cloudiness.append(cloudiness)
-        return {
-        "date_time": filtered_date_time,
-        "cloudiness": filtered_cloudiness,
-        }
\ No newline at end of file
+        clouds_data = HourlySeries.from_lists(date_time, cloudiness)
+        return clouds_data.select(outdated_data_mask(clouds_data)).to_lists()
@@ -0,0 +1,262 @@
+import threading
+
+import numpy as np
+
+from datetime import datetime, time
+from zoneinfo import ZoneInfo
+from modules.data_processing.weather import HourlySeries, observing_hours_mask, record_moon_illumination, time_to_minutes
+from modules.data_providers.config_loader import get_config
+
+# Шаг почасового ряда
+HOUR = np.timedelta64(60, "m")
+
+# Часовой пояс, в котором сравниваются окна разных мест наблюдения
+UTC = ZoneInfo("UTC")
+
+# Задержка после заката, после которой небо считается тёмным, если время астрономических сумерек неизвестно (минуты)
+DARKNESS_DELAY = 90
+
+# Вклад темноты и освещённости Луны в ранг окна: окно целиком в сумерках или при полной Луне
+# теряет соответствующую долю своей длины
+DARKNESS_WEIGHT = 0.5
+MOON_WEIGHT = 0.5
+
+def find_runs(mask: np.ndarray, date_time: np.ndarray) -> tuple:
+    """
+    Находит непрерывные серии подходящих часов за один проход по ряду.
+
+    Серия прерывается на неподходящем часе и на пропуске в ряду (соседние метки отстоят больше чем на час).
+
+    Args:
+        mask (np.ndarray): Булева маска подходящих часов.
+        date_time (np.ndarray): Временные метки ряда (datetime64[m]).
+
+    Returns:
+        tuple: Индексы начала серий и индексы, следующие за концом серий (np.ndarray).
+
+    Example:
+        >>> find_runs(np.array([True, True, False, True]), np.arange(4) * HOUR + np.datetime64("2025-01-09T20:00"))
+        (array([0, 3]), array([2, 4]))
+    """
+    # Час продолжает серию предыдущего часа, если оба подходят и между ними ровно один час
+    continues = np.zeros(len(mask), dtype=bool)
+    continues[1:] = mask[1:] & mask[:-1] & (np.diff(date_time) == HOUR)
+    starts = np.flatnonzero(mask & ~continues)
+    ends = np.flatnonzero(mask & ~np.append(continues[1:], False)) + 1
+    return starts, ends
+
+def segment_sums(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Возвращает сумму значений в каждом отрезке [start, end) через накопленные суммы.
+    """
+    cumulative = np.concatenate(([0], np.cumsum(values, dtype=np.float64)))
+    return cumulative[ends] - cumulative[starts]
+
+def dark_hours_mask(clouds_data: HourlySeries, moon_data: dict, day_index: np.ndarray, record_sunset: np.ndarray, time_filter: time) -> np.ndarray:
+    """
+    Отмечает тёмные часы: после астрономических сумерек (или через DARKNESS_DELAY минут после заката,
+    если время сумерек неизвестно) и после полуночи до time_filter.
+    """
+    minutes = clouds_data.minutes_of_day()
+    dusk = record_sunset + DARKNESS_DELAY
+    dusk_times = moon_data.get("astronomical_dusk")
+    if dusk_times:
+        known = np.array([time_to_minutes(value.time()) if value is not None else -1 for value in dusk_times], dtype=np.int32)
+        record_dusk = known[np.clip(day_index, 0, len(known) - 1)]
+        dusk = np.where(record_dusk >= 0, record_dusk, dusk)
+    return (minutes >= dusk) | (minutes <= time_to_minutes(time_filter))
+
+def local_to_utc(values: np.ndarray, timezone: str) -> np.ndarray:
+    """
+    Переводит местное время (datetime64 без часового пояса) в UTC с учётом перехода на летнее время.
+
+    Example:
+        >>> local_to_utc(np.array(["2025-01-09T21:00"], dtype="datetime64[m]"), "Europe/Moscow")
+        array(['2025-01-09T18:00'], dtype='datetime64[m]')
+    """
+    zone = ZoneInfo(timezone)
+    return np.array(
+        [value.replace(tzinfo=zone).astimezone(UTC).replace(tzinfo=None) for value in values.tolist()],
+        dtype="datetime64[m]",
+    )
+
+def site_windows(clouds_data: HourlySeries, moon_data: dict, time_filter: time, cloudiness_filter: int, observing_hours: tuple = None) -> dict:
+    """
+    Находит окна ясной погоды одного места наблюдения и вычисляет их характеристики.
+
+    Окно - непрерывная серия часов от заката до time_filter с облачностью не выше cloudiness_filter
+    (те же часы, что попадают в отчёт). Серия может переходить через полночь.
+    Все вычисления векторные и линейные по длине ряда.
+
+    Args:
+        clouds_data (HourlySeries): Почасовые данные об облачности.
+        moon_data (dict): Данные о Луне и закате (см. get_sun_moon_data()).
+        time_filter (datetime.time): Конечная точка диапазона фильтрации по времени.
+        cloudiness_filter (int): Максимально приемлемая облачность.
+        observing_hours (tuple, optional): Результат observing_hours_mask() для тех же данных и фильтров, если он
+            уже вычислен (например, при обработке данных для отчёта). По умолчанию вычисляется заново.
+
+    Returns:
+        dict: Колонки окон (np.ndarray одинаковой длины): start и end (datetime64[m], конец - начало часа,
+            следующего за последним), hours, mean_cloudiness, darkness (доля тёмных часов),
+            moon_illumination (средняя освещённость Луны за часы окна или, если она известна только по дням,
+            в день начала окна, %) и score (ранг окна).
+    """
+    mask, day_index, record_sunset = observing_hours or observing_hours_mask(clouds_data, moon_data, time_filter, cloudiness_filter)
+    starts, ends = find_runs(mask, clouds_data.date_time)
+
+    hours = ends - starts
+    darkness = segment_sums(dark_hours_mask(clouds_data, moon_data, day_index, record_sunset, time_filter), starts, ends) / np.maximum(hours, 1)
+    # Освещённость Луны - средняя по часам окна, если она рассчитана почасово, иначе - в полночь дня начала окна
+    moon_hourly = record_moon_illumination(clouds_data, moon_data, day_index)
+    illumination = np.asarray(moon_data["moon_illumination"], dtype=np.float32)
+    if moon_hourly is not None:
+        moon_illumination = segment_sums(moon_hourly, starts, ends) / np.maximum(hours, 1)
+    elif len(illumination):
+        moon_illumination = illumination[np.clip(day_index[starts], 0, len(illumination) - 1)]
+    else:
+        moon_illumination = np.zeros(len(starts), dtype=np.float32)
+
+    return {
+        "start": clouds_data.date_time[starts],
+        "end": clouds_data.date_time[ends - 1] + HOUR,
+        "hours": hours.astype(np.int16),
+        "mean_cloudiness": (segment_sums(clouds_data.cloudiness, starts, ends) / np.maximum(hours, 1)).astype(np.float32),
+        "darkness": darkness.astype(np.float32),
+        "moon_illumination": moon_illumination.astype(np.float32),
+        "score": window_score(hours, darkness, moon_illumination),
+    }
+
+def window_score(hours: np.ndarray, darkness: np.ndarray, moon_illumination: np.ndarray) -> np.ndarray:
+    """
+    Вычисляет ранг окон: длина в часах, уменьшенная за светлые часы (сумерки) и за освещённость Луны.
+
+    Example:
+        >>> window_score(np.array([4]), np.array([1.0]), np.array([0.0]))
+        array([4.], dtype=float32)
+    """
+    darkness_factor = 1 - DARKNESS_WEIGHT * (1 - np.asarray(darkness, dtype=np.float32))
+    moon_factor = 1 - MOON_WEIGHT * np.asarray(moon_illumination, dtype=np.float32) / 100
+    return (np.asarray(hours, dtype=np.float32) * darkness_factor * moon_factor).astype(np.float32)
+
+class WindowIndex:
+    """
+    Индекс окон ясной погоды по местам наблюдения для быстрых запросов "лучшие N окон".
+
+    Окна каждого места вычисляются один раз при обновлении прогноза (update()) и хранятся колонками NumPy.
+    Начало и конец окна хранятся и в местном времени места (для отчёта), и в UTC: места из разных часовых поясов
+    отбираются по времени относительно одного и того же момента.
+    Запрос best() отбирает окна по времени и месту маской и выбирает лучшие через argpartition,
+    не перебирая часы и не строя вложенные словари, поэтому отвечает за миллисекунды и для большого
+    количества мест.
+
+    Example:
+        >>> index = WindowIndex()
+        >>> index.update("Дача", clouds_series, sun_moon_data, time(3, 0), 40)
+        >>> index.best(3, days=2)
+            [{'site': 'Дача', 'start': datetime.datetime(2025, 1, 9, 21, 0), 'end': ..., 'hours': 5, ...}]
+    """
+
+    # Колонки окон, которые хранит индекс (см. site_windows())
+    COLUMNS = ("start", "end", "start_utc", "end_utc", "hours", "mean_cloudiness", "darkness", "moon_illumination", "score")
+
+    def __init__(self):
+        self._sites = {}
+        self._merged = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(windows["start"]) for windows in self._sites.values())
+
+    def update(self, site_key: str, clouds_data: HourlySeries, moon_data: dict, time_filter: time, cloudiness_filter: int, timezone: str = None, observing_hours: tuple = None) -> int:
+        """
+        Пересчитывает окна места наблюдения по новому прогнозу.
+
+        Args:
+            timezone (str, optional): Часовой пояс, в котором получен прогноз места. По умолчанию - TIMEZONE из конфига.
+            observing_hours (tuple, optional): Результат observing_hours_mask() (см. site_windows()).
+
+        Returns:
+            int: Количество найденных окон.
+        """
+        windows = site_windows(clouds_data, moon_data, time_filter, cloudiness_filter, observing_hours)
+        timezone = timezone or get_config().TIMEZONE
+        windows["start_utc"] = local_to_utc(windows["start"], timezone)
+        windows["end_utc"] = local_to_utc(windows["end"], timezone)
+        with self._lock:
+            self._sites[site_key] = windows
+            self._merged = None
+        return len(windows["start"])
+
+    def remove(self, site_key: str) -> None:
+        with self._lock:
+            if self._sites.pop(site_key, None) is not None:
+                self._merged = None
+
+    def _columns(self, sites: list[str] = None) -> dict:
+        # Окна всех мест, объединённые в общие колонки. Пересобираются только после изменения индекса.
+        # Для запроса по отдельным местам объединяются только их окна, общие колонки при этом не пересобираются.
+        with self._lock:
+            if sites is not None:
+                return self._merge([key for key in dict.fromkeys(sites) if key in self._sites])
+            if self._merged is None:
+                self._merged = self._merge(list(self._sites))
+            return self._merged
+
+    def _merge(self, keys: list[str]) -> dict:
+        windows = [self._sites[key] for key in keys]
+        merged = {
+            column: np.concatenate([site[column] for site in windows]) if windows else np.array([])
+            for column in self.COLUMNS
+        }
+        merged["site"] = np.repeat(np.arange(len(keys)), [len(site["start"]) for site in windows]).astype(np.int32)
+        merged["site_keys"] = keys
+        return merged
+
+    def best(self, count: int = 3, days: float = None, now: datetime = None, sites: list[str] = None, min_hours: int = 1) -> list[dict]:
+        """
+        Возвращает лучшие окна наблюдений по всем (или указанным) местам.
+
+        Args:
+            count (int, optional): Количество окон. По умолчанию - 3.
+            days (float, optional): Учитывать только окна, начинающиеся в ближайшие days суток. По умолчанию - все.
+            now (datetime, optional): Текущий момент с tzinfo (без tzinfo - время UTC). Прошедшие окна не учитываются,
+                окна всех мест сравниваются с ним в UTC. По умолчанию - текущее время.
+            sites (list[str], optional): Ключи мест наблюдения. По умолчанию - все места индекса.
+            min_hours (int, optional): Минимальная длина окна в часах.
+
+        Returns:
+            list[dict]: Окна в порядке убывания ранга с ключами site, start, end (datetime, местное время места), hours,
+                mean_cloudiness, darkness, moon_illumination и score.
+        """
+        columns = self._columns(sites)
+        if count <= 0 or len(columns["start"]) == 0:
+            return []
+
+        now = now or datetime.now(UTC)
+        if now.tzinfo is not None:
+            now = now.astimezone(UTC).replace(tzinfo=None)
+        now = np.datetime64(now, "m")
+        selected = (columns["end_utc"] > now) & (columns["hours"] >= min_hours)
+        if days is not None:
+            selected &= columns["start_utc"] < now + np.timedelta64(int(days * 24 * 60), "m")
+
+        candidates = np.flatnonzero(selected)
+        if len(candidates) > count:
+            candidates = candidates[np.argpartition(-columns["score"][candidates], count - 1)[:count]]
+        # Равные по рангу окна упорядочиваются по времени начала
+        order = candidates[np.lexsort((columns["start"][candidates], -columns["score"][candidates]))]
+
+        return [
+            {
+                "site": columns["site_keys"][columns["site"][position]],
+                "start": columns["start"][position].item(),
+                "end": columns["end"][position].item(),
+                "hours": int(columns["hours"][position]),
+                "mean_cloudiness": round(float(columns["mean_cloudiness"][position]), 1),
+                "darkness": round(float(columns["darkness"][position]), 2),
+                "moon_illumination": round(float(columns["moon_illumination"][position]), 1),
+                "score": round(float(columns["score"][position]), 2),
+            }
+            for position in order
+        ]
@@ -1,35 +1,140 @@
+from modules.data_processing import ephemeris
 from modules.data_processing.weather import moon_illumination
-from modules.data_providers.config_loader import FORECAST_DAYS, API_KEY, TIMEZONE, LATITUDE, LONGITUDE
+from modules.data_providers.cache import ResponseCache
+from modules.metrics import metrics
+from modules.data_providers.config_loader import Config, get_config
+from modules.data_providers.streaming import stream_fields
+from modules.data_providers.timestamps import parse_dates, parse_hourly_timestamps, parse_local_times
 
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
+import ijson
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
+from urllib3.exceptions import HTTPError as TransportError
 
 #Базовый URL для API сервиса погоды
 API_BASE_URL = "http://my.meteoblue.com/packages/"
 
 #Базовые (обязательные) параметры GET запроса, которые отправляются при каждом запросе к API.
-REQUEST_COMMON_PARAMS = {
-    "apikey" : API_KEY,
-    "tz" : TIMEZONE,
-    "forecast_days" : FORECAST_DAYS,
-    "format" : "json",
-    "lat" : LATITUDE,
-    "lon" : LONGITUDE,
+def common_params(config: Config) -> dict:
+    return {
+        "apikey" : config.API_KEY,
+        "tz" : config.TIMEZONE,
+        "forecast_days" : config.FORECAST_DAYS,
+        "format" : "json",
+        "lat" : config.LATITUDE,
+        "lon" : config.LONGITUDE,
+    }
+
+#Эндпоинты API и их дополнительные параметры, которые запрашиваются для каждого места наблюдения.
+SITE_ENDPOINTS = {
+    "/clouds-1h": {"windspeed":"kmh", "temperature":"C"},
+    "/sunmoon": {},
+}
+
+#Поля ответа, которые используются при разборе данных каждого эндпоинта. При потоковом разборе (STREAM_RESPONSES)
+#из ответа извлекаются только они, остальные переменные пропускаются.
+SITE_RESPONSE_FIELDS = {
+    "/clouds-1h": ("data_1h.time", "data_1h.totalcloudcover"),
+    "/sunmoon": ("data_day.time", "data_day.sunset", "data_day.moonilluminatedfraction", "data_day.moonphasename"),
+}
+
+#Пакеты комбинированного запроса (COMBINED_REQUEST): один запрос возвращает почасовые данные пакетов
+#basic-1h и clouds-1h и подневные данные sunmoon.
+COMBINED_PACKAGES = ("basic-1h", "clouds-1h", "sunmoon")
+
+#Дополнительные почасовые переменные комбинированного ответа и их ключи в результате parse_combined_data()
+COMBINED_HOURLY_VARIABLES = {
+    "lowclouds": "low_clouds",
+    "midclouds": "mid_clouds",
+    "highclouds": "high_clouds",
+    "relativehumidity": "humidity",
+    "windspeed": "wind_speed",
 }
 
-def fetch(endpoint: str, add_params: dict = {}) -> dict:
+def combined_endpoint(config: Config) -> str:
+    """
+    Возвращает эндпоинт комбинированного запроса, например /basic-1h_clouds-1h_sunmoon.
+
+    При локальном расчёте данных о Солнце и Луне (SUN_MOON_SOURCE: local) пакет sunmoon не запрашивается.
+    """
+    packages = [package for package in COMBINED_PACKAGES if package != "sunmoon" or config.SUN_MOON_SOURCE != "local"]
+    return "/" + "_".join(packages)
+
+def response_fields(endpoint: str) -> tuple:
+    """
+    Возвращает поля ответа эндпоинта, которые нужны при разборе (для потокового разбора), или None,
+    если эндпоинт неизвестен и ответ нужно разобрать целиком.
+    """
+    endpoint = "/" + endpoint.strip(" /")
+    if endpoint in SITE_RESPONSE_FIELDS:
+        return SITE_RESPONSE_FIELDS[endpoint]
+    packages = endpoint.lstrip("/").split("_")
+    if len(packages) > 1 and set(packages) <= set(COMBINED_PACKAGES):
+        fields = [field for package in packages for field in SITE_RESPONSE_FIELDS.get("/" + package, ())]
+        fields += [f"data_1h.{name}" for name in COMBINED_HOURLY_VARIABLES]
+        return tuple(dict.fromkeys(fields))
+    return None
+
+# Дисковые кэши ответов API по каталогу кэша. Создаются при первом запросе с кэшированием.
+_response_caches = {}
+
+def get_response_cache(config: Config) -> ResponseCache:
+    """
+    Возвращает дисковый кэш ответов API для конфигурации или None, если кэш отключён (CACHE_ENABLED: false).
+    """
+    if not config.CACHE_ENABLED:
+        return None
+    if config.CACHE_DIR not in _response_caches:
+        _response_caches[config.CACHE_DIR] = ResponseCache(config.CACHE_DIR, config.CACHE_TTL, stale_ttl=config.CACHE_STALE_TTL, max_bytes=config.CACHE_MAX_SIZE_MB * 1024 * 1024)
+    return _response_caches[config.CACHE_DIR]
+
+# Размер пула соединений, если он не задан при создании сессии
+DEFAULT_POOL_SIZE = 8
+
+# Общая сессия с пулом keep-alive соединений. Создаётся при первом запросе и переиспользуется всеми вызовами fetch().
+_session = None
+
+def get_session(pool_size: int = None) -> requests.Session:
+    """
+    Возвращает общую HTTP-сессию с пулом соединений.
+
+    Сессия создаётся один раз, размер пула по умолчанию соответствует MAX_CONCURRENCY, чтобы параллельные
+    запросы пакетного режима не открывали новое TCP/TLS соединение на каждый запрос.
+
+    Returns:
+        requests.Session: Общая сессия для запросов к API.
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size or DEFAULT_POOL_SIZE)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+def fetch(endpoint: str, add_params: dict = {}, site: dict = None, timeout: float = None, use_cache: bool = True, config: Config = None) -> dict:
     """
     Отправляет GET запрос к API и принимает данные.
     
     Запрашивает (GET) и принимает данные от API сервиса. Возвращает JSON-объект (словарь) с данными ответа от API.
+    Если включён кэш, свежий ответ берётся с диска без обращения к API. Устаревший (в пределах CACHE_STALE_TTL)
+    ответ также выдаётся из кэша, а его обновление запускается в фоне.
+    Если включён потоковый разбор (STREAM_RESPONSES), для известных эндпоинтов (см. response_fields()) возвращается
+    ответ, содержащий только используемые поля - в таком виде он и сохраняется в кэш.
 
     Args:
         endpoint (str): Конкретный эндпоинт API-сервиса, который подставляется в конец базового URL, 
             заданного в качестве глобальной переменной API_BASE_URL
         add_params (dict, optional): Дополнительный набор параметров GET запроса к сервису API. 
-            Добавляются к базовым параметрам, заданным в глобальной переменной REQUEST_COMMON_PARAMS.
+            Добавляются к базовым параметрам из common_params().
+        site (dict, optional): Место наблюдения (ключи LATITUDE, LONGITUDE и необязательный TIMEZONE). Если задано -
+            заменяет координаты (и часовой пояс) из базовых параметров.
+        timeout (float, optional): Таймаут запроса в секундах. По умолчанию - REQUEST_TIMEOUT из конфига.
+        use_cache (bool, optional): Использовать ли дисковый кэш. По умолчанию - True.
+        config (Config, optional): Конфигурация. По умолчанию - get_config().
 
     Returns:
         dict: Возвращает полученные данные в виде словаря (из JSON)
@@ -39,20 +144,79 @@ def fetch(endpoint: str, add_params: dict = {}) -> dict:
         {"response_code":200, "requested_city:"Moscow", "current_time":"21:30"}
     """
 
+    config = config or get_config()
+    timeout = timeout or config.REQUEST_TIMEOUT
     url = API_BASE_URL + endpoint.lstrip(" /")
     # Объединяем словари с обязательными и опциональными параметрами запроса при помощи оператора "|"
-    params = add_params | REQUEST_COMMON_PARAMS
+    params = add_params | common_params(config)
+    if site is not None:
+        params |= {"lat": site["LATITUDE"], "lon": site["LONGITUDE"], "tz": site.get("TIMEZONE") or config.TIMEZONE}
+    fields = response_fields(endpoint) if config.STREAM_RESPONSES else None
+
+    response_cache = get_response_cache(config)
+    if response_cache is None or not use_cache:
+        return request_api(url, params, timeout, config.MAX_CONCURRENCY, fields)
+
+    cache_key = response_cache.make_key(endpoint, params)
+    data, state = response_cache.get(cache_key, "/" + endpoint.strip(" /"))
+    if state == "fresh":
+        metrics.increment("cache_hits")
+        return data
+    if state == "stale":
+        metrics.increment("cache_stale_hits")
+        response_cache.refresh_in_background(cache_key, lambda: request_api(url, params, timeout, config.MAX_CONCURRENCY, fields))
+        return data
+
+    metrics.increment("cache_misses")
+    data = request_api(url, params, timeout, config.MAX_CONCURRENCY, fields)
+    response_cache.set(cache_key, data)
+    return data
+
+def request_api(url: str, params: dict, timeout: float, pool_size: int = None, fields: tuple = None) -> dict:
+    """
+    Выполняет GET запрос к API через общую сессию, минуя кэш.
+
+    Если заданы fields, ответ не загружается в память целиком: тело читается потоком (со сжатием gzip
+    при передаче) и разбирается инкрементально функцией stream_fields(), которая сохраняет только эти поля.
+
+    Args:
+        url (str): Полный URL запроса.
+        params (dict): Параметры запроса.
+        timeout (float): Таймаут запроса в секундах.
+        pool_size (int, optional): Размер пула соединений (используется только при создании сессии).
+        fields (tuple, optional): Поля ответа для потокового разбора (см. SITE_RESPONSE_FIELDS).
+
+    Returns:
+        dict: Ответ API в виде словаря (из JSON).
+    """
     try:
-        data = requests.get(url, params).json()
+        if fields is None:
+            response = get_session(pool_size).get(url, params=params, timeout=timeout)
+            metrics.increment("http_requests")
+            metrics.increment("http_bytes", len(response.content))
+            data = response.json()
+        else:
+            with get_session(pool_size).get(url, params=params, timeout=timeout, stream=True, headers={"Accept-Encoding": "gzip"}) as response:
+                metrics.increment("http_requests")
+                # Распаковка gzip выполняется urllib3 по мере чтения
+                response.raw.decode_content = True
+                data = stream_fields(response.raw, fields)
+                # Количество байт, полученных по сети (до распаковки)
+                metrics.increment("http_bytes", response.raw.tell())
         # Если API вернул ошибку, вызываем ошибку RequestException
         if data.get("error") == True:
             raise RequestException(data['error_message'])
         return data
+    # Ошибка чтения или разбора потока ответа приводится к RequestException, как и ошибка response.json()
+    except (ijson.JSONError, TransportError) as error:
+        metrics.increment("http_errors")
+        raise RequestException(f"При запросе данных с сервера произошла ошибка: {error}")
     # В случае иной ошибки (нет связи с API) - вызываем ошибку RequestException
     except RequestException as error:
+        metrics.increment("http_errors")
         raise RequestException(f"При запросе данных с сервера произошла ошибка: {error}")
 
-def get_clouds_data() -> dict:
+def get_clouds_data(config: Config = None) -> dict:
     """
     Запрашивает через API данные об облачности.
     Запрашивает данные об облачности, а также парсит данные о дате и времени, 
@@ -69,9 +233,25 @@ def get_clouds_data() -> dict:
         {'date_time': [datetime.datetime(2025, 1, 9, 0, 0), datetime.datetime(2025, 1, 9, 1, 0)], 'cloudiness': [65, 32]}
     """
 
-    data = fetch("/clouds-1h", {"windspeed":"kmh", "temperature":"C"})["data_1h"]
+    return parse_clouds_data(fetch("/clouds-1h", SITE_ENDPOINTS["/clouds-1h"], config=config))
+
+def parse_clouds_data(response: dict, timezone: str = None) -> dict:
+    """
+    Разбирает ответ эндпоинта /clouds-1h.
+
+    Метки времени разбираются векторно (см. parse_hourly_timestamps()) и остаются в местном времени
+    места наблюдения без tzinfo - в этом виде с ними работает HourlySeries.
+
+    Args:
+        response (dict): Ответ API, полученный из функции fetch().
+        timezone (str, optional): Часовой пояс запроса. Не используется, принимается для единообразия с parse_sun_moon_data().
+
+    Returns:
+        dict: Словарь с ключами date_time и cloudiness (см. get_clouds_data()).
+    """
+    data = response["data_1h"]
 
-    date_time = [datetime.strptime(timestamp, "%Y-%m-%d %H:%M") for timestamp in data["time"]]
+    date_time = parse_hourly_timestamps(data["time"]).tolist()
     cloudiness = data["totalcloudcover"]
 
     return {
@@ -79,22 +259,41 @@ def get_clouds_data() -> dict:
         "cloudiness": cloudiness,
         }
 
-def get_sun_moon_data() -> dict:
+def get_sun_moon_data(config: Config = None) -> dict:
     """
     Запрашивает по API данные о заходе/восходе Солнца и Луны, вычисляет освещенность Луны в процентах.
     Запрашивает подневной прогноз данных о Солнце и Луне, а также (при необходимости) корректирует время о заходе Солнца согласно заданному часовому поясу. Вычисляет освещенность Луны в процентах на время полуночи в конце каждого дня.
+    Если в конфиге SUN_MOON_SOURCE: local, данные рассчитываются локально модулем ephemeris без обращения к API.
 
     Returns:
         dict: Словарь, содержащий 4 набора данных - date, sunset, moon_illumination, moon_phase_name. Каждому элементу списка соответствует элемент из других списком с тем же индексом.
 
     Example:
         >>> get_sun_moon_data()
-            {'date': [datetime.datetime(2025, 1, 9, 0, 0)], 'sunset': [datetime.datetime(1900, 1, 1, 16, 20)],'moon_illumination': [79.8], 'moon_phase_name': ['waxing gibbous']}
+            {'date': [datetime.datetime(2025, 1, 9, 0, 0)], 'sunset': [datetime.datetime(2025, 1, 9, 16, 20, tzinfo=zoneinfo.ZoneInfo(key='Europe/Moscow'))],'moon_illumination': [79.8], 'moon_phase_name': ['waxing gibbous']}
+    """
+    config = config or get_config()
+    if config.SUN_MOON_SOURCE == "local":
+        return ephemeris.sun_moon_data(ephemeris.forecast_dates(config.FORECAST_DAYS, config.TIMEZONE), config.LATITUDE, config.LONGITUDE, config.TIMEZONE, config.GRID_CELL_SIZE)
+    return parse_sun_moon_data(fetch("/sunmoon", SITE_ENDPOINTS["/sunmoon"], config=config), config.TIMEZONE)
+
+def parse_sun_moon_data(response: dict, timezone: str = None) -> dict:
+    """
+    Разбирает ответ эндпоинта /sunmoon и вычисляет освещённость Луны в полночь.
+
+    Время заката привязывается к своей дате прогноза и часовому поясу запроса (datetime с tzinfo).
+
+    Args:
+        response (dict): Ответ API, полученный из функции fetch().
+        timezone (str, optional): Часовой пояс, переданный в запросе к API. По умолчанию - TIMEZONE из конфига.
+
+    Returns:
+        dict: Словарь с ключами date, sunset, moon_illumination, moon_phase_name (см. get_sun_moon_data()).
     """
-    data = fetch("/sunmoon")["data_day"]
+    data = response["data_day"]
 
-    data["time"] = [datetime.strptime(timestamp, "%Y-%m-%d") for timestamp in data["time"]]
-    data["sunset"] = [datetime.strptime(timestamp, "%H:%M") for timestamp in data["sunset"]]
+    data["time"] = parse_dates(data["time"])
+    data["sunset"] = parse_local_times(data["time"], data["sunset"], timezone or get_config().TIMEZONE)
 
     moon_illumination_percentage = moon_illumination(data["moonilluminatedfraction"], data["moonphasename"])
 
@@ -103,4 +302,163 @@ def get_sun_moon_data() -> dict:
         "sunset": data["sunset"],
         "moon_illumination": moon_illumination_percentage,
         "moon_phase_name": data["moonphasename"]
-        }
\ No newline at end of file
+        }
+
+def get_combined_data(config: Config = None) -> tuple:
+    """
+    Запрашивает данные об облачности, влажности, ветре, Солнце и Луне одним комбинированным запросом.
+
+    Returns:
+        tuple: Данные об облачности (в формате parse_combined_data()) и данные о Солнце и Луне (в формате get_sun_moon_data()).
+    """
+    config = config or get_config()
+    data = parse_combined_data(fetch(combined_endpoint(config), SITE_ENDPOINTS["/clouds-1h"], config=config), config.TIMEZONE)
+    if config.SUN_MOON_SOURCE == "local":
+        return data["clouds_data"], get_sun_moon_data(config)
+    return data["clouds_data"], data["sun_moon_data"]
+
+def parse_combined_data(response: dict, timezone: str = None) -> dict:
+    """
+    Разбирает ответ комбинированного запроса (см. combined_endpoint()).
+
+    Данные об облачности дополняются переменными из COMBINED_HOURLY_VARIABLES (облачность по ярусам,
+    влажность, скорость ветра), по которым затем вычисляется оценка качества наблюдений (см. weather.observing_quality_score()).
+
+    Args:
+        response (dict): Ответ API, полученный из функции fetch().
+        timezone (str, optional): Часовой пояс запроса (см. parse_sun_moon_data()).
+
+    Returns:
+        dict: Словарь с ключом clouds_data и, если в ответе есть пакет sunmoon, ключом sun_moon_data.
+
+    Example:
+        >>> parse_combined_data(fetch("/basic-1h_clouds-1h_sunmoon"))
+            {'clouds_data': {'date_time': [...], 'cloudiness': [...], 'low_clouds': [...], 'humidity': [...], ...}, 'sun_moon_data': {...}}
+    """
+    hourly = response["data_1h"]
+    clouds_data = parse_clouds_data(response) | {key: hourly[name] for name, key in COMBINED_HOURLY_VARIABLES.items() if name in hourly}
+    result = {"clouds_data": clouds_data}
+    if "data_day" in response:
+        result["sun_moon_data"] = parse_sun_moon_data(response, timezone)
+    return result
+
+# Ключ результата и функция разбора ответа для каждого эндпоинта из SITE_ENDPOINTS
+SITE_DATA_PARSERS = {
+    "/clouds-1h": ("clouds_data", parse_clouds_data),
+    "/sunmoon": ("sun_moon_data", parse_sun_moon_data),
+}
+
+def fetch_sites(sites: list[dict], max_workers: int = None, timeout: float = None, config: Config = None) -> list[dict]:
+    """
+    Пакетно запрашивает данные об облачности, Солнце и Луне для списка мест наблюдения.
+
+    Все запросы (каждый эндпоинт из SITE_ENDPOINTS для каждого места) выполняются параллельно в пуле
+    из max_workers потоков через общую сессию с keep-alive соединениями, поэтому общее время
+    выполнения определяется самым медленным запросом, а не суммой всех запросов.
+    Если SUN_MOON_SOURCE: local, эндпоинт /sunmoon не запрашивается, а данные о Солнце и Луне для всех
+    мест рассчитываются локально одним векторным вычислением.
+    Если COMBINED_REQUEST: true, для каждого места выполняется один комбинированный запрос (см. combined_endpoint()).
+
+    Args:
+        sites (list[dict]): Список мест наблюдения, каждое с ключами NAME, LATITUDE и LONGITUDE.
+        max_workers (int, optional): Максимальное количество одновременных запросов. По умолчанию - MAX_CONCURRENCY.
+        timeout (float, optional): Таймаут одного запроса в секундах. По умолчанию - REQUEST_TIMEOUT.
+        config (Config, optional): Конфигурация. По умолчанию - get_config().
+
+    Returns:
+        list[dict]: Список словарей (в порядке sites) с ключами site, clouds_data и sun_moon_data.
+            Если запрос для места завершился ошибкой, вместо данных в словаре будет ключ error с текстом ошибки.
+
+    Example:
+        >>> fetch_sites([{"NAME": "Дача", "LATITUDE": 55.75, "LONGITUDE": 37.62}])
+            [{'site': {'NAME': 'Дача', ...}, 'clouds_data': {...}, 'sun_moon_data': {...}}]
+    """
+    config = config or get_config()
+    results = [{"site": site} for site in sites]
+    endpoints = SITE_ENDPOINTS
+    if config.COMBINED_REQUEST:
+        endpoints = {combined_endpoint(config): SITE_ENDPOINTS["/clouds-1h"]}
+
+    if config.SUN_MOON_SOURCE == "local":
+        endpoints = {endpoint: add_params for endpoint, add_params in endpoints.items() if endpoint != "/sunmoon"}
+        # Расчёт векторный для всех мест с одинаковым часовым поясом
+        timezones = {}
+        for index, site in enumerate(sites):
+            timezones.setdefault(site.get("TIMEZONE") or config.TIMEZONE, []).append(index)
+        for timezone, indexes in timezones.items():
+            local_data = ephemeris.sun_moon_data_sites(
+                ephemeris.forecast_dates(config.FORECAST_DAYS, timezone),
+                [sites[index]["LATITUDE"] for index in indexes],
+                [sites[index]["LONGITUDE"] for index in indexes],
+                timezone,
+                config.GRID_CELL_SIZE,
+            )
+            for index, sun_moon_data in zip(indexes, local_data):
+                results[index]["sun_moon_data"] = sun_moon_data
+
+    with ThreadPoolExecutor(max_workers=max_workers or config.MAX_CONCURRENCY) as executor:
+        # Отправляем все запросы сразу, пул сам ограничивает количество одновременных соединений
+        futures = {
+            (index, endpoint): executor.submit(fetch, endpoint, add_params, site, timeout, config=config)
+            for index, site in enumerate(sites)
+            for endpoint, add_params in endpoints.items()
+        }
+        for (index, endpoint), future in futures.items():
+            timezone = sites[index].get("TIMEZONE") or config.TIMEZONE
+            # Ошибка одного места не должна прерывать обработку остальных
+            try:
+                if endpoint in SITE_DATA_PARSERS:
+                    key, parser = SITE_DATA_PARSERS[endpoint]
+                    results[index][key] = parser(future.result(), timezone)
+                else:
+                    results[index] |= parse_combined_data(future.result(), timezone)
+            except (RequestException, KeyError, ValueError) as error:
+                results[index]["error"] = str(error)
+
+    return results
+
+def site_endpoints(config: Config = None) -> list[str]:
+    """
+    Возвращает эндпоинты, данные которых загружаются для одного места наблюдения (см. load_site_endpoint()).
+
+    При COMBINED_REQUEST: true - один комбинированный эндпоинт (см. combined_endpoint()), а при локальном расчёте
+    данных о Солнце и Луне - ещё /sunmoon, который рассчитывается без запроса к API.
+
+    Example:
+        >>> site_endpoints(config)  # COMBINED_REQUEST: true, SUN_MOON_SOURCE: api
+        ['/basic-1h_clouds-1h_sunmoon']
+    """
+    config = config or get_config()
+    if not config.COMBINED_REQUEST:
+        return list(SITE_ENDPOINTS)
+    endpoints = [combined_endpoint(config)]
+    if config.SUN_MOON_SOURCE == "local":
+        endpoints.append("/sunmoon")
+    return endpoints
+
+def load_site_endpoint(site: dict, endpoint: str, timeout: float = None, use_cache: bool = True, config: Config = None) -> dict:
+    """
+    Загружает и разбирает данные одного эндпоинта для одного места наблюдения.
+
+    Используется там, где данные обновляются по отдельности для каждой ячейки сетки и эндпоинта (режим службы).
+    Для /sunmoon при SUN_MOON_SOURCE: local данные рассчитываются локально, комбинированный эндпоинт
+    разбирается функцией parse_combined_data().
+
+    Args:
+        site (dict): Место наблюдения с ключами LATITUDE и LONGITUDE.
+        endpoint (str): Эндпоинт из site_endpoints().
+        timeout (float, optional): Таймаут запроса в секундах.
+        use_cache (bool, optional): Использовать ли дисковый кэш.
+        config (Config, optional): Конфигурация. По умолчанию - get_config().
+
+    Returns:
+        dict: Полученные данные с ключами clouds_data и/или sun_moon_data (как в результатах fetch_sites()).
+    """
+    config = config or get_config()
+    timezone = site.get("TIMEZONE") or config.TIMEZONE
+    if endpoint == "/sunmoon" and config.SUN_MOON_SOURCE == "local":
+        return {"sun_moon_data": ephemeris.sun_moon_data(ephemeris.forecast_dates(config.FORECAST_DAYS, timezone), site["LATITUDE"], site["LONGITUDE"], timezone, config.GRID_CELL_SIZE)}
+    if endpoint not in SITE_DATA_PARSERS:
+        return parse_combined_data(fetch(endpoint, SITE_ENDPOINTS["/clouds-1h"], site, timeout, use_cache, config), timezone)
+    key, parser = SITE_DATA_PARSERS[endpoint]
+    return {key: parser(fetch(endpoint, SITE_ENDPOINTS[endpoint], site, timeout, use_cache, config), timezone)}
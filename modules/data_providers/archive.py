@@ -0,0 +1,431 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from datetime import datetime, timezone
+from modules.data_processing.weather import HourlySeries
+
+# Блокировка файла кодов мест между процессами. На платформах без fcntl (Windows) коды защищены только внутри процесса.
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Значение оценки качества в архиве, если прогноз получен без облачных слоёв, влажности и ветра
+QUALITY_MISSING = -1
+
+# Колонки таблиц архива и их типы. Первые три колонки - ключ строки: место, время, к которому относится
+# прогноз, и момент выпуска прогноза. Внутри сегмента строки упорядочены по ключу.
+HOURLY_COLUMNS = {
+    "site": np.int32,
+    "valid": "datetime64[m]",
+    "issued": "datetime64[m]",
+    "cloudiness": np.int16,
+    "quality": np.int16,
+}
+DAILY_COLUMNS = {
+    "site": np.int32,
+    "date": "datetime64[D]",
+    "issued": "datetime64[m]",
+    "sunset": "datetime64[m]",
+    "moon_illumination": np.float32,
+}
+
+# Количество сегментов в разделе, после которого раздел уплотняется при записи
+DEFAULT_MAX_SEGMENTS = 64
+
+def issue_time(moment: datetime = None) -> np.datetime64:
+    """
+    Возвращает момент выпуска прогноза для архива (UTC без tzinfo, с точностью до минуты).
+    """
+    moment = moment or datetime.now(timezone.utc)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(moment, "m")
+
+class ColumnTable:
+    """
+    Таблица архива, хранящаяся колонками NumPy в сегментах, которые только дописываются.
+
+    Каталог таблицы разбит на разделы по месяцу второй колонки ключа (времени прогноза), например hourly/2025-01.
+    Каждый сегмент - каталог с файлом .npy на каждую колонку, строки в нём упорядочены по ключу
+    (место, время, выпуск). Сегменты открываются через np.load(mmap_mode="r"), поэтому запрос читает
+    с диска только страницы с нужными строками: границы места и диапазона времени находятся двоичным поиском.
+
+    Уплотнение (compact()) объединяет сегменты раздела в один и удаляет повторы ключа, оставляя
+    последнюю записанную строку.
+    """
+
+    def __init__(self, directory: str, columns: dict):
+        """
+        Args:
+            directory (str): Каталог таблицы. Создаётся при первой записи.
+            columns (dict): Колонки таблицы и их типы, первые три колонки - ключ (см. HOURLY_COLUMNS).
+        """
+        self.directory = directory
+        self.columns = columns
+        self.key = tuple(columns)[:3]
+        self.time_column = self.key[1]
+        self._counter = 0
+
+    def partitions(self, start: np.datetime64 = None, end: np.datetime64 = None) -> list[str]:
+        """
+        Возвращает разделы таблицы, которые могут содержать строки с временем из [start, end).
+        """
+        try:
+            names = sorted(entry.name for entry in os.scandir(self.directory) if entry.is_dir())
+        except FileNotFoundError:
+            return []
+        first = str(np.datetime64(start, "M")) if start is not None else None
+        last = str(np.datetime64(end - np.timedelta64(1, "m"), "M")) if end is not None else None
+        return [name for name in names if (first is None or name >= first) and (last is None or name <= last)]
+
+    def segments(self, partition: str) -> list[str]:
+        """
+        Возвращает пути сегментов раздела в порядке записи. Незавершённые записи (.tmp) пропускаются.
+        """
+        directory = os.path.join(self.directory, partition)
+        try:
+            names = sorted(entry.name for entry in os.scandir(directory) if entry.is_dir() and not entry.name.startswith("."))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(directory, name) for name in names]
+
+    def _open(self, path: str) -> dict:
+        return {column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode="r") for column in self.columns}
+
+    def _segment_name(self) -> str:
+        # Имена сегментов упорядочены по времени записи, по этому порядку определяется последняя версия строки
+        self._counter += 1
+        return f"{time.time_ns():020d}-{os.getpid()}-{self._counter:06d}"
+
+    def _write_segment(self, partition: str, rows: dict, name: str = None) -> str:
+        order = np.lexsort(tuple(rows[column] for column in reversed(self.key)))
+        directory = os.path.join(self.directory, partition)
+        name = name or self._segment_name()
+        # Сегмент пишется во временный каталог и переименовывается целиком, чтобы запросы не видели неполный сегмент
+        temp_path = os.path.join(directory, f".{name}.tmp")
+        os.makedirs(temp_path, exist_ok=True)
+        for column, dtype in self.columns.items():
+            np.save(os.path.join(temp_path, f"{column}.npy"), np.asarray(rows[column], dtype=dtype)[order])
+        path = os.path.join(directory, name)
+        os.rename(temp_path, path)
+        return path
+
+    def append(self, rows: dict) -> int:
+        """
+        Записывает строки новыми сегментами (по одному на каждый затронутый раздел).
+
+        Args:
+            rows (dict): Колонки строк (все колонки таблицы, одинаковой длины).
+
+        Returns:
+            int: Количество записанных строк.
+        """
+        count = len(rows[self.time_column])
+        if count == 0:
+            return 0
+        months = np.asarray(rows[self.time_column]).astype("datetime64[M]")
+        for month in np.unique(months):
+            selected = months == month
+            self._write_segment(str(month), {column: np.asarray(values)[selected] for column, values in rows.items()})
+        return count
+
+    def query(self, sites: np.ndarray = None, start: np.datetime64 = None, end: np.datetime64 = None, issued_from: np.datetime64 = None, issued_to: np.datetime64 = None) -> dict:
+        """
+        Выбирает строки по местам, диапазону времени [start, end) и диапазону выпуска [issued_from, issued_to).
+
+        Args:
+            sites (np.ndarray, optional): Коды мест. По умолчанию - все места.
+            start, end (np.datetime64, optional): Границы времени прогноза.
+            issued_from, issued_to (np.datetime64, optional): Границы момента выпуска.
+
+        Returns:
+            dict: Колонки выбранных строк (np.ndarray в памяти). Строки упорядочены по сегментам, а внутри сегмента - по ключу.
+        """
+        parts = {column: [] for column in self.columns}
+        for partition in self.partitions(start, end):
+            for path in self.segments(partition):
+                try:
+                    segment = self._open(path)
+                # Сегмент удалён уплотнением после получения списка
+                except FileNotFoundError:
+                    continue
+                for low, high in self._ranges(segment, sites, start, end):
+                    selected = slice(low, high)
+                    if issued_from is not None or issued_to is not None:
+                        issued = segment["issued"][low:high]
+                        mask = np.ones(high - low, dtype=bool)
+                        if issued_from is not None:
+                            mask &= issued >= issued_from
+                        if issued_to is not None:
+                            mask &= issued < issued_to
+                        selected = np.flatnonzero(mask) + low
+                    for column in self.columns:
+                        parts[column].append(np.asarray(segment[column][selected]))
+
+        return {
+            column: np.concatenate(values) if values else np.array([], dtype=self.columns[column])
+            for column, values in parts.items()
+        }
+
+    def _ranges(self, segment: dict, sites: np.ndarray, start: np.datetime64, end: np.datetime64) -> list[tuple]:
+        # Границы строк каждого места (двоичный поиск по колонке мест), затем - границы диапазона времени внутри места
+        site_column = segment["site"]
+        if sites is None:
+            bounds = [(0, len(site_column))]
+        else:
+            lows = np.searchsorted(site_column, sites, side="left")
+            highs = np.searchsorted(site_column, sites, side="right")
+            bounds = [(low, high) for low, high in zip(lows, highs) if low < high]
+
+        if start is None and end is None:
+            return bounds
+        if sites is None and len(site_column) and site_column[0] != site_column[-1]:
+            # Время упорядочено только внутри места, поэтому без фильтра по местам ищем границы каждого места
+            codes = np.unique(site_column)
+            return self._ranges(segment, codes, start, end)
+
+        ranges = []
+        for low, high in bounds:
+            times = segment[self.time_column][low:high]
+            first = low + (np.searchsorted(times, start, side="left") if start is not None else 0)
+            last = low + (np.searchsorted(times, end, side="left") if end is not None else high - low)
+            if first < last:
+                ranges.append((first, last))
+        return ranges
+
+    def compact(self, partition: str) -> int:
+        """
+        Объединяет сегменты раздела в один сегмент без повторов ключа.
+
+        Из строк с одинаковым ключом (место, время, выпуск) остаётся строка из последнего записанного сегмента.
+        Исходные сегменты удаляются после записи объединённого.
+
+        Returns:
+            int: Количество строк в объединённом сегменте.
+        """
+        paths = self.segments(partition)
+        if len(paths) < 2:
+            return sum(len(self._open(path)["site"]) for path in paths)
+
+        segments = [self._open(path) for path in paths]
+        rows = {column: np.concatenate([segment[column] for segment in segments]) for column in self.columns}
+        # Сортировка устойчивая, поэтому среди повторов ключа последней идёт строка из более позднего сегмента
+        order = np.lexsort(tuple(rows[column] for column in reversed(self.key)))
+        rows = {column: values[order] for column, values in rows.items()}
+        last = np.ones(len(order), dtype=bool)
+        if len(order) > 1:
+            same_as_next = np.ones(len(order) - 1, dtype=bool)
+            for column in self.key:
+                same_as_next &= rows[column][1:] == rows[column][:-1]
+            last[:-1] = ~same_as_next
+        rows = {column: values[last] for column, values in rows.items()}
+        del segments
+
+        # Объединённый сегмент получает имя последнего исходного, чтобы сохранить порядок относительно новых записей
+        self._write_segment(partition, rows, name=f"{os.path.basename(paths[-1])}-c")
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+        return int(last.sum())
+
+class ForecastArchive:
+    """
+    Архив прогнозов: почасовая облачность и суточные данные о Солнце и Луне каждого запуска.
+
+    Прогноз каждого места дописывается в архив (add()) с моментом выпуска, накапливается в памяти
+    и записывается сегментами при вызове flush(), поэтому пакетный запуск по сотням мест создаёт
+    по одному сегменту на раздел, а не на каждое место. Запросы (hourly(), daily(), forecast_as_of())
+    читают сегменты через отображение в память и не разбирают JSON и не загружают архив целиком.
+
+    Места наблюдения хранятся в колонках числовыми кодами, соответствие ключей и кодов - в файле sites.json.
+
+    Example:
+        >>> archive = ForecastArchive("./archive")
+        >>> archive.add("Дача", clouds_series, sun_moon_data)
+        >>> archive.flush()
+        >>> archive.hourly(["Дача"], valid_from=datetime(2025, 1, 9))["cloudiness"]
+            array([15, 25, ...], dtype=int16)
+    """
+
+    def __init__(self, directory: str, max_segments: int = DEFAULT_MAX_SEGMENTS):
+        """
+        Args:
+            directory (str): Каталог архива. Создаётся при первой записи.
+            max_segments (int, optional): Количество сегментов в разделе, после которого раздел уплотняется при записи.
+        """
+        self.directory = directory
+        self.max_segments = max_segments
+        self.hourly_table = ColumnTable(os.path.join(directory, "hourly"), HOURLY_COLUMNS)
+        self.daily_table = ColumnTable(os.path.join(directory, "daily"), DAILY_COLUMNS)
+        self._sites = None
+        self._pending = {"hourly": [], "daily": []}
+        self._lock = threading.Lock()
+
+    def _sites_path(self) -> str:
+        return os.path.join(self.directory, "sites.json")
+
+    def _load_sites(self) -> dict:
+        if self._sites is None:
+            try:
+                with open(self._sites_path(), "r", encoding="utf-8") as file:
+                    self._sites = json.load(file)
+            # Отсутствующий файл - пустой архив
+            except (OSError, ValueError):
+                self._sites = {}
+        return self._sites
+
+    def _site_code(self, site_key: str) -> int:
+        sites = self._load_sites()
+        if site_key in sites:
+            return sites[site_key]
+        # Новый код назначается под блокировкой файла: архив может пополняться несколькими процессами
+        # (служба и разовые запуски), и каждый из них должен видеть коды, назначенные другими
+        os.makedirs(self.directory, exist_ok=True)
+        with open(f"{self._sites_path()}.lock", "a", encoding="utf-8") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._sites = None
+            sites = self._load_sites()
+            if site_key not in sites:
+                sites[site_key] = len(sites)
+                # Файл заменяется целиком, поэтому читатели без блокировки не видят его частично записанным
+                temp_path = f"{self._sites_path()}.{os.getpid()}-{threading.get_ident()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as file:
+                    json.dump(sites, file, ensure_ascii=False)
+                os.replace(temp_path, self._sites_path())
+        return sites[site_key]
+
+    def _site_codes(self, site_keys: list[str] = None) -> np.ndarray:
+        if site_keys is None:
+            return None
+        sites = self._load_sites()
+        return np.array(sorted(sites[key] for key in site_keys if key in sites), dtype=np.int32)
+
+    def site_keys(self) -> list[str]:
+        """
+        Возвращает ключи мест архива, индекс в списке - код места в колонке site.
+        """
+        with self._lock:
+            sites = self._load_sites()
+            return sorted(sites, key=sites.get)
+
+    def add(self, site_key: str, clouds_data: HourlySeries, sun_moon_data: dict, issued: datetime = None) -> None:
+        """
+        Добавляет прогноз места в буфер записи.
+
+        Args:
+            site_key (str): Ключ места наблюдения.
+            clouds_data (HourlySeries): Почасовые данные (время - местное время места наблюдения).
+            sun_moon_data (dict): Данные о Солнце и Луне (см. get_sun_moon_data()).
+            issued (datetime, optional): Момент выпуска прогноза. По умолчанию - текущий момент (UTC).
+        """
+        issued = issue_time(issued)
+        with self._lock:
+            code = self._site_code(site_key)
+            hours = len(clouds_data)
+            self._pending["hourly"].append({
+                "site": np.full(hours, code, dtype=np.int32),
+                "valid": clouds_data.date_time,
+                "issued": np.full(hours, issued),
+                "cloudiness": clouds_data.cloudiness,
+                "quality": clouds_data.quality if clouds_data.quality is not None else np.full(hours, QUALITY_MISSING, dtype=np.int16),
+            })
+
+            days = len(sun_moon_data["date"])
+            # Время заката хранится в местном времени места без tzinfo, как и почасовые данные
+            sunsets = [value.replace(tzinfo=None) if value is not None else None for value in sun_moon_data["sunset"]]
+            self._pending["daily"].append({
+                "site": np.full(days, code, dtype=np.int32),
+                "date": np.array([value.date() for value in sun_moon_data["date"]], dtype="datetime64[D]"),
+                "issued": np.full(days, issued),
+                "sunset": np.array(sunsets, dtype="datetime64[m]"),
+                "moon_illumination": np.asarray(sun_moon_data["moon_illumination"], dtype=np.float32),
+            })
+
+    def flush(self) -> int:
+        """
+        Записывает накопленные прогнозы на диск и уплотняет разделы, в которых стало больше max_segments сегментов.
+
+        Returns:
+            int: Количество записанных почасовых строк.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {"hourly": [], "daily": []}
+            written = 0
+            for name, table in (("hourly", self.hourly_table), ("daily", self.daily_table)):
+                if not pending[name]:
+                    continue
+                rows = {column: np.concatenate([batch[column] for batch in pending[name]]) for column in table.columns}
+                count = table.append(rows)
+                if name == "hourly":
+                    written = count
+                for partition in np.unique(rows[table.time_column].astype("datetime64[M]")):
+                    if len(table.segments(str(partition))) > self.max_segments:
+                        table.compact(str(partition))
+            return written
+
+    def compact(self) -> int:
+        """
+        Уплотняет все разделы архива.
+
+        Returns:
+            int: Количество почасовых строк в архиве после уплотнения.
+        """
+        with self._lock:
+            rows = 0
+            for partition in self.hourly_table.partitions():
+                rows += self.hourly_table.compact(partition)
+            for partition in self.daily_table.partitions():
+                self.daily_table.compact(partition)
+            return rows
+
+    def hourly(self, site_keys: list[str] = None, valid_from: datetime = None, valid_to: datetime = None, issued_from: datetime = None, issued_to: datetime = None) -> dict:
+        """
+        Возвращает почасовые строки архива.
+
+        Args:
+            site_keys (list[str], optional): Ключи мест наблюдения. По умолчанию - все места.
+            valid_from, valid_to (datetime, optional): Диапазон времени прогноза [valid_from, valid_to) (местное время места).
+            issued_from, issued_to (datetime, optional): Диапазон момента выпуска [issued_from, issued_to).
+
+        Returns:
+            dict: Колонки site (код места, см. site_keys()), valid, issued, cloudiness и quality (np.ndarray).
+        """
+        return self.hourly_table.query(
+            self._site_codes(site_keys), _moment(valid_from), _moment(valid_to),
+            issue_time(issued_from) if issued_from else None, issue_time(issued_to) if issued_to else None,
+        )
+
+    def daily(self, site_keys: list[str] = None, date_from: datetime = None, date_to: datetime = None) -> dict:
+        """
+        Возвращает суточные строки архива (закат и освещённость Луны) за даты [date_from, date_to).
+
+        Returns:
+            dict: Колонки site, date, issued, sunset и moon_illumination (np.ndarray).
+        """
+        start = np.datetime64(date_from, "D") if date_from else None
+        end = np.datetime64(date_to, "D") if date_to else None
+        return self.daily_table.query(self._site_codes(site_keys), start, end)
+
+    def forecast_as_of(self, site_key: str, moment: datetime, valid_from: datetime = None, valid_to: datetime = None) -> dict:
+        """
+        Восстанавливает почасовой прогноз места в том виде, в каком он был известен в указанный момент:
+        для каждого часа выбирается последний прогноз, выпущенный до moment.
+
+        Returns:
+            dict: Колонки valid, issued, cloudiness и quality, упорядоченные по времени прогноза.
+        """
+        rows = self.hourly([site_key], valid_from, valid_to, issued_to=moment)
+        order = np.lexsort((rows["issued"], rows["valid"]))
+        valid = rows["valid"][order]
+        latest = np.ones(len(valid), dtype=bool)
+        latest[:-1] = valid[1:] != valid[:-1]
+        return {column: rows[column][order][latest] for column in ("valid", "issued", "cloudiness", "quality")}
+
+def _moment(value: datetime) -> np.datetime64:
+    return np.datetime64(value, "m") if value is not None else None
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# Параметры запроса, которые не влияют на содержимое ответа и не должны попадать в ключ кэша
+IGNORED_PARAMS = ("apikey",)
+
+# Количество знаков после запятой, до которого округляются координаты в ключе кэша (~1 км)
+COORDINATES_PRECISION = 2
+
+# Доля max_bytes, до которой кэш освобождается при вытеснении. Запас позволяет следующим записям
+# не сканировать каталог сразу после очередного вытеснения.
+EVICT_TARGET_RATIO = 0.9
+
+class ResponseCache:
+    """
+    Дисковый кэш ответов API с TTL для каждого эндпоинта и ограничением по размеру.
+
+    Каждый ответ хранится в отдельном JSON-файле, имя которого - хэш эндпоинта и параметров запроса.
+    Время последнего обращения к записи хранится в mtime файла и используется для вытеснения
+    давно не используемых записей при превышении max_bytes.
+
+    Суммарный размер записей отслеживается в памяти: каталог сканируется при первой записи и только когда
+    оценка размера превышает max_bytes, а не при каждой записи.
+
+    Запись считается свежей в течение TTL эндпоинта, и устаревшей (но пригодной для выдачи, пока
+    в фоне выполняется обновление) ещё stale_ttl секунд после этого.
+    """
+
+    def __init__(self, directory: str, ttls: dict, default_ttl: float = 3600, stale_ttl: float = 0, max_bytes: int = 50 * 1024 * 1024):
+        """
+        Args:
+            directory (str): Каталог для хранения записей кэша. Создаётся при первой записи.
+            ttls (dict): Время жизни записей в секундах для каждого эндпоинта, например {"/sunmoon": 43200}.
+            default_ttl (float, optional): Время жизни записей для эндпоинтов, не указанных в ttls.
+            stale_ttl (float, optional): Сколько секунд после истечения TTL запись ещё может выдаваться, пока идёт обновление.
+            max_bytes (int, optional): Максимальный суммарный размер записей кэша в байтах.
+        """
+        self.directory = directory
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        # Оценка суммарного размера записей в байтах (None - каталог ещё не сканировался)
+        self._size = None
+
+    def make_key(self, endpoint: str, params: dict) -> str:
+        """
+        Формирует ключ записи по эндпоинту и параметрам запроса.
+
+        Координаты округляются до COORDINATES_PRECISION знаков, чтобы близкие места наблюдения
+        использовали одну и ту же запись, а параметры из IGNORED_PARAMS (API-ключ) отбрасываются.
+        В ключ входит текущая дата в часовом поясе запроса (параметр tz): прогноз начинается с местной даты,
+        поэтому после местной полуночи записи предыдущего дня не используются, даже если их TTL не истёк.
+
+        Args:
+            endpoint (str): Эндпоинт API.
+            params (dict): Параметры запроса.
+
+        Returns:
+            str: Ключ записи (hex SHA-256).
+
+        Example:
+            >>> cache.make_key("/sunmoon", {"lat": 55.7512, "lon": 37.6184, "apikey": "KEY"}) == cache.make_key("/sunmoon", {"lat": 55.75, "lon": 37.62})
+            True
+        """
+        key_params = {name: value for name, value in params.items() if name not in IGNORED_PARAMS}
+        for name in ("lat", "lon"):
+            if name in key_params:
+                key_params[name] = round(float(key_params[name]), COORDINATES_PRECISION)
+        if "tz" in key_params:
+            key_params["date"] = datetime.now(ZoneInfo(key_params["tz"])).date().isoformat()
+        raw_key = json.dumps([endpoint.strip(" /"), key_params], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str, endpoint: str) -> tuple:
+        """
+        Возвращает запись кэша и её состояние.
+
+        Args:
+            key (str): Ключ записи, полученный из make_key().
+            endpoint (str): Эндпоинт API, по которому определяется TTL записи.
+
+        Returns:
+            tuple: Пара (данные, состояние), где состояние - "fresh", "stale" или None, если записи нет
+                или она устарела настолько, что не может быть выдана.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        # Отсутствующая или повреждённая запись равнозначна промаху кэша
+        except (OSError, ValueError):
+            return None, None
+
+        age = time.time() - entry["stored_at"]
+        ttl = self.ttls.get(endpoint, self.default_ttl)
+        if age <= ttl:
+            state = "fresh"
+        elif age <= ttl + self.stale_ttl:
+            state = "stale"
+        else:
+            return None, None
+
+        # Отмечаем обращение к записи, чтобы она не была вытеснена первой
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry["data"], state
+
+    def set(self, key: str, data: dict) -> None:
+        """
+        Сохраняет ответ API в кэш и, при необходимости, вытесняет давно не используемые записи.
+
+        Args:
+            key (str): Ключ записи, полученный из make_key().
+            data (dict): Ответ API.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # Пишем во временный файл и атомарно заменяем запись, чтобы параллельные чтения не видели неполный файл.
+        # Имя временного файла уникально для процесса и потока: кэш может быть общим для нескольких процессов.
+        temp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"stored_at": time.time(), "data": data}, file, ensure_ascii=False)
+        size = os.path.getsize(temp_path)
+        try:
+            replaced_size = os.path.getsize(path)
+        except OSError:
+            replaced_size = 0
+        os.replace(temp_path, path)
+
+        with self._lock:
+            if self._size is not None:
+                self._size += size - replaced_size
+            if self._size is not None and self._size <= self.max_bytes:
+                return
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Если суммарный размер кэша превышает max_bytes, удаляет записи с самым давним обращением,
+        пока размер не станет не больше EVICT_TARGET_RATIO * max_bytes.
+
+        Сканирует каталог и уточняет оценку размера кэша (записи могут добавлять и другие процессы).
+        """
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total_size = sum(size for _, size, _ in entries)
+            target_size = self.max_bytes if total_size <= self.max_bytes else self.max_bytes * EVICT_TARGET_RATIO
+            for _, size, path in sorted(entries):
+                if total_size <= target_size:
+                    break
+                try:
+                    os.remove(path)
+                    total_size -= size
+                except OSError:
+                    pass
+            self._size = total_size
+
+    def refresh_in_background(self, key: str, loader) -> None:
+        """
+        Обновляет запись кэша в отдельном потоке.
+
+        Для одного ключа одновременно выполняется не более одного обновления. Поток не является
+        демоном, поэтому при завершении разового запуска интерпретатор дождётся окончания обновления.
+
+        Args:
+            key (str): Ключ записи, полученный из make_key().
+            loader (callable): Функция без аргументов, возвращающая свежий ответ API.
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.set(key, loader())
+            # Ошибка фонового обновления не критична - устаревшая запись уже выдана
+            except Exception as error:
+                print(f"Не удалось обновить запись кэша: {error}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"cache-refresh-{key[:8]}").start()
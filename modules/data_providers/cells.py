@@ -0,0 +1,61 @@
+import math
+
+# Размер ячейки сетки по умолчанию, градусы (совпадает со значением GRID_CELL_SIZE по умолчанию в конфиге)
+DEFAULT_CELL_SIZE = 0.05
+
+# Количество знаков, до которого округляется номер ячейки перед округлением вниз: без этого координаты
+# на границе ячейки (например, 0.15 / 0.05 = 2.9999999999999996) попадали бы в соседнюю ячейку
+CELL_INDEX_PRECISION = 9
+
+def cell_key(latitude: float, longitude: float, timezone: str, cell_size: float = DEFAULT_CELL_SIZE) -> tuple:
+    """
+    Определяет ячейку сетки прогноза, в которую попадает место наблюдения.
+
+    Ячейка - квадрат cell_size x cell_size градусов. Места с разными часовыми поясами попадают в
+    разные ячейки, т.к. от часового пояса зависит разбивка ответа API по дням. Долгота приводится
+    к диапазону [-180, 180), поэтому места на меридиане 180° попадают в одну ячейку.
+
+    Args:
+        latitude (float): Широта места наблюдения.
+        longitude (float): Долгота места наблюдения.
+        timezone (str): Часовой пояс места наблюдения.
+        cell_size (float, optional): Размер ячейки в градусах. По умолчанию - DEFAULT_CELL_SIZE.
+
+    Returns:
+        tuple: Ключ ячейки (номер строки, номер столбца, часовой пояс).
+
+    Example:
+        >>> cell_key(55.751, 37.618, "Europe/Moscow", 0.05)
+        (1115, 752, 'Europe/Moscow')
+    """
+    return (cell_index(latitude, cell_size), cell_index(wrap_longitude(longitude), cell_size), timezone)
+
+def cell_index(coordinate: float, cell_size: float) -> int:
+    """
+    Возвращает номер ячейки по одной координате. Координата на границе относится к ячейке, которая с неё начинается.
+    """
+    return math.floor(round(coordinate / cell_size, CELL_INDEX_PRECISION))
+
+def cell_center(key: tuple, cell_size: float = DEFAULT_CELL_SIZE) -> tuple:
+    """
+    Возвращает координаты центра ячейки, для которых запрашивается прогноз.
+
+    Ячейки у полюсов и у меридиана 180° могут выходить за пределы допустимых координат (например, ячейка
+    места на широте 90°), поэтому широта центра ограничивается диапазоном [-90, 90], а долгота приводится к [-180, 180).
+
+    Returns:
+        tuple: Широта и долгота центра ячейки, округлённые до 4 знаков.
+
+    Example:
+        >>> cell_center(cell_key(90.0, 179.99, "UTC", 0.05), 0.05)
+        (90.0, 179.975)
+    """
+    row, column, _ = key
+    latitude = min(max((row + 0.5) * cell_size, -90.0), 90.0)
+    return (round(latitude, 4), round(wrap_longitude((column + 0.5) * cell_size), 4))
+
+def wrap_longitude(longitude: float) -> float:
+    """
+    Приводит долготу к диапазону [-180, 180).
+    """
+    return (longitude + 180.0) % 360.0 - 180.0
@@ -1,21 +1,18 @@
+import os
+import threading
 import yaml
 from datetime import datetime
-from schema import And, Or, Regex, Schema, SchemaError
+from schema import And, Optional, Or, Regex, Schema, SchemaError
+
+# Путь к файлу конфигурации по умолчанию. Может быть переопределён переменной окружения ASTRO_SEEING_CONFIG.
+DEFAULT_CONFIG_PATH = os.environ.get("ASTRO_SEEING_CONFIG", "./config.yml")
 
 # Функция для загрузки конфигурации из YAML
-def load_config(config_path='./config.yml'):
+def load_config(config_path=DEFAULT_CONFIG_PATH):
     with open(config_path, 'r', encoding='utf-8') as file:
         config = yaml.safe_load(file)
     return config
 
-# Загружаем конфиг
-try:
-    config = load_config()
-# Если не удалось загрузить файл конфигурации, вызываем ошибку FileNotFoundError
-except FileNotFoundError:
-    raise FileNotFoundError("Ошибка при загрузке файла конфигурации: файл не найден.")
-    
-
 # Описание схемы конфига - какие ключи должны быть, какие типы данных они должны содержать, и т.д.
 config_schema = Schema({
     "FORECAST_DAYS": And(int,Or(lambda days_requested: 1 <= days_requested <= 10, error=f"Количество запрашиваемых дней для прогноза должно быть от 1 до 10.")),
@@ -27,22 +24,193 @@ config_schema = Schema({
     "TIMEZONE": Or(Regex(r"^[A-Z][a-zA-Z]*\/[A-Z][a-zA-Z]*$"), error="Часовой пояс должен указываться в формате Название_региона/Город , например Europe/Moscow."),
     "LATITUDE": And(Or(float, int), Or(lambda latitude: -90 <= latitude <= 90, error="Широта должна быть представлена целым или дробным числом от -90° до +90°")),
     "LONGITUDE": And(Or(float, int), Or(lambda longitude: -180 <= longitude <= 180, error="Долгота должна быть представлена целым или дробным числом от -180° до +180°")),
+    # Необязательный список мест наблюдения для пакетного режима. Если не задан - прогноз строится только для LATITUDE/LONGITUDE.
+    # Для каждого места можно переопределить часовой пояс и фильтры по облачности и времени.
+    Optional("SITES", default=None): Or(None, [{
+        "NAME": str,
+        "LATITUDE": And(Or(float, int), Or(lambda latitude: -90 <= latitude <= 90, error="Широта места наблюдения должна быть от -90° до +90°")),
+        "LONGITUDE": And(Or(float, int), Or(lambda longitude: -180 <= longitude <= 180, error="Долгота места наблюдения должна быть от -180° до +180°")),
+        Optional("TIMEZONE"): Or(Regex(r"^[A-Z][a-zA-Z]*\/[A-Z][a-zA-Z]*$"), error="Часовой пояс места наблюдения должен указываться в формате Название_региона/Город."),
+        Optional("CLOUDINESS_FILTER"): And(int, Or(lambda cloudiness_percent: 0 <= cloudiness_percent <= 100, error="Фильтр облачности места наблюдения должен быть целым числом от 0 до 100.")),
+        Optional("TIME_FILTER"): Or(Regex(r'^([01]?[0-9]|2[0-3]):[0-5][0-9]$'), error="Фильтр времени места наблюдения должен быть указан в 24-часовом формате, например 03:00 ."),
+        Optional("CHAT_ID"): str,
+    }]),
+    # Необязательные именованные профили - наборы параметров, которые переопределяют основные (см. Config.profile()).
+    Optional("PROFILES", default=None): Or(None, {str: dict}),
+    # Размер ячейки сетки прогноза в градусах. Места наблюдения в одной ячейке используют один запрос к API.
+    Optional("GRID_CELL_SIZE", default=0.05): And(Or(float, int), Or(lambda size: 0 < size <= 1, error="Размер ячейки сетки (GRID_CELL_SIZE) должен быть от 0 до 1 градуса.")),
+    Optional("MAX_CONCURRENCY", default=8): And(int, Or(lambda workers: 1 <= workers <= 64, error="Количество одновременных запросов (MAX_CONCURRENCY) должно быть от 1 до 64.")),
+    Optional("REQUEST_TIMEOUT", default=15): And(Or(float, int), Or(lambda seconds: seconds > 0, error="Таймаут запроса (REQUEST_TIMEOUT) должен быть положительным числом секунд.")),
+    # Потоковый разбор ответов API: из ответа извлекаются только поля, которые используются при обработке
+    Optional("STREAM_RESPONSES", default=True): bool,
+    # Комбинированный запрос: облачность по ярусам, влажность, ветер, Солнце и Луна одним запросом вместо двух
+    Optional("COMBINED_REQUEST", default=False): bool,
+    # Архив прогнозов для анализа их точности: включение, каталог и количество сегментов в разделе до уплотнения
+    Optional("ARCHIVE_ENABLED", default=False): bool,
+    Optional("ARCHIVE_DIR", default="./archive"): str,
+    Optional("ARCHIVE_MAX_SEGMENTS", default=64): And(int, Or(lambda segments: segments >= 1, error="Количество сегментов архива (ARCHIVE_MAX_SEGMENTS) должно быть положительным числом.")),
+    # Количество лучших окон наблюдений, которые выводятся в начале отчёта (0 - не выводить)
+    Optional("BEST_WINDOWS", default=3): And(int, Or(lambda count: 0 <= count <= 10, error="Количество лучших окон наблюдений (BEST_WINDOWS) должно быть от 0 до 10.")),
+    # Формирование отчётов в пакетном режиме: количество процессов (по умолчанию - по числу ядер) и каталог кэша
+    # скомпилированного шаблона (null - без кэша)
+    Optional("RENDER_WORKERS", default=None): Or(None, And(int, Or(lambda workers: 1 <= workers <= 256, error="Количество процессов формирования отчётов (RENDER_WORKERS) должно быть от 1 до 256."))),
+    Optional("TEMPLATE_CACHE_DIR", default="./cache/templates"): Or(None, str),
+    # Интервал отправки отчётов в режиме службы (секунды)
+    Optional("REPORT_INTERVAL", default=3600): And(int, Or(lambda seconds: seconds >= 60, error="Интервал отправки отчётов (REPORT_INTERVAL) должен быть не меньше 60 секунд.")),
+    # Дополнительные чаты подписчиков, в которые рассылается отчёт, и количество потоков рассылки
+    Optional("SUBSCRIBER_CHAT_IDS", default=None): Or(None, [str]),
+    Optional("DELIVERY_WORKERS", default=4): And(int, Or(lambda workers: 1 <= workers <= 32, error="Количество потоков рассылки (DELIVERY_WORKERS) должно быть от 1 до 32.")),
+    # Отслеживание изменений прогноза: файл с отпечатками и способ доставки изменений части дней (edit - редактировать
+    # предыдущее сообщение, delta - отправить новое сообщение только с изменившимися днями)
+    Optional("FINGERPRINT_FILE", default="./state/fingerprints.json"): str,
+    Optional("CHANGE_DELIVERY", default="edit"): Or("edit", "delta", error="Параметр CHANGE_DELIVERY должен принимать значение edit или delta."),
+    # Приёмник метрик выполнения (none, json или prometheus) и путь к его файлу
+    Optional("METRICS_SINK", default="none"): Or("none", "json", "prometheus", error="Параметр METRICS_SINK должен принимать значение none, json или prometheus."),
+    Optional("METRICS_PATH", default=None): Or(None, str),
+    # Источник данных о Солнце и Луне: api - эндпоинт /sunmoon, local - локальный астрономический расчёт
+    Optional("SUN_MOON_SOURCE", default="api"): Or("api", "local", error="Параметр SUN_MOON_SOURCE должен принимать значение api или local."),
+    # Кэш производных астрономических величин: количество записей в памяти, время жизни записей (секунды, null - без
+    # ограничения) и файл общего дискового хранилища (null - только в памяти процесса)
+    Optional("ASTRONOMY_CACHE_SIZE", default=16384): And(int, Or(lambda size: size >= 1, error="Размер кэша астрономических данных (ASTRONOMY_CACHE_SIZE) должен быть положительным числом.")),
+    Optional("ASTRONOMY_CACHE_TTL", default=2592000): Or(None, And(int, Or(lambda seconds: seconds > 0, error="Время жизни записей кэша астрономических данных (ASTRONOMY_CACHE_TTL) должно быть положительным числом секунд."))),
+    Optional("ASTRONOMY_CACHE_FILE", default=None): Or(None, str),
+    # Параметры дискового кэша ответов API
+    Optional("CACHE_ENABLED", default=True): bool,
+    Optional("CACHE_DIR", default="./cache"): str,
+    Optional("CACHE_TTL", default={"/clouds-1h": 3600, "/sunmoon": 43200}): {str: And(int, Or(lambda seconds: seconds >= 0, error="Время жизни записей кэша (CACHE_TTL) не может быть отрицательным."))},
+    Optional("CACHE_STALE_TTL", default=21600): And(int, Or(lambda seconds: seconds >= 0, error="Параметр CACHE_STALE_TTL не может быть отрицательным.")),
+    Optional("CACHE_MAX_SIZE_MB", default=50): And(int, Or(lambda size: size > 0, error="Размер кэша (CACHE_MAX_SIZE_MB) должен быть положительным числом.")),
 })
 
-try:
-    # Валидация конфига
-    config_schema.validate(config)
-    
-    # Доступ к переменным
-    FORECAST_DAYS = config['FORECAST_DAYS']
-    CLOUDINESS_FILTER = config['CLOUDINESS_FILTER']
-    TIME_FILTER = datetime.strptime(config['TIME_FILTER'], "%H:%M").time()
-    BOT_TOKEN = config["BOT_TOKEN"]
-    API_KEY = config["API_KEY"]
-    CHAT_ID = config["CHAT_ID"]
-    TIMEZONE = config["TIMEZONE"]
-    LATITUDE = config["LATITUDE"]
-    LONGITUDE = config["LONGITUDE"]
-# Если конфиг не прошёл валидацию, вызываем ошибку SchemaError
-except SchemaError as error:
-    raise SchemaError(f"Ошибка при загрузке конфигурации: {error}")
\ No newline at end of file
+# Параметры, которые могут быть переопределены для отдельного места наблюдения (элемента SITES)
+SITE_OVERRIDE_KEYS = ("LATITUDE", "LONGITUDE", "TIMEZONE", "CLOUDINESS_FILTER", "TIME_FILTER", "CHAT_ID")
+
+class Config:
+    """
+    Проверенная конфигурация приложения.
+
+    Каждый параметр конфига доступен как атрибут с тем же именем (config.FORECAST_DAYS, config.TIME_FILTER и т.д.),
+    для необязательных параметров схема подставляет значения по умолчанию. TIME_FILTER преобразуется в datetime.time.
+
+    Объект не изменяется после создания и передаётся в функции конвейера явно, поэтому в одном процессе
+    могут одновременно обрабатываться несколько мест наблюдения и профилей с разными параметрами.
+    """
+
+    def __init__(self, values: dict, validate: bool = True):
+        """
+        Args:
+            values (dict): Параметры конфигурации (как в config.yml).
+            validate (bool, optional): Проверять ли параметры по схеме config_schema. По умолчанию - True.
+
+        Raises:
+            SchemaError: Параметры не прошли проверку.
+        """
+        if validate:
+            try:
+                # Валидация конфига. Схема подставляет значения по умолчанию для необязательных параметров.
+                values = config_schema.validate(values)
+            # Если конфиг не прошёл валидацию, вызываем ошибку SchemaError
+            except SchemaError as error:
+                raise SchemaError(f"Ошибка при загрузке конфигурации: {error}")
+
+        self.values = values
+        for key, value in values.items():
+            setattr(self, key, value)
+        self.TIME_FILTER = datetime.strptime(values["TIME_FILTER"], "%H:%M").time()
+        self._site_configs = {}
+        self._lock = threading.Lock()
+
+    def with_overrides(self, overrides: dict, validate: bool = True) -> "Config":
+        """
+        Возвращает новую конфигурацию, в которой часть параметров заменена значениями из overrides.
+        """
+        return Config(self.values | overrides, validate)
+
+    def profile(self, name: str) -> "Config":
+        """
+        Возвращает конфигурацию именованного профиля из раздела PROFILES.
+
+        Профиль - словарь параметров, которые переопределяют основные. Результат проверяется по схеме.
+
+        Raises:
+            KeyError: Профиль с таким именем не найден.
+        """
+        profiles = self.values.get("PROFILES") or {}
+        if name not in profiles:
+            raise KeyError(f"Профиль конфигурации {name} не найден.")
+        return self.with_overrides(profiles[name] | {"PROFILES": None})
+
+    def for_site(self, site: dict) -> "Config":
+        """
+        Возвращает конфигурацию места наблюдения с переопределёнными параметрами из SITE_OVERRIDE_KEYS.
+
+        Элементы SITES уже проверены схемой, поэтому повторная проверка не выполняется,
+        а результат кэшируется для каждого набора переопределений.
+        """
+        overrides = {key: site[key] for key in SITE_OVERRIDE_KEYS if site.get(key) is not None}
+        if not overrides:
+            return self
+        cache_key = tuple(sorted(overrides.items()))
+        with self._lock:
+            if cache_key not in self._site_configs:
+                self._site_configs[cache_key] = self.with_overrides(overrides, validate=False)
+            return self._site_configs[cache_key]
+
+# Загруженные конфигурации по пути к файлу и имени профиля. Файл читается и проверяется при первом обращении.
+_configs = {}
+_configs_lock = threading.Lock()
+
+def get_config(config_path: str = None, profile: str = None) -> Config:
+    """
+    Возвращает конфигурацию, загружая и проверяя файл при первом обращении.
+
+    Модуль не читает конфиг при импорте: файл загружается только при первом вызове get_config(),
+    после чего результат кэшируется.
+
+    Args:
+        config_path (str, optional): Путь к файлу конфигурации. По умолчанию - DEFAULT_CONFIG_PATH.
+        profile (str, optional): Имя профиля из раздела PROFILES.
+
+    Returns:
+        Config: Проверенная конфигурация.
+
+    Raises:
+        FileNotFoundError: Файл конфигурации не найден.
+        SchemaError: Конфигурация не прошла проверку.
+    """
+    key = (os.path.abspath(config_path or DEFAULT_CONFIG_PATH), profile)
+    with _configs_lock:
+        if key not in _configs:
+            if profile is not None:
+                _configs[key] = _read_config(key[0]).profile(profile)
+            else:
+                _configs[key] = _read_config(key[0])
+        return _configs[key]
+
+def _read_config(config_path: str) -> Config:
+    key = (config_path, None)
+    if key not in _configs:
+        # Загружаем конфиг
+        try:
+            values = load_config(config_path)
+        # Если не удалось загрузить файл конфигурации, вызываем ошибку FileNotFoundError
+        except FileNotFoundError:
+            raise FileNotFoundError("Ошибка при загрузке файла конфигурации: файл не найден.")
+        _configs[key] = Config(values)
+    return _configs[key]
+
+def use_config(config: Config, config_path: str = None) -> None:
+    """
+    Задаёт конфигурацию, которую get_config() возвращает по умолчанию (например, в тестах и бенчмарках).
+    """
+    with _configs_lock:
+        _configs[(os.path.abspath(config_path or DEFAULT_CONFIG_PATH), None)] = config
+
+def __getattr__(name: str):
+    # Совместимость со старым доступом к параметрам как к константам модуля (config_loader.TIME_FILTER).
+    # Конфиг загружается при первом таком обращении, а не при импорте модуля.
+    if name.isupper():
+        config = get_config()
+        if hasattr(config, name):
+            return getattr(config, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
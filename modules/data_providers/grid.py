@@ -0,0 +1,102 @@
+from modules.data_providers.api import fetch_sites
+from modules.data_providers.cells import DEFAULT_CELL_SIZE, cell_center, cell_key
+from modules.data_providers.config_loader import Config, get_config
+
+class GridIndex:
+    """
+    Пространственный индекс мест наблюдения (подписчиков) по ячейкам сетки прогноза.
+
+    Прогноз meteoblue рассчитывается на сетке модели, поэтому места наблюдения в одной ячейке
+    получают одинаковые данные. Индекс группирует места по ячейкам, чтобы данные запрашивались
+    один раз на каждую уникальную пару "ячейка, часовой пояс".
+    """
+
+    def __init__(self, cell_size: float = DEFAULT_CELL_SIZE, default_timezone: str = None):
+        """
+        Args:
+            cell_size (float, optional): Размер ячейки в градусах. По умолчанию - DEFAULT_CELL_SIZE.
+            default_timezone (str, optional): Часовой пояс мест, для которых он не указан. По умолчанию - TIMEZONE из конфига.
+        """
+        self.cell_size = cell_size
+        self.default_timezone = default_timezone or get_config().TIMEZONE
+        self._cells = {}
+
+    @classmethod
+    def build(cls, sites: list[dict], **kwargs) -> "GridIndex":
+        """
+        Создаёт индекс и добавляет в него все места наблюдения.
+        """
+        index = cls(**kwargs)
+        for position, site in enumerate(sites):
+            index.add(position, site)
+        return index
+
+    def add(self, position: int, site: dict) -> tuple:
+        """
+        Добавляет место наблюдения в индекс.
+
+        Args:
+            position (int): Порядковый номер места во входном списке.
+            site (dict): Место наблюдения с ключами LATITUDE, LONGITUDE и необязательным TIMEZONE.
+
+        Returns:
+            tuple: Ключ ячейки места.
+        """
+        key = cell_key(site["LATITUDE"], site["LONGITUDE"], site.get("TIMEZONE") or self.default_timezone, self.cell_size)
+        self._cells.setdefault(key, []).append(position)
+        return key
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def cells(self) -> list[tuple]:
+        """
+        Возвращает ключи всех непустых ячеек.
+        """
+        return list(self._cells)
+
+    def subscribers(self, key: tuple) -> list[int]:
+        """
+        Возвращает порядковые номера мест наблюдения в ячейке.
+        """
+        return self._cells.get(key, [])
+
+    def cell_site(self, key: tuple) -> dict:
+        """
+        Возвращает "место наблюдения" в центре ячейки для запроса к API.
+        """
+        latitude, longitude = cell_center(key, self.cell_size)
+        return {"NAME": f"cell {latitude},{longitude}", "LATITUDE": latitude, "LONGITUDE": longitude, "TIMEZONE": key[2]}
+
+def fetch_cells(sites: list[dict], max_workers: int = None, timeout: float = None, cell_size: float = None, config: Config = None) -> list[dict]:
+    """
+    Пакетно запрашивает данные для мест наблюдения, выполняя один набор запросов на каждую ячейку сетки.
+
+    Количество запросов к API зависит от количества уникальных ячеек, а не от количества мест.
+    Результат ячейки передаётся всем местам в ней, а фильтры каждого места (CLOUDINESS_FILTER,
+    TIME_FILTER) применяются позже, при обработке данных.
+
+    Args:
+        sites (list[dict]): Места наблюдения (см. fetch_sites()).
+        max_workers (int, optional): Максимальное количество одновременных запросов.
+        timeout (float, optional): Таймаут одного запроса в секундах.
+        cell_size (float, optional): Размер ячейки в градусах. По умолчанию - GRID_CELL_SIZE из конфига.
+        config (Config, optional): Конфигурация. По умолчанию - get_config().
+
+    Returns:
+        list[dict]: Результаты в формате fetch_sites() в порядке sites.
+
+    Example:
+        >>> fetch_cells([{"NAME": "A", "LATITUDE": 55.751, "LONGITUDE": 37.618}, {"NAME": "B", "LATITUDE": 55.752, "LONGITUDE": 37.619}])
+            # Один запрос /clouds-1h и один /sunmoon для обоих мест
+    """
+    config = config or get_config()
+    index = GridIndex.build(sites, cell_size=cell_size or config.GRID_CELL_SIZE, default_timezone=config.TIMEZONE)
+    cell_keys = index.cells()
+    cell_results = fetch_sites([index.cell_site(key) for key in cell_keys], max_workers, timeout, config)
+
+    results = [None] * len(sites)
+    for key, cell_result in zip(cell_keys, cell_results):
+        for position in index.subscribers(key):
+            results[position] = {name: value for name, value in cell_result.items() if name != "site"} | {"site": sites[position]}
+    return results
@@ -0,0 +1,56 @@
+import ijson
+
+# Поля ответа API с признаком и текстом ошибки, которые извлекаются из любого ответа
+ERROR_FIELDS = ("error", "error_message")
+
+# Размер блока, читаемого из потока за один раз (байты). Разборщик накапливает события одного блока,
+# поэтому небольшой блок ограничивает пиковое потребление памяти независимо от размера ответа.
+STREAM_BUFFER_SIZE = 8192
+
+# События разборщика, которые не являются значениями
+STRUCTURE_EVENTS = frozenset(("start_map", "end_map", "start_array", "end_array", "map_key"))
+
+def stream_fields(source, fields: tuple) -> dict:
+    """
+    Инкрементально разбирает JSON-ответ и извлекает только указанные поля.
+
+    Ответ читается из файлоподобного объекта по частям, объекты Python создаются только для значений
+    нужных полей, а остальные переменные, метаданные и единицы измерения пропускаются без построения
+    дерева объектов. Поэтому пиковое потребление памяти определяется размером извлекаемых столбцов,
+    а не размером всего ответа.
+
+    Args:
+        source: Файлоподобный объект с методом read() (например, response.raw с decode_content=True).
+        fields (tuple): Пути к полям через точку, например "data_1h.totalcloudcover". Поле-массив
+            извлекается целиком в список, скалярное поле - как значение.
+
+    Returns:
+        dict: Ответ той же структуры, что и исходный, но содержащий только найденные поля и поля ошибки (ERROR_FIELDS).
+
+    Example:
+        >>> stream_fields(io.BytesIO(b'{"data_1h": {"time": ["2025-01-09 00:00"], "temperature": [1.5]}}'), ("data_1h.time",))
+        {'data_1h': {'time': ['2025-01-09 00:00']}}
+    """
+    wanted = set(fields) | set(ERROR_FIELDS)
+    items = {f"{field}.item": field for field in wanted}
+    values = {}
+
+    for prefix, event, value in ijson.parse(source, use_float=True, buf_size=STREAM_BUFFER_SIZE):
+        if prefix in items:
+            if event not in STRUCTURE_EVENTS:
+                values[items[prefix]].append(value)
+        elif prefix in wanted:
+            if event == "start_array":
+                values[prefix] = []
+            elif event not in STRUCTURE_EVENTS:
+                values[prefix] = value
+
+    # Восстанавливаем вложенную структуру ответа, чтобы функции разбора работали с ним как с полным ответом
+    response = {}
+    for field, value in values.items():
+        *path, name = field.split(".")
+        node = response
+        for key in path:
+            node = node.setdefault(key, {})
+        node[name] = value
+    return response
@@ -0,0 +1,70 @@
+import numpy as np
+from datetime import datetime, time
+from zoneinfo import ZoneInfo
+
+# Форматы временных меток в ответах API meteoblue
+HOURLY_FORMAT = "%Y-%m-%d %H:%M"
+DAILY_FORMAT = "%Y-%m-%d"
+
+# Длина почасовой метки в формате HOURLY_FORMAT, например "2025-01-09 21:00"
+HOURLY_LENGTH = 16
+
+def parse_hourly_timestamps(timestamps: list[str]) -> np.ndarray:
+    """
+    Разбирает почасовые метки времени API ("%Y-%m-%d %H:%M") в массив datetime64[m].
+
+    Метки разбираются одним вызовом NumPy вместо вызова datetime.strptime() для каждой строки.
+    Если хотя бы одна метка не соответствует формату, разбор повторяется через strptime(),
+    который вызывает ValueError с указанием неверной строки, как и раньше.
+
+    Args:
+        timestamps (list[str]): Метки времени из поля data_1h.time ответа API.
+
+    Returns:
+        np.ndarray: Метки времени, dtype datetime64[m].
+
+    Example:
+        >>> parse_hourly_timestamps(["2025-01-09 00:00", "2025-01-09 01:00"])
+        array(['2025-01-09T00:00', '2025-01-09T01:00'], dtype='datetime64[m]')
+    """
+    values = np.asarray(timestamps, dtype=str)
+    # Все метки имеют одинаковую длину, иначе NumPy принял бы и другие варианты ISO 8601 (например, только дату)
+    if values.size == 0 or (values.dtype.itemsize // 4 == HOURLY_LENGTH and np.char.str_len(values).min() == HOURLY_LENGTH):
+        try:
+            return values.astype("datetime64[m]")
+        except ValueError:
+            pass
+    return np.array([datetime.strptime(timestamp, HOURLY_FORMAT) for timestamp in timestamps], dtype="datetime64[m]")
+
+def parse_dates(dates: list[str]) -> list[datetime]:
+    """
+    Разбирает даты API ("%Y-%m-%d") в datetime на начало суток.
+
+    Example:
+        >>> parse_dates(["2025-01-09"])
+        [datetime.datetime(2025, 1, 9, 0, 0)]
+    """
+    return [datetime.fromisoformat(value) for value in dates]
+
+def parse_local_times(dates: list[datetime], times: list[str], timezone: str) -> list[datetime]:
+    """
+    Разбирает время суток API ("%H:%M") и привязывает его к дате и часовому поясу.
+
+    API возвращает время события (например, заката) в часовом поясе запроса, поэтому каждое время
+    соединяется со своей датой прогноза и получает tzinfo этого пояса. Переход на летнее время
+    учитывается ZoneInfo.
+
+    Args:
+        dates (list[datetime]): Даты прогноза (см. parse_dates()).
+        times (list[str]): Время событий в формате "%H:%M" в том же порядке.
+        timezone (str): Часовой пояс, указанный в запросе к API.
+
+    Returns:
+        list[datetime]: Моменты событий с tzinfo.
+
+    Example:
+        >>> parse_local_times([datetime(2025, 1, 9)], ["16:20"], "Europe/Moscow")
+        [datetime.datetime(2025, 1, 9, 16, 20, tzinfo=zoneinfo.ZoneInfo(key='Europe/Moscow'))]
+    """
+    zone = ZoneInfo(timezone)
+    return [datetime.combine(day.date(), time.fromisoformat(value), tzinfo=zone) for day, value in zip(dates, times)]
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+from datetime import datetime
+
+class NullSink:
+    """
+    Приёмник метрик, который ничего не сохраняет.
+    """
+
+    def write(self, snapshot: dict) -> None:
+        pass
+
+class JsonLogSink:
+    """
+    Приёмник метрик, дописывающий каждый запуск одной JSON-строкой в файл журнала.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, snapshot: dict) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(snapshot, ensure_ascii=False) + "\n")
+
+class PrometheusTextfileSink:
+    """
+    Приёмник метрик в текстовом формате Prometheus для textfile collector из node_exporter.
+
+    Файл перезаписывается атомарно после каждого запуска, значения - метрики последнего запуска.
+    """
+
+    def __init__(self, path: str, prefix: str = "astro_seeing"):
+        self.path = path
+        self.prefix = prefix
+
+    def write(self, snapshot: dict) -> None:
+        lines = [
+            f"# TYPE {self.prefix}_stage_seconds gauge",
+            *(f'{self.prefix}_stage_seconds{{stage="{stage}"}} {seconds}' for stage, seconds in snapshot["stages"].items()),
+        ]
+        for name, value in snapshot["counters"].items():
+            lines.append(f"# TYPE {self.prefix}_{name} gauge")
+            lines.append(f"{self.prefix}_{name} {value}")
+        lines.append(f"# TYPE {self.prefix}_last_run_timestamp_seconds gauge")
+        lines.append(f"{self.prefix}_last_run_timestamp_seconds {snapshot['finished_at_unix']}")
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self.path)
+
+class Metrics:
+    """
+    Сборщик метрик одного запуска конвейера.
+
+    Хранит суммарное время каждого этапа (stage) и счётчики (increment). Метрики накапливаются
+    до вызова flush(), который передаёт снимок в приёмник и начинает новый запуск.
+
+    Example:
+        >>> with metrics.stage("process"):
+        ...     processed_data = process_weather_data(clouds_data, sun_moon_data)
+        >>> metrics.increment("hours_kept", 12)
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink or NullSink()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages = {}
+            self._counters = {}
+            self._started_at = time.time()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Измеряет время выполнения блока и добавляет его к времени этапа name.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._stages[name] = self._stages.get(name, 0.0) + elapsed
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """
+        Увеличивает счётчик name на value.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self) -> dict:
+        """
+        Возвращает текущие значения метрик.
+        """
+        with self._lock:
+            finished_at = time.time()
+            return {
+                "started_at": datetime.fromtimestamp(self._started_at).isoformat(timespec="seconds"),
+                "finished_at_unix": round(finished_at, 3),
+                "duration_s": round(finished_at - self._started_at, 4),
+                "stages": {name: round(seconds, 6) for name, seconds in self._stages.items()},
+                "counters": dict(self._counters),
+            }
+
+    def flush(self) -> dict:
+        """
+        Передаёт метрики запуска в приёмник и сбрасывает их.
+
+        Returns:
+            dict: Переданный снимок метрик.
+        """
+        snapshot = self.snapshot()
+        try:
+            self.sink.write(snapshot)
+        # Ошибка записи метрик не должна влиять на работу конвейера
+        except OSError as error:
+            print(f"Не удалось сохранить метрики: {error}")
+        self.reset()
+        return snapshot
+
+# Пути к файлам метрик по умолчанию для каждого приёмника
+DEFAULT_SINK_PATHS = {
+    "json": "./state/metrics.jsonl",
+    "prometheus": "./state/astro_seeing.prom",
+}
+
+def create_sink(kind: str, path: str = None):
+    """
+    Создаёт приёмник метрик по названию из конфига.
+
+    Args:
+        kind (str): none, json или prometheus.
+        path (str, optional): Путь к файлу журнала или textfile-файлу Prometheus. По умолчанию - из DEFAULT_SINK_PATHS.
+
+    Returns:
+        Приёмник метрик с методом write(snapshot).
+    """
+    if kind == "json":
+        return JsonLogSink(path or DEFAULT_SINK_PATHS[kind])
+    if kind == "prometheus":
+        return PrometheusTextfileSink(path or DEFAULT_SINK_PATHS[kind])
+    return NullSink()
+
+# Общий сборщик метрик. Приёмник задаётся при запуске (см. main.py), по умолчанию метрики никуда не записываются.
+metrics = Metrics()
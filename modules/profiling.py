@@ -0,0 +1,216 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import tracemalloc
+
+from contextlib import nullcontext
+from datetime import datetime
+
+# Переменные окружения, которыми профилирование включается без аргументов командной строки (например, в cron)
+PROFILER_ENV = "ASTRO_SEEING_PROFILER"
+PROFILER_DIR_ENV = "ASTRO_SEEING_PROFILER_DIR"
+
+# Режимы профилирования: cprofile - детерминированный профиль основного потока (.prof и текстовый отчёт),
+# sample - периодический снимок стеков всех потоков (.folded для flamegraph), memory - снимки tracemalloc
+PROFILER_MODES = ("cprofile", "sample", "memory")
+
+DEFAULT_PROFILE_DIR = "./state/profiles"
+
+# Интервал между снимками стеков в режиме sample (секунды)
+SAMPLE_INTERVAL = 0.005
+
+# Количество строк в текстовых отчётах (функции по суммарному времени, места выделения памяти)
+REPORT_LIMIT = 40
+
+# Глубина стека, сохраняемая tracemalloc для каждого выделения памяти
+MEMORY_FRAMES = 10
+
+def parse_modes(value: str) -> tuple:
+    """
+    Разбирает список режимов профилирования через запятую.
+
+    Raises:
+        ValueError: Неизвестный режим.
+
+    Example:
+        >>> parse_modes("sample, memory")
+        ('sample', 'memory')
+    """
+    modes = tuple(mode.strip().lower() for mode in value.split(",") if mode.strip())
+    unknown = [mode for mode in modes if mode not in PROFILER_MODES]
+    if unknown:
+        raise ValueError(f"Неизвестный режим профилирования: {', '.join(unknown)}. Допустимые режимы: {', '.join(PROFILER_MODES)}.")
+    return modes
+
+class StackSampler:
+    """
+    Статистический профилировщик: фоновый поток раз в interval секунд снимает стеки всех потоков интерпретатора.
+
+    В отличие от cProfile, видит потоки пулов (запросы к API, рассылка) и почти не замедляет программу.
+    Результат - число снимков для каждого уникального стека в формате folded ("поток;кадр;кадр count"),
+    который принимают flamegraph.pl, speedscope и inferno.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        """
+        Снимает стеки всех потоков, кроме потока профилировщика.
+        """
+        # Потоки пулов (daemon-fetch_0, daemon-fetch_1, ..., Thread-12 (worker)) объединяются в один корень графа
+        names = {thread.ident: re.sub(r"[_-]\d+", "", thread.name) for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == threading.get_ident():
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = (names.get(thread_id, str(thread_id)), *reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def folded(self) -> str:
+        """
+        Возвращает снимки в формате folded, самые частые стеки - первыми.
+        """
+        lines = [f"{';'.join(frame.replace(';', ':') for frame in stack)} {count}" for stack, count in sorted(self.counts.items(), key=lambda item: -item[1])]
+        return "\n".join(lines) + "\n" if lines else ""
+
+class Profiler:
+    """
+    Профилирование запуска конвейера в выбранных режимах (см. PROFILER_MODES).
+
+    Файлы результата записываются в каталог directory с общим префиксом "<время запуска>-<pid>":
+        .prof - статистика cProfile (pstats, для snakeviz, gprof2dot и т.п.) и .cprofile.txt - функции по суммарному времени;
+        .folded - стеки режима sample для построения flamegraph;
+        .memory.txt - места выделения памяти в конце запуска, прирост с начала запуска и пиковое потребление (tracemalloc).
+
+    Режим memory заметно замедляет выполнение, поэтому время лучше измерять отдельным запуском без него.
+    В режиме службы результаты записываются при её остановке.
+
+    Example:
+        >>> with Profiler(("sample", "memory"), "./state/profiles"):
+        ...     main()
+    """
+
+    def __init__(self, modes: tuple, directory: str = None, interval: float = SAMPLE_INTERVAL):
+        """
+        Args:
+            modes (tuple): Режимы из PROFILER_MODES.
+            directory (str, optional): Каталог для файлов результата. По умолчанию - DEFAULT_PROFILE_DIR.
+            interval (float, optional): Интервал между снимками стеков в режиме sample (секунды).
+        """
+        self.modes = modes
+        self.directory = directory or DEFAULT_PROFILE_DIR
+        self.prefix = os.path.join(self.directory, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        self._profile = cProfile.Profile() if "cprofile" in modes else None
+        self._sampler = StackSampler(interval) if "sample" in modes else None
+        self._memory_start = None
+
+    def __enter__(self) -> "Profiler":
+        if "memory" in self.modes:
+            tracemalloc.start(MEMORY_FRAMES)
+            self._memory_start = tracemalloc.take_snapshot()
+        if self._sampler is not None:
+            self._sampler.start()
+        if self._profile is not None:
+            self._profile.enable()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        memory_report = self._memory_report() if "memory" in self.modes else None
+
+        # Ошибка записи результатов не должна заменять собой ошибку или результат запуска
+        try:
+            self.write(memory_report)
+        except OSError as error:
+            print(f"Не удалось сохранить результаты профилирования: {error}")
+
+    def _memory_report(self) -> str:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # Память самого tracemalloc и модулей импорта не относится к конвейеру
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+        snapshot = snapshot.filter_traces(filters)
+
+        lines = [f"Текущее потребление: {current / 1024:.1f} KiB, пиковое: {peak / 1024:.1f} KiB", "", "Места выделения памяти в конце запуска:"]
+        lines += [f"    {statistic}" for statistic in snapshot.statistics("lineno")[:REPORT_LIMIT]]
+        lines += ["", "Прирост с начала запуска:"]
+        lines += [f"    {statistic}" for statistic in snapshot.compare_to(self._memory_start.filter_traces(filters), "lineno")[:REPORT_LIMIT]]
+        lines += ["", "Крупнейшие места выделения со стеком вызовов:"]
+        for statistic in snapshot.statistics("traceback")[:5]:
+            lines.append(f"    {statistic.count} блоков, {statistic.size / 1024:.1f} KiB")
+            lines += [f"        {line}" for line in statistic.traceback.format()]
+        return "\n".join(lines) + "\n"
+
+    def write(self, memory_report: str = None) -> list[str]:
+        """
+        Записывает результаты профилирования в файлы.
+
+        Returns:
+            list[str]: Пути записанных файлов.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        written = []
+        if self._profile is not None:
+            self._profile.dump_stats(f"{self.prefix}.prof")
+            report = io.StringIO()
+            pstats.Stats(self._profile, stream=report).sort_stats("cumulative").print_stats(REPORT_LIMIT)
+            written += [f"{self.prefix}.prof", self._write_text(f"{self.prefix}.cprofile.txt", report.getvalue())]
+        if self._sampler is not None:
+            written.append(self._write_text(f"{self.prefix}.folded", self._sampler.folded()))
+        if memory_report is not None:
+            written.append(self._write_text(f"{self.prefix}.memory.txt", memory_report))
+        print(f"Результаты профилирования: {', '.join(written)}")
+        return written
+
+    def _write_text(self, path: str, text: str) -> str:
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text)
+        return path
+
+def profile_run(modes: str = None, directory: str = None):
+    """
+    Возвращает контекст профилирования запуска.
+
+    Режимы и каталог берутся из аргументов, а если они не заданы - из переменных окружения PROFILER_ENV
+    и PROFILER_DIR_ENV. Если профилирование не включено, возвращается пустой контекст без накладных расходов.
+
+    Args:
+        modes (str, optional): Режимы через запятую, например "cprofile" или "sample,memory".
+        directory (str, optional): Каталог для файлов результата.
+
+    Raises:
+        ValueError: Неизвестный режим профилирования.
+    """
+    modes = modes or os.environ.get(PROFILER_ENV)
+    if not modes:
+        return nullcontext()
+    return Profiler(parse_modes(modes), directory or os.environ.get(PROFILER_DIR_ENV))